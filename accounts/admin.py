@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth import get_user_model
-from .models import FollowRelation
+from .models import FollowRelation, UserStats
 
 CustomUser = get_user_model()
 
@@ -11,3 +11,9 @@ admin.site.register(CustomUser)
 class FollowRelationAdmin(admin.ModelAdmin):
     model = FollowRelation
     readonly_fields = ("created_at", "updated_at")
+
+
+@admin.register(UserStats)
+class UserStatsAdmin(admin.ModelAdmin):
+    model = UserStats
+    readonly_fields = ("created_at", "updated_at")
@@ -6,7 +6,6 @@ from django.contrib.auth import get_user_model
 
 from allauth.account.forms import SignupForm, LoginForm
 
-
 # カスタムユーザー取得
 CustomUser = get_user_model()
 
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import CustomUser, UserStats
+
+
+class Command(BaseCommand):
+    """ユーザーの各種件数（ツイート数・フォロワー数など）を再集計するコマンド"""
+
+    help = "ユーザー統計の件数を実データから再集計します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="1トランザクションで更新するユーザー数",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        # ID範囲ごとに分割して更新し、ロックの保持時間を抑える
+        updated = 0
+        last_id = 0
+        while True:
+            user_ids = list(
+                CustomUser.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not user_ids:
+                break
+            with transaction.atomic():
+                updated += UserStats.rebuild(CustomUser.objects.filter(pk__in=user_ids))
+            last_id = user_ids[-1]
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{updated}人のユーザー統計を再集計しました。")
+        )
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0005_alter_customuser_description_and_more"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="followrelation",
+            index=models.Index(
+                fields=["followee", "follower"], name="follow_followee_follower_idx"
+            ),
+        ),
+    ]
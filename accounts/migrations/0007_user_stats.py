@@ -0,0 +1,97 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:21
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_user_stats(apps, schema_editor):
+    """既存ユーザーの各種件数を集計して統計を作成する"""
+    CustomUser = apps.get_model("accounts", "CustomUser")
+    UserStats = apps.get_model("accounts", "UserStats")
+    counts = {}
+    for field_name, model_label, user_field in [
+        ("tweet_count", "tweets.Tweet", "user"),
+        ("follower_count", "accounts.FollowRelation", "followee"),
+        ("following_count", "accounts.FollowRelation", "follower"),
+        ("like_count", "tweets.Like", "user"),
+        ("bookmark_count", "tweets.Bookmark", "user"),
+    ]:
+        subquery = (
+            apps.get_model(model_label)
+            .objects.filter(**{user_field: OuterRef("pk")})
+            .order_by()
+            .values(user_field)
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        counts[field_name] = Coalesce(Subquery(subquery), 0)
+    rows = CustomUser.objects.order_by().annotate(**counts).values("pk", *counts)
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=row.pop("pk"), **row) for row in rows.iterator()],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0006_query_indexes"),
+        ("tweets", "0013_query_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="UserStats",
+            fields=[
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="登録日時"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新日時"),
+                ),
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="stats",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="ユーザー",
+                    ),
+                ),
+                (
+                    "tweet_count",
+                    models.PositiveIntegerField(default=0, verbose_name="ツイート数"),
+                ),
+                (
+                    "follower_count",
+                    models.PositiveIntegerField(default=0, verbose_name="フォロワー数"),
+                ),
+                (
+                    "following_count",
+                    models.PositiveIntegerField(default=0, verbose_name="フォロー数"),
+                ),
+                (
+                    "like_count",
+                    models.PositiveIntegerField(default=0, verbose_name="いいね数"),
+                ),
+                (
+                    "bookmark_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="ブックマーク数"
+                    ),
+                ),
+            ],
+            options={
+                "verbose_name": "ユーザー統計",
+                "verbose_name_plural": "ユーザー統計",
+                "db_table": "user_stats",
+            },
+        ),
+        migrations.RunPython(backfill_user_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:43
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_unread_notification_count(apps, schema_editor):
+    """既存ユーザーの未読の通知数を集計する"""
+    Notification = apps.get_model("notifications", "Notification")
+    UserStats = apps.get_model("accounts", "UserStats")
+    subquery = (
+        Notification.objects.filter(receiver=OuterRef("user"), is_read=False)
+        .order_by()
+        .values("receiver")
+        .annotate(count=Count("pk"))
+        .values("count")
+    )
+    UserStats.objects.update(unread_notification_count=Coalesce(Subquery(subquery), 0))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0007_user_stats"),
+        ("notifications", "0005_notification_coalescing"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="userstats",
+            name="unread_notification_count",
+            field=models.PositiveIntegerField(default=0, verbose_name="未読の通知数"),
+        ),
+        migrations.RunPython(
+            backfill_unread_notification_count, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.2 on 2026-10-18 04:58
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0008_unread_notification_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="customuser",
+            name="profile_updated_at",
+            field=models.DateTimeField(
+                default=django.utils.timezone.now, verbose_name="プロフィール更新日時"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.2 on 2026-10-18 05:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0009_customuser_profile_updated_at"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="userstats",
+            index=models.Index(
+                fields=["follower_count", "user"], name="user_stats_follower_idx"
+            ),
+        ),
+    ]
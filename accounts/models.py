@@ -1,6 +1,10 @@
 from django.contrib.auth.models import AbstractUser
-from django.db import models
+from django.apps import apps
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
 from django.templatetags.static import static
+from django.utils import timezone
 
 
 def icon_image_path(instance, filename):
@@ -44,10 +48,46 @@ class CustomUser(AbstractUser, AbstractCommon):
     location = models.CharField("場所", max_length=30, blank=True)
     website = models.CharField("ウェブサイト", max_length=100, blank=True)
     login_count = models.IntegerField("ログイン回数", default=0)
+    # ツイートカードに表示する項目の更新日時（描画結果のキャッシュキーに使用する）
+    profile_updated_at = models.DateTimeField(
+        "プロフィール更新日時", default=timezone.now
+    )
+
+    # ツイートカードに表示する項目
+    # MEMO: ログイン回数などの更新でキャッシュを無効化しないよう、updated_atとは分ける
+    CARD_FIELDS = ("username", "name", "icon_image")
 
     def __str__(self):
         return self.username
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_card_values = instance.get_card_values()
+        return instance
+
+    def get_card_values(self):
+        """ツイートカードに表示する項目の値を取得する（読み込み済みの項目のみ）"""
+        return {
+            name: str(self.__dict__[name])
+            for name in self.CARD_FIELDS
+            if name in self.__dict__
+        }
+
+    def save(self, *args, **kwargs):
+        # ツイートカードに表示する項目が変わった場合のみ、更新日時を更新する
+        loaded = getattr(self, "_loaded_card_values", {})
+        current = self.get_card_values()
+        if any(current.get(name) != value for name, value in loaded.items()):
+            self.profile_updated_at = timezone.now()
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {
+                    *kwargs["update_fields"],
+                    "profile_updated_at",
+                }
+        super().save(*args, **kwargs)
+        self._loaded_card_values = self.get_card_values()
+
     @property
     def icon_image_url(self):
         """アイコン画像のURLを取得して、存在しない場合はデフォルト画像を返す"""
@@ -71,6 +111,30 @@ class CustomUser(AbstractUser, AbstractCommon):
         except FollowRelation.DoesNotExist:
             return False
 
+    def follow(self, followee):
+        """
+        指定したユーザーをフォローする
+
+        Returns:
+            bool: フォローした場合はTrue（同時にフォロー済みだった場合はFalse）
+        """
+        try:
+            with transaction.atomic():
+                self.following_relations.create(followee=followee)
+        except IntegrityError:
+            return False
+        return True
+
+    def unfollow(self, followee):
+        """
+        指定したユーザーのフォローを解除する
+
+        Returns:
+            bool: 解除した場合はTrue（同時に解除済みだった場合はFalse）
+        """
+        deleted, _ = self.following_relations.filter(followee=followee).delete()
+        return deleted > 0
+
     def get_followings(self):
         """自身がフォローしている人を取得する"""
         return self.following_relations.select_related("followee")
@@ -82,8 +146,8 @@ class CustomUser(AbstractUser, AbstractCommon):
     def get_notifications(self):
         """自身への通知情報を取得する"""
         return self.received_notifications.select_related(
-            "notification_type", "sender", "tweet"
-        ).order_by("-created_at")
+            "notification_type", "sender", "tweet", "comment"
+        ).order_by("-created_at", "-id")
 
     def post_login(self):
         """ログイン後処理"""
@@ -91,28 +155,48 @@ class CustomUser(AbstractUser, AbstractCommon):
         self.login_count += 1
         self.save()
 
-    def get_relations(self):
-        """ユーザーに関連する情報を取得する"""
-        return {
-            # いいねしたツイートID
-            "liked_tweet_ids": set(self.likes.values_list("tweet_id", flat=True)),
-            # リツイートしたツイートID
-            "retweeted_tweet_ids": set(
-                self.retweets.values_list("tweet_id", flat=True)
-            ),
-            # ブックマークしたツイートID
-            "bookmarked_tweet_ids": set(
-                self.bookmarks.values_list("tweet_id", flat=True)
-            ),
-            # フォローしているユーザーID
-            "following_user_ids": set(
-                self.following_relations.values_list("followee_id", flat=True)
-            ),
-            # フォロワーのID
-            "follower_user_ids": set(
-                self.follower_relations.values_list("follower_id", flat=True)
-            ),
+    def get_relations_for(self, tweet_ids, user_ids):
+        """表示対象のツイート・ユーザーに限定して、ユーザーに関連する情報を取得する"""
+        relations = {
+            "liked_tweet_ids": set(),
+            "retweeted_tweet_ids": set(),
+            "bookmarked_tweet_ids": set(),
+            "following_user_ids": set(),
+            "follower_user_ids": set(),
         }
+        tweet_ids = list(tweet_ids)
+        user_ids = list(user_ids)
+
+        if tweet_ids:
+            # いいね・リツイート・ブックマークを1回のクエリでまとめて取得する
+            def get_tweet_rows(manager, key):
+                return (
+                    manager.filter(tweet_id__in=tweet_ids)
+                    .annotate(key=Value(key, output_field=models.CharField()))
+                    .values_list("key", "tweet_id")
+                )
+
+            rows = get_tweet_rows(self.likes, "liked_tweet_ids").union(
+                get_tweet_rows(self.retweets, "retweeted_tweet_ids"),
+                get_tweet_rows(self.bookmarks, "bookmarked_tweet_ids"),
+                all=True,
+            )
+            for key, tweet_id in rows:
+                relations[key].add(tweet_id)
+
+        if user_ids:
+            # フォロー・フォロワーの関係を1回のクエリでまとめて取得する
+            rows = FollowRelation.objects.filter(
+                Q(follower=self, followee_id__in=user_ids)
+                | Q(followee=self, follower_id__in=user_ids)
+            ).values_list("follower_id", "followee_id")
+            for follower_id, followee_id in rows:
+                if follower_id == self.id:
+                    relations["following_user_ids"].add(followee_id)
+                if followee_id == self.id:
+                    relations["follower_user_ids"].add(follower_id)
+
+        return relations
 
 
 class FollowRelation(AbstractCommon):
@@ -122,11 +206,18 @@ class FollowRelation(AbstractCommon):
         db_table = "follow_relation"
         verbose_name = verbose_name_plural = "フォロー関係"
         constraints = [
+            # フォロー関係の一意性（フォローしているユーザーIDの取得にも使用）
             models.UniqueConstraint(
                 fields=["follower", "followee"],
                 name="unique_follower_followee_relation",
             )
         ]
+        indexes = [
+            # フォロワーIDの取得・フォロワー数の集計
+            models.Index(
+                fields=["followee", "follower"], name="follow_followee_follower_idx"
+            )
+        ]
 
     follower = models.ForeignKey(
         CustomUser,
@@ -143,3 +234,104 @@ class FollowRelation(AbstractCommon):
 
     def __str__(self):
         return f"{self.follower.username} -> {self.followee.username}"
+
+
+class UserStats(AbstractCommon):
+    """ユーザーの各種件数（ツイート数・フォロー数など）の格納用モデル"""
+
+    class Meta:
+        db_table = "user_stats"
+        verbose_name = verbose_name_plural = "ユーザー統計"
+        indexes = [
+            # フォロワー数が閾値を超えるユーザーを取得する（インデックスのみで取得）
+            models.Index(
+                fields=["follower_count", "user"], name="user_stats_follower_idx"
+            ),
+        ]
+
+    user = models.OneToOneField(
+        CustomUser,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="stats",
+        verbose_name="ユーザー",
+    )
+    tweet_count = models.PositiveIntegerField("ツイート数", default=0)
+    follower_count = models.PositiveIntegerField("フォロワー数", default=0)
+    following_count = models.PositiveIntegerField("フォロー数", default=0)
+    like_count = models.PositiveIntegerField("いいね数", default=0)
+    bookmark_count = models.PositiveIntegerField("ブックマーク数", default=0)
+    unread_notification_count = models.PositiveIntegerField("未読の通知数", default=0)
+
+    # 件数の名前と集計元（モデル, ユーザーを参照するフィールド）
+    COUNT_SOURCES = {
+        "tweet_count": ("tweets.Tweet", "user"),
+        "follower_count": ("accounts.FollowRelation", "followee"),
+        "following_count": ("accounts.FollowRelation", "follower"),
+        "like_count": ("tweets.Like", "user"),
+        "bookmark_count": ("tweets.Bookmark", "user"),
+        "unread_notification_count": ("notifications.Notification", "receiver"),
+    }
+    # 集計元の絞り込み条件（件数の名前: 条件）
+    COUNT_FILTERS = {
+        "unread_notification_count": {"is_read": False},
+    }
+
+    def __str__(self):
+        return f"{self.user.username}の統計"
+
+    @classmethod
+    def update_count(cls, user, field_name, amount):
+        """件数をDB上で増減する（統計が未作成の場合は実データから作成する）"""
+        # 同時更新でも値が失われないようにF式で更新し、0未満にはしない
+        updated = cls.objects.filter(user=user).update(
+            **{field_name: Greatest(F(field_name) + amount, 0)}
+        )
+        if not updated:
+            cls.rebuild(CustomUser.objects.filter(pk=user.pk))
+
+    @classmethod
+    def update_counts(cls, field_name, amounts):
+        """
+        複数ユーザーの件数をまとめて増減する（増減量ごとに1回のUPDATEで更新する）
+
+        Args:
+            field_name (str): 件数の名前
+            amounts (dict): ユーザーIDと増減量の対応
+        """
+        user_ids_by_amount = {}
+        for user_id, amount in amounts.items():
+            user_ids_by_amount.setdefault(amount, []).append(user_id)
+        updated = 0
+        for amount, user_ids in user_ids_by_amount.items():
+            updated += cls.objects.filter(user_id__in=user_ids).update(
+                **{field_name: Greatest(F(field_name) + amount, 0)}
+            )
+        if updated < len(amounts):
+            cls.rebuild(CustomUser.objects.filter(pk__in=amounts, stats__isnull=True))
+
+    @classmethod
+    def rebuild(cls, users):
+        """指定したユーザーの件数を実データから集計し直す"""
+        counts = {}
+        for field_name, (model_label, user_field) in cls.COUNT_SOURCES.items():
+            subquery = (
+                apps.get_model(model_label)
+                .objects.filter(**{user_field: OuterRef("pk")})
+                .filter(**cls.COUNT_FILTERS.get(field_name, {}))
+                .order_by()
+                .values(user_field)
+                .annotate(count=Count("pk"))
+                .values("count")
+            )
+            counts[field_name] = Coalesce(Subquery(subquery), 0)
+
+        rows = users.order_by().annotate(**counts).values("pk", *counts.keys())
+        stats = [cls(user_id=row.pop("pk"), **row) for row in rows]
+        cls.objects.bulk_create(
+            stats,
+            update_conflicts=True,
+            unique_fields=["user"],
+            update_fields=list(counts.keys()),
+        )
+        return len(stats)
@@ -1,3 +1,137 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from tweets.models import Bookmark, Like, Tweet
+from .models import CustomUser, FollowRelation, UserStats
+
+
+def create_user(username):
+    return CustomUser.objects.create_user(
+        username=username, email=f"{username}@example.com", password="password"
+    )
+
+
+class UserStatsTests(TestCase):
+    """ユーザーの各種件数（UserStats）の更新と再集計"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user("user")
+        self.followee = create_user("followee")
+
+    def get_stats(self, user):
+        return UserStats.objects.get(user=user)
+
+    def test_follow_toggle_updates_counts(self):
+        self.client.force_login(self.user)
+        self.client.post("/accounts/follow_toggle/", {"user_id": self.followee.pk})
+
+        self.assertEqual(self.get_stats(self.user).following_count, 1)
+        self.assertEqual(self.get_stats(self.followee).follower_count, 1)
+
+        self.client.post("/accounts/follow_toggle/", {"user_id": self.followee.pk})
+
+        self.assertEqual(self.get_stats(self.user).following_count, 0)
+        self.assertEqual(self.get_stats(self.followee).follower_count, 0)
+
+    def test_concurrent_unfollow_decrements_once(self):
+        other = create_user("other")
+        for followee in [self.followee, other]:
+            FollowRelation.objects.create(follower=self.user, followee=followee)
+        UserStats.rebuild(CustomUser.objects.all())
+        unfollow = CustomUser.unfollow
+
+        def unfollow_after_concurrent_request(user, followee):
+            # 同時に送られた別のリクエストが先にフォローを解除した状態にする
+            self.assertTrue(unfollow(user, followee))
+            UserStats.update_count(user, "following_count", -1)
+            UserStats.update_count(followee, "follower_count", -1)
+            return unfollow(user, followee)
+
+        self.client.force_login(self.user)
+        with mock.patch.object(
+            CustomUser,
+            "unfollow",
+            autospec=True,
+            side_effect=unfollow_after_concurrent_request,
+        ):
+            self.client.post("/accounts/follow_toggle/", {"user_id": self.followee.pk})
+
+        self.assertEqual(self.get_stats(self.user).following_count, 1)
+        self.assertEqual(self.get_stats(self.followee).follower_count, 0)
+
+    def test_concurrent_follow_does_not_fail(self):
+        UserStats.rebuild(CustomUser.objects.all())
+        follow = CustomUser.follow
+
+        def follow_after_concurrent_request(user, followee):
+            # 同時に送られた別のリクエストが先にフォローした状態にする
+            FollowRelation.objects.create(follower=user, followee=followee)
+            return follow(user, followee)
+
+        self.client.force_login(self.user)
+        with mock.patch.object(
+            CustomUser,
+            "follow",
+            autospec=True,
+            side_effect=follow_after_concurrent_request,
+        ):
+            response = self.client.post(
+                "/accounts/follow_toggle/", {"user_id": self.followee.pk}
+            )
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(FollowRelation.objects.count(), 1)
+        self.assertEqual(self.get_stats(self.user).following_count, 0)
+
+    def test_missing_stats_are_built_from_data(self):
+        FollowRelation.objects.create(follower=self.user, followee=self.followee)
+        Tweet.objects.create(user=self.user, content="tweet")
+        UserStats.objects.filter(user=self.user).delete()
+
+        UserStats.update_count(self.user, "tweet_count", 1)
+
+        stats = self.get_stats(self.user)
+        self.assertEqual((stats.tweet_count, stats.following_count), (1, 1))
+
+    def test_count_does_not_go_below_zero(self):
+        UserStats.rebuild(CustomUser.objects.filter(pk=self.user.pk))
+        UserStats.update_count(self.user, "like_count", -1)
+        UserStats.update_counts("bookmark_count", {self.user.pk: -2})
+
+        stats = self.get_stats(self.user)
+        self.assertEqual((stats.like_count, stats.bookmark_count), (0, 0))
+
+    def test_rebuild_user_stats_recounts_from_data(self):
+        tweet = Tweet.objects.create(user=self.followee, content="tweet")
+        Like.objects.create(user=self.user, tweet=tweet)
+        Bookmark.objects.create(user=self.user, tweet=tweet)
+        FollowRelation.objects.create(follower=self.user, followee=self.followee)
+        UserStats.objects.all().delete()
+
+        call_command("rebuild_user_stats", "--batch-size=1", stdout=mock.Mock())
+
+        stats = self.get_stats(self.user)
+        self.assertEqual(
+            (
+                stats.following_count,
+                stats.like_count,
+                stats.bookmark_count,
+                stats.tweet_count,
+            ),
+            (1, 1, 1, 0),
+        )
+        stats = self.get_stats(self.followee)
+        self.assertEqual((stats.follower_count, stats.tweet_count), (1, 1))
+
+    def test_profile_header_reads_stats(self):
+        Tweet.objects.create(user=self.followee, content="tweet")
+        UserStats.rebuild(CustomUser.objects.all())
+        self.client.force_login(self.user)
+
+        response = self.client.get(f"/profile/{self.followee.username}/")
+
+        self.assertContains(response, "1</span>件のツイート", html=False)
@@ -2,10 +2,12 @@ from django.views.generic import View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.shortcuts import redirect
 from django.contrib import messages
+from django.db import transaction
 
 from allauth.account.views import SignupView, LoginView
 
-from .models import CustomUser, FollowRelation
+from tweets.models import HomeTimelineEntry
+from .models import CustomUser, UserStats
 
 
 class CustomSignupView(SignupView):
@@ -46,29 +48,37 @@ class FollowToggleView(LoginRequiredMixin, View):
             )
             return redirect(request.META.get("HTTP_REFERER", "tweets:timeline"))
 
-        # 対象のフォロー関係を取得
-        try:
-            target_follow = user.following_relations.get(followee=followee)
-        except FollowRelation.DoesNotExist:
-            target_follow = None
-
-        # フォローの切り替え処理
-        if target_follow is None:
-            # フォローする
-            user.following_relations.create(followee=followee)
-            messages.success(
-                self.request,
-                f"{followee.username}をフォローしました。",
-                extra_tags="success",
-            )
-        else:
-            # フォロー解除
-            target_follow.delete()
-            messages.success(
-                self.request,
-                f"{followee.username}のフォローを解除しました。",
-                extra_tags="success",
-            )
+        # トランザクション開始
+        with transaction.atomic():
+            # 対象のフォロー関係を取得
+            is_following = user.following_relations.filter(followee=followee).exists()
+            # フォローの切り替え処理
+            # MEMO: 同時に切り替えられた場合に件数がずれないよう、
+            # 実際に登録・削除できた場合のみ件数とタイムラインを更新する
+            if not is_following:
+                # フォローする
+                if user.follow(followee):
+                    UserStats.update_count(user, "following_count", 1)
+                    UserStats.update_count(followee, "follower_count", 1)
+                    # フォローしたユーザーのツイートをタイムラインに追加
+                    HomeTimelineEntry.backfill(owner=user, followee=followee)
+                messages.success(
+                    self.request,
+                    f"{followee.username}をフォローしました。",
+                    extra_tags="success",
+                )
+            else:
+                # フォロー解除
+                if user.unfollow(followee):
+                    UserStats.update_count(user, "following_count", -1)
+                    UserStats.update_count(followee, "follower_count", -1)
+                    # フォロー解除したユーザーのツイートをタイムラインから削除
+                    HomeTimelineEntry.remove(owner=user, followee=followee)
+                messages.success(
+                    self.request,
+                    f"{followee.username}のフォローを解除しました。",
+                    extra_tags="success",
+                )
 
         # 直前のページにリダイレクトする
         return redirect(request.META.get("HTTP_REFERER", "tweets:timeline"))
@@ -13,4 +13,10 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "config.settings")
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# MEMO: モデルを参照するため、Djangoの初期化後に読み込む
+from notifications.streams import NotificationStreamApplication  # noqa: E402
+
+# 通知のストリームは、待機中の接続を安価に保持できるようDjangoを経由せずに配信する
+application = NotificationStreamApplication(django_application)
@@ -0,0 +1,207 @@
+# リクエストごとの性能指標（応答時間・SQL・キャッシュ・テンプレート描画）を集計する
+import bisect
+import math
+import threading
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+
+# 応答時間系のヒストグラムの区切り（秒）
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+# 指標の定義（名前: (種類, 説明, ヒストグラムの区切り)）
+METRICS = {
+    "django_http_requests_total": ("counter", "リクエスト数", None),
+    "django_http_request_duration_seconds": (
+        "histogram",
+        "リクエストの応答時間（秒）",
+        LATENCY_BUCKETS,
+    ),
+    "django_http_request_sql_queries": (
+        "histogram",
+        "1リクエストあたりのSQLクエリ数",
+        (1, 2, 5, 10, 20, 50, 100, 200),
+    ),
+    "django_http_request_sql_seconds": (
+        "histogram",
+        "1リクエストあたりのSQL実行時間（秒）",
+        LATENCY_BUCKETS,
+    ),
+    "django_http_request_template_seconds": (
+        "histogram",
+        "テンプレートの描画時間（秒）",
+        LATENCY_BUCKETS,
+    ),
+    "django_cache_requests_total": (
+        "counter",
+        "キャッシュの参照数（resultはhitまたはmiss）",
+        None,
+    ),
+    "home_timeline_merge_seconds": (
+        "histogram",
+        "フォロー中タイムラインのマージ時間（秒）",
+        (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+    ),
+}
+
+
+class MetricsRegistry:
+    """
+    プロセス内で指標を集計し、Prometheusのテキスト形式で出力するレジストリ
+
+    MEMO: 集計はプロセスごとに行うため、複数のワーカーで動かす場合は
+    ワーカーごとの値となる。
+
+    Args:
+        definitions (dict): 指標の定義（METRICSと同じ形式）
+    """
+
+    def __init__(self, definitions):
+        self.definitions = definitions
+        self._lock = threading.Lock()
+        self._counters = defaultdict(float)
+        self._histograms = {}
+
+    def inc(self, name, labels=(), amount=1):
+        """カウンターを増やす（labelsは(ラベル名, 値)のタプル）"""
+        with self._lock:
+            self._counters[(name, labels)] += amount
+
+    def observe(self, name, value, labels=()):
+        """ヒストグラムに値を記録する"""
+        buckets = self.definitions[name][2]
+        index = bisect.bisect_left(buckets, value)
+        with self._lock:
+            histogram = self._histograms.get((name, labels))
+            if histogram is None:
+                histogram = self._histograms[(name, labels)] = {
+                    "counts": [0] * (len(buckets) + 1),
+                    "sum": 0.0,
+                    "count": 0,
+                }
+            histogram["counts"][index] += 1
+            histogram["sum"] += value
+            histogram["count"] += 1
+
+    def render(self):
+        """集計値をPrometheusのテキスト形式に変換する"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {
+                key: {**value, "counts": list(value["counts"])}
+                for key, value in self._histograms.items()
+            }
+
+        lines = []
+        for name, (kind, help_text, buckets) in self.definitions.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            if kind == "counter":
+                for (key_name, labels), value in sorted(counters.items()):
+                    if key_name == name:
+                        lines.append(f"{name}{format_labels(labels)} {value:g}")
+                continue
+            for (key_name, labels), histogram in sorted(histograms.items()):
+                if key_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (math.inf,), histogram["counts"]):
+                    cumulative += count
+                    bucket_labels = labels + (("le", format_bound(bound)),)
+                    lines.append(
+                        f"{name}_bucket{format_labels(bucket_labels)} {cumulative}"
+                    )
+                lines.append(
+                    f"{name}_sum{format_labels(labels)} {histogram['sum']:.6f}"
+                )
+                lines.append(
+                    f"{name}_count{format_labels(labels)} {histogram['count']}"
+                )
+        return "\n".join(lines) + "\n"
+
+
+def format_labels(labels):
+    """ラベルを{name="value",...}の形式に変換する"""
+    if not labels:
+        return ""
+    pairs = ",".join(f'{name}="{escape_label_value(value)}"' for name, value in labels)
+    return "{" + pairs + "}"
+
+
+def escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def format_bound(bound):
+    return "+Inf" if bound == math.inf else f"{bound:g}"
+
+
+registry = MetricsRegistry(METRICS)
+
+
+class RequestStats:
+    """1リクエスト分の集計値（SQL・キャッシュ・テンプレート描画）"""
+
+    __slots__ = (
+        "queries",
+        "sql_seconds",
+        "cache_hits",
+        "cache_misses",
+        "template_seconds",
+    )
+
+    def __init__(self):
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.template_seconds = None
+
+    def record_query(self, execute, sql, params, many, context):
+        """connection.execute_wrapperに渡して、SQLの件数と実行時間を記録する"""
+        started_at = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.sql_seconds += time.perf_counter() - started_at
+
+
+# 処理中のリクエストの集計値（リクエスト外ではNone）
+current_request_stats = ContextVar("current_request_stats", default=None)
+
+
+def record_cache_access(hits=0, misses=0):
+    """キャッシュの参照結果を処理中のリクエストの集計値に記録する"""
+    stats = current_request_stats.get()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+def record_request(view_name, method, status_code, elapsed, stats):
+    """1リクエスト分の集計値をレジストリに反映する"""
+    labels = (("view", view_name),)
+    registry.inc(
+        "django_http_requests_total",
+        labels + (("method", method), ("status", str(status_code))),
+    )
+    registry.observe("django_http_request_duration_seconds", elapsed, labels)
+    registry.observe("django_http_request_sql_queries", stats.queries, labels)
+    registry.observe("django_http_request_sql_seconds", stats.sql_seconds, labels)
+    if stats.template_seconds is not None:
+        registry.observe(
+            "django_http_request_template_seconds", stats.template_seconds, labels
+        )
+    if stats.cache_hits:
+        registry.inc(
+            "django_cache_requests_total",
+            labels + (("result", "hit"),),
+            stats.cache_hits,
+        )
+    if stats.cache_misses:
+        registry.inc(
+            "django_cache_requests_total",
+            labels + (("result", "miss"),),
+            stats.cache_misses,
+        )
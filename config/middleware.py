@@ -0,0 +1,47 @@
+# プロジェクト全体で使用するミドルウェアをまとめる
+import time
+
+from django.db import connection
+
+from config.metrics import RequestStats, current_request_stats, record_request
+
+
+class MetricsMiddleware:
+    """
+    URL名ごとに応答時間・SQLの件数と実行時間・キャッシュの参照結果・
+    テンプレートの描画時間を集計するミドルウェア
+
+    集計値はconfig.metrics.registryに蓄積し、/metrics/で参照できる。
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        started_at = time.perf_counter()
+        try:
+            with connection.execute_wrapper(stats.record_query):
+                response = self.get_response(request)
+        finally:
+            current_request_stats.reset(token)
+        elapsed = time.perf_counter() - started_at
+
+        # MEMO: ラベルの種類が増えすぎないよう、未解決のURLは1つにまとめる
+        resolver_match = getattr(request, "resolver_match", None)
+        view_name = resolver_match.view_name if resolver_match else "unresolved"
+        record_request(view_name, request.method, response.status_code, elapsed, stats)
+        return response
+
+    def process_template_response(self, request, response):
+        # TemplateResponseの描画はビューの処理後に行われるため、描画完了時に計測する
+        stats = current_request_stats.get()
+        started_at = time.perf_counter()
+
+        def record_render_time(rendered_response):
+            stats.template_seconds = time.perf_counter() - started_at
+
+        if stats is not None:
+            response.add_post_render_callback(record_render_time)
+        return response
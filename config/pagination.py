@@ -0,0 +1,204 @@
+# キーセット（カーソル）方式のページネーション処理をまとめる
+import base64
+import binascii
+import json
+from datetime import datetime
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Q
+
+
+class CursorPage:
+    """キーセットページネーションの1ページ分の情報"""
+
+    def __init__(self, object_list, paginator, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.paginator = paginator
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return f"<CursorPage ({len(self.object_list)} items)>"
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    並び順のキー（例: created_at, id）の値を境界にしてページを取得するページネーター
+
+    OFFSETやCOUNT(*)を使わないため、何ページ目でも同じコストで取得できる。
+    カーソルは次のページ・前のページの境界値を、並び順のキーとともにエンコードした文字列。
+
+    Args:
+        queryset (QuerySet): ページ分割対象のクエリセット
+        per_page (int): 1ページあたりの件数
+        ordering (tuple): 並び順のキー（すべて同じ向きで指定し、最後は一意なキーにする）
+    """
+
+    NEXT = "n"
+    PREVIOUS = "p"
+
+    def __init__(self, queryset, per_page, ordering=("-created_at", "-id")):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        self.fields = [field.lstrip("-") for field in self.ordering]
+        self.descending = self.ordering[0].startswith("-")
+
+    def get_page(self, cursor=None):
+        """カーソルに対応するページを取得する（不正なカーソルは先頭ページとして扱う）"""
+        direction, values = self.decode_cursor(cursor)
+        if direction == self.PREVIOUS:
+            return self._get_previous_page(values)
+        return self._get_next_page(values)
+
+    def _get_next_page(self, values):
+        """境界値より後ろ（古い方向）のページを取得する"""
+        queryset = self.queryset.order_by(*self.ordering)
+        if values is not None:
+            queryset = queryset.filter(self._keyset_filter(values, forward=True))
+        # 次のページの有無を判定するため1件多く取得する
+        rows = list(queryset[: self.per_page + 1])
+        has_next = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        return self._build_page(
+            rows, has_next=has_next, has_previous=values is not None
+        )
+
+    def _get_previous_page(self, values):
+        """境界値より前（新しい方向）のページを取得する"""
+        reversed_ordering = [
+            field[1:] if field.startswith("-") else f"-{field}"
+            for field in self.ordering
+        ]
+        queryset = self.queryset.order_by(*reversed_ordering).filter(
+            self._keyset_filter(values, forward=False)
+        )
+        rows = list(queryset[: self.per_page + 1])
+        has_previous = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        rows.reverse()
+        return self._build_page(rows, has_next=True, has_previous=has_previous)
+
+    def _build_page(self, rows, has_next, has_previous):
+        next_cursor = None
+        previous_cursor = None
+        if rows and has_next:
+            next_cursor = self.encode_cursor(self.NEXT, rows[-1])
+        if rows and has_previous:
+            previous_cursor = self.encode_cursor(self.PREVIOUS, rows[0])
+        return CursorPage(rows, self, next_cursor, previous_cursor)
+
+    def _keyset_filter(self, values, forward):
+        """(f1, f2, ...) > (v1, v2, ...) の行比較を条件式に展開する"""
+        lookup = "lt" if self.descending == forward else "gt"
+        condition = Q()
+        for index, field in enumerate(self.fields):
+            term = Q(**{f"{field}__{lookup}": values[index]})
+            for prev_field, prev_value in zip(self.fields[:index], values[:index]):
+                term &= Q(**{prev_field: prev_value})
+            condition |= term
+        return condition
+
+    def encode_cursor(self, direction, obj):
+        """オブジェクトの並び順キーの値をカーソル文字列に変換する"""
+        values = [getattr(obj, field) for field in self.fields]
+        # MEMO: 境界値がずれないよう、日時はマイクロ秒まで含めてエンコードする
+        values = [
+            value.isoformat() if isinstance(value, datetime) else value
+            for value in values
+        ]
+        # 並び順が変わった後の古いカーソルを判別できるよう、並び順のキーも含める
+        payload = json.dumps({"d": direction, "k": self.fields, "v": values})
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        """
+        カーソル文字列を(方向, 境界値)に変換する
+
+        改ざんされたカーソルや、並び順が異なる古いカーソルは先頭ページとして扱う。
+        """
+        if not cursor:
+            return self.NEXT, None
+        try:
+            padding = "=" * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(cursor + padding))
+            direction = payload["d"]
+            if direction not in (self.NEXT, self.PREVIOUS):
+                raise ValueError(direction)
+            if payload["k"] != self.fields:
+                raise ValueError(payload["k"])
+            values = list(payload["v"])
+            if len(values) != len(self.fields):
+                raise ValueError(values)
+            values = [
+                self.to_python(field, value)
+                for field, value in zip(self.fields, values)
+            ]
+        except (
+            ValueError,
+            TypeError,
+            KeyError,
+            AttributeError,
+            binascii.Error,
+            ValidationError,
+        ):
+            return self.NEXT, None
+        return direction, values
+
+    def to_python(self, field_name, value):
+        """境界値を並び順のキーの型に変換する（変換できない場合はValueErrorを送出する）"""
+        field = self.get_ordering_field(field_name)
+        # 日時はISO形式の文字列としてエンコードされているため復元する
+        value = field.to_python(value)
+        if value is None:
+            raise ValueError(field_name)
+        if field.get_internal_type() == "DateTimeField" and not isinstance(
+            value, datetime
+        ):
+            raise ValueError(value)
+        return value
+
+    def get_ordering_field(self, field_name):
+        """並び順のキーに対応するフィールド（注釈の場合は出力フィールド）を取得する"""
+        annotation = self.queryset.query.annotations.get(field_name)
+        if annotation is not None:
+            return annotation.output_field
+        opts = self.queryset.model._meta
+        try:
+            return opts.pk if field_name == "pk" else opts.get_field(field_name)
+        except FieldDoesNotExist:
+            raise ValueError(field_name)
+
+
+class CursorPaginationMixin:
+    """ListViewのページネーションをキーセット方式に切り替えるMixin"""
+
+    cursor_ordering = ("-created_at", "-id")
+    cursor_kwarg = "cursor"
+
+    def get_cursor_paginator(self, queryset, per_page):
+        """ページネーターを生成する"""
+        return CursorPaginator(queryset, per_page, ordering=self.cursor_ordering)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.get_cursor_paginator(queryset, page_size)
+        page = paginator.get_page(self.request.GET.get(self.cursor_kwarg))
+        return (paginator, page, page.object_list, page.has_other_pages())
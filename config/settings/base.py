@@ -37,6 +37,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # 応答時間を広く計測するため、先頭に配置する
+    "config.middleware.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -56,6 +58,10 @@ AUTHENTICATION_BACKENDS = (
 SITE_ID = 1
 
 EMAIL_BACKEND = "django.core.mail.backends.console.EmailBackend"
+# 送信待ちのメール（email_outbox）の送信試行回数の上限
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+# 送信失敗時の再送間隔の基準秒数（試行ごとに2倍にする）
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = 60
 
 ROOT_URLCONF = "config.urls"
 
@@ -152,6 +158,93 @@ STORAGES = {
 
 DEFAULT_ICON_IMAGE_URL = env("DEFAULT_ICON_IMAGE_URL")
 
+# --------------------
+# Cache
+# --------------------
+# 複数プロセスで動かす場合は、共有のキャッシュサーバーのURLを設定する
+CACHES = {"default": env.cache("CACHE_URL", default="locmemcache://")}
+# ツイートカードの描画結果をキャッシュする秒数
+TWEET_FRAGMENT_CACHE_TIMEOUT = 60 * 60 * 24
+
+# --------------------
+# Timeline
+# --------------------
+# フォロー中タイムラインとして事前計算して保持するツイート数の上限
+HOME_TIMELINE_MAX_LENGTH = 800
+# フォロワー数がこの値を超えるユーザーのツイートは配信せず、読み込み時に取得する
+HOME_TIMELINE_FANOUT_THRESHOLD = 10000
+# 読み込み時に取得するユーザー1人あたりのツイート数の上限
+HOME_TIMELINE_PULL_LIMIT = 200
+# 読み込み時に取得するユーザー数の上限
+HOME_TIMELINE_MAX_PULL_SOURCES = 50
+# 読み込み時に取得するユーザーの一覧をキャッシュする秒数
+HOME_TIMELINE_PULL_USER_IDS_TIMEOUT = 600
+
+# おすすめタイムラインとして保持する候補ツイート数の上限
+RECOMMENDATION_MAX_CANDIDATES = 1000
+# おすすめのスコア集計の対象とするツイートの期間（時間）
+RECOMMENDATION_WINDOW_HOURS = 72
+# 新しさのスコアが半分になるまでの時間（時間）
+RECOMMENDATION_FRESHNESS_HALF_LIFE_HOURS = 12
+# スコアの重み（エンゲージメントの伸び・投稿者の人気度・新しさ）
+# MEMO: 人気度は閲覧者によらない値（フォロワー数）で、閲覧者ごとの親密度ではない
+RECOMMENDATION_WEIGHTS = {"velocity": 1.0, "popularity": 0.5, "freshness": 2.0}
+# おすすめの候補を作り直す間隔（秒、build_recommendations --loop）
+RECOMMENDATION_REFRESH_SECONDS = 600
+
+# --------------------
+# Notifications
+# --------------------
+# 同じツイートへの同じ種別の未読の通知を1件にまとめる期間（分）。0の場合はまとめない
+NOTIFICATION_COALESCE_WINDOW_MINUTES = 24 * 60
+# まとめる対象の通知種別（コメントは内容を個別に表示するため対象外）
+NOTIFICATION_COALESCE_TYPES = ("like", "retweet")
+# 通知メールを個別に送らず、send_notification_digestsで定期的にまとめて送る
+NOTIFICATION_EMAIL_DIGEST = True
+# ダイジェストメールを登録する間隔（秒、send_notification_digests --loop）
+NOTIFICATION_DIGEST_INTERVAL_SECONDS = 60 * 60
+# 既読の通知の保持ポリシー（prune_notificationsで適用する）
+# compact_after_days: 同じツイートへの同じ種別の通知を1件にまとめるまでの日数
+# delete_after_days: アーカイブして削除するまでの日数（Noneの場合は処理しない）
+NOTIFICATION_RETENTION = {
+    "like": {"compact_after_days": 30, "delete_after_days": 180},
+    "retweet": {"compact_after_days": 30, "delete_after_days": 180},
+    # コメントは内容を個別に表示するため、まとめずに削除のみ行う
+    "comment": {"compact_after_days": None, "delete_after_days": 365},
+}
+# 通知のイベントの配信方法（複数のワーカーで動かす場合はPostgresEventBackendを使う）
+NOTIFICATION_EVENT_BACKEND = env(
+    "NOTIFICATION_EVENT_BACKEND", default="notifications.events.LocalEventBackend"
+)
+# 1接続あたりに保持する未送信のイベント数
+NOTIFICATION_EVENT_QUEUE_SIZE = 100
+# 通知のストリームで接続を維持するためのコメントを送る間隔（秒）
+NOTIFICATION_STREAM_KEEPALIVE_SECONDS = 20
+# 削除した通知のアーカイブ（gzip圧縮したJSONL）の出力先
+NOTIFICATION_ARCHIVE_DIR = env(
+    "NOTIFICATION_ARCHIVE_DIR", default=str(BASE_DIR / "archive" / "notifications")
+)
+
+# --------------------
+# Metrics
+# --------------------
+# 性能指標（/metrics/）を収集サーバーから取得する際のトークン（未設定時はスタッフのみ参照可）
+METRICS_TOKEN = env("METRICS_TOKEN", default="")
+
+# --------------------
+# Logging
+# --------------------
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {"class": "logging.StreamHandler"},
+    },
+    "loggers": {
+        "tweets": {"handlers": ["console"], "level": "INFO"},
+    },
+}
+
 # --------------------
 # Password validation
 # --------------------
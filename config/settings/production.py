@@ -3,7 +3,6 @@ import dj_database_url
 
 from .base import *
 
-
 env = environ.Env()
 
 # --------------------
@@ -19,14 +18,22 @@ ALLOWED_HOSTS = [".herokuapp.com"]
 # --------------------
 # Database
 # --------------------
+# MEMO: ASGIではリクエストごとに接続が作られ、永続接続が再利用されないため、
+# 永続接続の代わりにプロセスごとのコネクションプールを使う
 DATABASES = {
     "default": dj_database_url.config(
         env="DATABASE_URL",
-        conn_max_age=600,
-        conn_health_checks=True,
+        conn_max_age=0,
         ssl_require=True,
     )
 }
+DATABASES["default"]["OPTIONS"]["pool"] = True
+
+# --------------------
+# Notifications
+# --------------------
+# 複数のワーカーに接続が分散するため、PostgreSQLのLISTEN/NOTIFYで配信する
+NOTIFICATION_EVENT_BACKEND = "notifications.events.PostgresEventBackend"
 
 # --------------------
 # Email settings
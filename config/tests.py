@@ -0,0 +1,110 @@
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from accounts.models import CustomUser
+from config.metrics import MetricsRegistry, registry
+
+
+def create_user(username, **kwargs):
+    return CustomUser.objects.create_user(
+        username=username,
+        email=f"{username}@example.com",
+        password="password",
+        **kwargs,
+    )
+
+
+def get_metric(name, labels):
+    """レジストリの出力から指定したラベルの値を取得する（未記録の場合は0）"""
+    prefix = name + "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+    for line in registry.render().splitlines():
+        if line.startswith(prefix + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0
+
+
+class MetricsRegistryTests(SimpleTestCase):
+    """性能指標のPrometheusのテキスト形式での出力"""
+
+    def test_render_counters_and_histograms(self):
+        metrics = MetricsRegistry(
+            {
+                "requests_total": ("counter", "リクエスト数", None),
+                "duration_seconds": ("histogram", "応答時間", (0.1, 1)),
+            }
+        )
+        labels = (("view", 'a"b'),)
+        metrics.inc("requests_total", labels)
+        metrics.inc("requests_total", labels, 2)
+        metrics.observe("duration_seconds", 0.05, labels)
+        metrics.observe("duration_seconds", 0.5, labels)
+        metrics.observe("duration_seconds", 5, labels)
+
+        self.assertEqual(
+            metrics.render().splitlines(),
+            [
+                "# HELP requests_total リクエスト数",
+                "# TYPE requests_total counter",
+                'requests_total{view="a\\"b"} 3',
+                "# HELP duration_seconds 応答時間",
+                "# TYPE duration_seconds histogram",
+                'duration_seconds_bucket{view="a\\"b",le="0.1"} 1',
+                'duration_seconds_bucket{view="a\\"b",le="1"} 2',
+                'duration_seconds_bucket{view="a\\"b",le="+Inf"} 3',
+                'duration_seconds_sum{view="a\\"b"} 5.550000',
+                'duration_seconds_count{view="a\\"b"} 3',
+            ],
+        )
+
+
+class MetricsMiddlewareTests(TestCase):
+    """リクエストごとの性能指標の集計と/metrics/の公開範囲"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user("user")
+
+    def test_request_is_recorded_by_view_name(self):
+        labels = (("view", "tweets:timeline"), ("method", "GET"), ("status", "200"))
+        sql_labels = (("view", "tweets:timeline"),)
+        before = get_metric("django_http_requests_total", labels)
+        before_queries = get_metric("django_http_request_sql_queries_count", sql_labels)
+
+        self.client.force_login(self.user)
+        self.client.get("/")
+
+        self.assertEqual(get_metric("django_http_requests_total", labels), before + 1)
+        self.assertEqual(
+            get_metric("django_http_request_sql_queries_count", sql_labels),
+            before_queries + 1,
+        )
+        self.assertGreater(
+            get_metric("django_http_request_sql_queries_sum", sql_labels), 0
+        )
+
+    def test_unresolved_urls_share_one_label(self):
+        labels = (("view", "unresolved"), ("method", "GET"), ("status", "404"))
+        before = get_metric("django_http_requests_total", labels)
+
+        self.client.get("/no-such-page-1/")
+        self.client.get("/no-such-page-2/")
+
+        self.assertEqual(get_metric("django_http_requests_total", labels), before + 2)
+
+    def test_metrics_requires_staff(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get("/metrics/").status_code, 403)
+
+        self.client.force_login(create_user("staff", is_staff=True))
+        response = self.client.get("/metrics/")
+        self.assertContains(response, "# TYPE django_http_requests_total counter")
+
+    @override_settings(METRICS_TOKEN="secret")
+    def test_metrics_accepts_token(self):
+        response = self.client.get(
+            "/metrics/", headers={"Authorization": "Bearer secret"}
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get("/metrics/", headers={"Authorization": "Bearer x"})
+        self.assertEqual(response.status_code, 403)
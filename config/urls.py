@@ -3,6 +3,8 @@ from django.contrib import admin
 from django.urls import include, path
 from django.views.generic.base import TemplateView
 
+from config.views import MetricsView
+
 urlpatterns = [
     path("", include("tweets.urls")),
     path("profile/", include("profiles.urls")),
@@ -10,6 +12,7 @@ urlpatterns = [
     path("notifications/", include("notifications.urls")),
     path("admin/", admin.site.urls),
     path("hello/", TemplateView.as_view(template_name="hello.html")),
+    path("metrics/", MetricsView.as_view(), name="metrics"),
     path("accounts/", include("accounts.urls")),
     path("accounts/", include("allauth.urls")),
 ]
@@ -1,4 +1,5 @@
 # プロジェクト全体で使用する共通処理などをまとめる
+import itertools
 
 
 def get_resized_image_url(
@@ -39,3 +40,33 @@ def get_resized_image_url(
     # リサイズ後のURL整形
     resized_url = f"{parts[0]}/image/upload/{transformation_str}/{parts[1]}"
     return resized_url
+
+
+class ZipfSampler:
+    """
+    値の人気度をべき乗則（Zipf分布）で偏らせて、値を重み付きで選ぶクラス
+
+    人気の順位は値の並びと無関係にする（同じ乱数のシードなら同じ順位になる）。
+
+    Args:
+        values (iterable): 選択対象の値
+        exponent (float): 偏りの強さ（Zipf分布の指数）
+        rng (random.Random): 乱数生成器
+    """
+
+    def __init__(self, values, exponent, rng):
+        self.rng = rng
+        self.values = list(values)
+        rng.shuffle(self.values)
+        self.cum_weights = list(
+            itertools.accumulate(
+                1 / rank**exponent for rank in range(1, len(self.values) + 1)
+            )
+        )
+
+    def __len__(self):
+        return len(self.values)
+
+    def sample(self, k, rng=None):
+        """値をk個選ぶ（スレッドごとに乱数生成器を分ける場合はrngを指定する）"""
+        return (rng or self.rng).choices(self.values, cum_weights=self.cum_weights, k=k)
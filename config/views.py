@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from django.views.generic import View
+
+from config.metrics import registry
+
+
+class MetricsView(View):
+    """集計した性能指標をPrometheusのテキスト形式で返すビュー（スタッフ専用）"""
+
+    def get(self, request, *args, **kwargs):
+        if not self.has_permission(request):
+            raise PermissionDenied
+        return HttpResponse(
+            registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+    def has_permission(self, request):
+        """スタッフユーザー、または設定したトークンを持つ収集サーバーのみ許可する"""
+        token = settings.METRICS_TOKEN
+        if token and constant_time_compare(
+            request.headers.get("Authorization", ""), f"Bearer {token}"
+        ):
+            return True
+        return request.user.is_authenticated and request.user.is_staff
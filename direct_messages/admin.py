@@ -1,9 +1,15 @@
 from django.contrib import admin
 
-from .models import Message
+from .models import Conversation, Message
 
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
     model = Message
     readonly_fields = ("created_at", "updated_at")
+
+
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    model = Conversation
+    readonly_fields = ("created_at", "updated_at")
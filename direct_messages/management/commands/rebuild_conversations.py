@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from accounts.models import CustomUser
+from direct_messages.models import Conversation
+
+
+class Command(BaseCommand):
+    """会話ごとの最新メッセージをメッセージから再集計するコマンド"""
+
+    help = "メッセージ一覧に表示する会話の最新メッセージを実データから再集計します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="1トランザクションで集計するユーザー数",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+
+        # ID範囲ごとに分割して更新し、ロックの保持時間を抑える
+        updated = 0
+        last_id = 0
+        while True:
+            user_ids = list(
+                CustomUser.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not user_ids:
+                break
+            with transaction.atomic():
+                updated += Conversation.rebuild(user_ids)
+            last_id = user_ids[-1]
+
+        self.stdout.write(self.style.SUCCESS(f"{updated}件の会話を再集計しました。"))
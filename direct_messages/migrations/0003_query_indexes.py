@@ -0,0 +1,20 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("direct_messages", "0002_remove_message_unique_message_relation"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="message",
+            index=models.Index(
+                fields=["sender", "receiver", "created_at"], name="message_pair_idx"
+            ),
+        ),
+    ]
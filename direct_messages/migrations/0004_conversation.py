@@ -0,0 +1,154 @@
+# Generated by Django 5.1.2 on 2026-10-18 04:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+def backfill_conversations(apps, schema_editor):
+    """既存のメッセージから会話と最新のメッセージを作成する"""
+    Message = apps.get_model("direct_messages", "Message")
+    Conversation = apps.get_model("direct_messages", "Conversation")
+    latest = {}
+    rows = Message.objects.order_by("created_at", "pk").values_list(
+        "pk", "sender_id", "receiver_id", "created_at"
+    )
+    for message_id, sender_id, receiver_id, created_at in rows.iterator():
+        pair = (min(sender_id, receiver_id), max(sender_id, receiver_id))
+        latest[pair] = (message_id, sender_id, created_at)
+
+    contents = Message.objects.only("content").in_bulk(
+        [message_id for message_id, _, _ in latest.values()]
+    )
+    Conversation.objects.bulk_create(
+        [
+            Conversation(
+                user1_id=pair[0],
+                user2_id=pair[1],
+                last_message_id=message_id,
+                last_sender_id=sender_id,
+                last_message_at=created_at,
+                last_message_snippet=Truncator(
+                    " ".join(contents[message_id].content.split())
+                ).chars(50),
+            )
+            for pair, (message_id, sender_id, created_at) in latest.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("direct_messages", "0003_query_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Conversation",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="登録日時"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新日時"),
+                ),
+                (
+                    "last_message_at",
+                    models.DateTimeField(verbose_name="最新のメッセージの送信日時"),
+                ),
+                (
+                    "last_message_snippet",
+                    models.CharField(
+                        blank=True,
+                        max_length=100,
+                        verbose_name="最新のメッセージの抜粋",
+                    ),
+                ),
+                (
+                    "user1_unread_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="user1の未読数"
+                    ),
+                ),
+                (
+                    "user2_unread_count",
+                    models.PositiveIntegerField(
+                        default=0, verbose_name="user2の未読数"
+                    ),
+                ),
+                (
+                    "last_message",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        related_name="+",
+                        to="direct_messages.message",
+                        verbose_name="最新のメッセージ",
+                    ),
+                ),
+                (
+                    "last_sender",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="+",
+                        to=settings.AUTH_USER_MODEL,
+                        verbose_name="最新のメッセージの送信者",
+                    ),
+                ),
+                (
+                    "user1",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="conversations_as_user1",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "user2",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="conversations_as_user2",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "conversation",
+                "indexes": [
+                    models.Index(
+                        fields=["user1", "-last_message_at", "-id"],
+                        name="conversation_user1_recent_idx",
+                    ),
+                    models.Index(
+                        fields=["user2", "-last_message_at", "-id"],
+                        name="conversation_user2_recent_idx",
+                    ),
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user1", "user2"), name="unique_conversation_users"
+                    ),
+                    models.CheckConstraint(
+                        condition=models.Q(("user1__lte", models.F("user2"))),
+                        name="conversation_user_order",
+                    ),
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_conversations, migrations.RunPython.noop),
+    ]
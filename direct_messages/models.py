@@ -1,6 +1,7 @@
 from django.utils import timezone
-from django.db import models
-from django.db.models import Q
+from django.utils.text import Truncator
+from django.db import IntegrityError, models, transaction
+from django.db.models import Case, F, Q, When
 from accounts.models import CustomUser
 
 
@@ -19,6 +20,12 @@ class Message(AbstractCommon):
 
     class Meta:
         db_table = "message"
+        indexes = [
+            # 送信者と受信者の組み合わせごとのメッセージ履歴を日時順に取得する
+            models.Index(
+                fields=["sender", "receiver", "created_at"], name="message_pair_idx"
+            )
+        ]
 
     sender = models.ForeignKey(
         CustomUser, on_delete=models.CASCADE, related_name="sent_messages"
@@ -43,3 +50,192 @@ class Message(AbstractCommon):
             .select_related("sender", "receiver")
             .order_by("created_at")
         )
+
+
+class Conversation(AbstractCommon):
+    """
+    ダイレクトメッセージの会話（ユーザーの組み合わせごと）の格納用モデル
+
+    メッセージ一覧を1回のクエリで表示できるよう、最新のメッセージと
+    参加者ごとの未読数を保持する。ユーザーはIDの小さい方をuser1とする。
+    """
+
+    class Meta:
+        db_table = "conversation"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user1", "user2"], name="unique_conversation_users"
+            ),
+            models.CheckConstraint(
+                condition=Q(user1__lte=F("user2")), name="conversation_user_order"
+            ),
+        ]
+        indexes = [
+            # 参加している会話を新しい順に取得する（user1・user2のそれぞれで使用）
+            models.Index(
+                fields=["user1", "-last_message_at", "-id"],
+                name="conversation_user1_recent_idx",
+            ),
+            models.Index(
+                fields=["user2", "-last_message_at", "-id"],
+                name="conversation_user2_recent_idx",
+            ),
+        ]
+
+    # 一覧に表示する最新メッセージの文字数
+    SNIPPET_LENGTH = 50
+
+    user1 = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="conversations_as_user1"
+    )
+    user2 = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="conversations_as_user2"
+    )
+    last_message = models.ForeignKey(
+        Message,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+        verbose_name="最新のメッセージ",
+    )
+    last_sender = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name="+",
+        verbose_name="最新のメッセージの送信者",
+    )
+    last_message_at = models.DateTimeField("最新のメッセージの送信日時")
+    last_message_snippet = models.CharField(
+        "最新のメッセージの抜粋", max_length=100, blank=True
+    )
+    user1_unread_count = models.PositiveIntegerField("user1の未読数", default=0)
+    user2_unread_count = models.PositiveIntegerField("user2の未読数", default=0)
+
+    def __str__(self):
+        return f"{self.user1} <-> {self.user2}"
+
+    def get_partner(self, user):
+        """会話の相手を取得する"""
+        return self.user2 if self.user1_id == user.pk else self.user1
+
+    @staticmethod
+    def get_user_pair(user_id, other_id):
+        """2人のユーザーIDを(user1, user2)の順に並べる"""
+        return min(user_id, other_id), max(user_id, other_id)
+
+    @staticmethod
+    def get_unread_field(user_id, pair):
+        """ユーザーの未読数を保持するフィールド名を取得する"""
+        return "user1_unread_count" if user_id == pair[0] else "user2_unread_count"
+
+    @classmethod
+    def make_snippet(cls, content):
+        """一覧に表示する最新メッセージの抜粋を作成する（改行は空白にまとめる）"""
+        return Truncator(" ".join(content.split())).chars(cls.SNIPPET_LENGTH)
+
+    @classmethod
+    def get_inbox(cls, user):
+        """
+        ユーザーが参加している会話を新しい順に取得する
+
+        unread_countにユーザー自身の未読数を付与する。
+
+        MEMO: user1・user2それぞれのインデックスから参加中の会話のみを読み出して
+        並べ替えるため、コストはフォロワー数ではなく会話数に比例する。
+        """
+        return (
+            cls.objects.filter(Q(user1=user) | Q(user2=user))
+            .select_related("user1", "user2")
+            .annotate(
+                unread_count=Case(
+                    When(user1=user, then=F("user1_unread_count")),
+                    default=F("user2_unread_count"),
+                )
+            )
+            .order_by("-last_message_at", "-id")
+        )
+
+    @classmethod
+    def record_message(cls, message):
+        """送信したメッセージを会話の最新メッセージとし、受信者の未読数を増やす"""
+        pair = cls.get_user_pair(message.sender_id, message.receiver_id)
+        unread_field = cls.get_unread_field(message.receiver_id, pair)
+        fields = {
+            "last_message": message,
+            "last_sender_id": message.sender_id,
+            "last_message_at": message.created_at,
+            "last_message_snippet": cls.make_snippet(message.content),
+        }
+        conversations = cls.objects.filter(user1_id=pair[0], user2_id=pair[1])
+        if conversations.update(**fields, **{unread_field: F(unread_field) + 1}):
+            return
+        try:
+            with transaction.atomic():
+                cls.objects.create(
+                    user1_id=pair[0], user2_id=pair[1], **fields, **{unread_field: 1}
+                )
+        except IntegrityError:
+            # 同時に最初のメッセージが送信された場合は、作成済みの会話を更新する
+            conversations.update(**fields, **{unread_field: F(unread_field) + 1})
+
+    @classmethod
+    def mark_read(cls, user, partner):
+        """相手から届いたメッセージを既読にする（未読がある場合のみ更新する）"""
+        pair = cls.get_user_pair(user.pk, partner.pk)
+        unread_field = cls.get_unread_field(user.pk, pair)
+        return cls.objects.filter(
+            user1_id=pair[0], user2_id=pair[1], **{f"{unread_field}__gt": 0}
+        ).update(**{unread_field: 0})
+
+    @classmethod
+    def rebuild(cls, user_ids):
+        """
+        指定したユーザーがuser1となる会話の最新メッセージを、メッセージから集計し直す
+
+        MEMO: メッセージは既読の状態を持たないため、未読数は集計し直さない
+        （新しく作成した会話は0件とする）。
+
+        Returns:
+            int: 更新・作成した会話数
+        """
+        user_ids = set(user_ids)
+        rows = (
+            Message.objects.filter(
+                Q(sender_id__in=user_ids) | Q(receiver_id__in=user_ids)
+            )
+            .order_by("created_at", "pk")
+            .values_list("pk", "sender_id", "receiver_id", "created_at")
+        )
+        latest = {}
+        for message_id, sender_id, receiver_id, created_at in rows.iterator():
+            pair = cls.get_user_pair(sender_id, receiver_id)
+            if pair[0] in user_ids:
+                latest[pair] = (message_id, sender_id, created_at)
+
+        contents = Message.objects.only("content").in_bulk(
+            [message_id for message_id, _, _ in latest.values()]
+        )
+        conversations = [
+            cls(
+                user1_id=pair[0],
+                user2_id=pair[1],
+                last_message_id=message_id,
+                last_sender_id=sender_id,
+                last_message_at=created_at,
+                last_message_snippet=cls.make_snippet(contents[message_id].content),
+            )
+            for pair, (message_id, sender_id, created_at) in latest.items()
+        ]
+        cls.objects.bulk_create(
+            conversations,
+            update_conflicts=True,
+            unique_fields=["user1", "user2"],
+            update_fields=[
+                "last_message",
+                "last_sender",
+                "last_message_at",
+                "last_message_snippet",
+            ],
+        )
+        return len(conversations)
@@ -1,3 +1,109 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import CustomUser, FollowRelation
+from .models import Conversation, Message
+
+
+def create_user(username):
+    return CustomUser.objects.create_user(
+        username=username, email=f"{username}@example.com", password="password"
+    )
+
+
+class ConversationTests(TestCase):
+    """会話ごとの最新メッセージと未読数"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user("user")
+        self.partners = [create_user(f"partner{i}") for i in range(3)]
+        for partner in self.partners:
+            FollowRelation.objects.create(follower=self.user, followee=partner)
+            FollowRelation.objects.create(follower=partner, followee=self.user)
+
+    def send(self, sender, receiver, content):
+        self.client.force_login(sender)
+        return self.client.post(
+            f"/messages/{receiver.username}/create/", {"content": content}
+        )
+
+    def get_inbox(self, user):
+        return {
+            conversation.get_partner(user): conversation
+            for conversation in Conversation.get_inbox(user)
+        }
+
+    def test_sending_message_updates_conversation(self):
+        self.send(self.user, self.partners[0], "こんにちは")
+        self.send(self.partners[0], self.user, "はじめまして\n\nよろしく")
+        self.send(self.partners[0], self.user, "お返事ください")
+
+        conversation = Conversation.objects.get()
+        self.assertEqual(conversation.last_sender, self.partners[0])
+        self.assertEqual(conversation.last_message_snippet, "お返事ください")
+        self.assertEqual(
+            conversation.last_message, Message.objects.latest("created_at")
+        )
+        self.assertEqual(self.get_inbox(self.user)[self.partners[0]].unread_count, 2)
+        self.assertEqual(self.get_inbox(self.partners[0])[self.user].unread_count, 1)
+
+    def test_opening_room_marks_messages_read(self):
+        self.send(self.partners[0], self.user, "こんにちは")
+        self.send(self.partners[1], self.user, "こんにちは")
+
+        self.client.force_login(self.user)
+        self.client.get(f"/messages/{self.partners[0].username}/")
+
+        inbox = self.get_inbox(self.user)
+        self.assertEqual(inbox[self.partners[0]].unread_count, 0)
+        self.assertEqual(inbox[self.partners[1]].unread_count, 1)
+        # 未読がない場合は更新しない
+        self.assertEqual(Conversation.mark_read(self.user, self.partners[0]), 0)
+
+    def test_inbox_is_ordered_by_latest_message(self):
+        for partner in self.partners:
+            self.send(partner, self.user, "こんにちは")
+        self.send(self.user, self.partners[0], "お返事です")
+
+        self.client.force_login(self.user)
+        conversations = self.client.get("/messages/").context["conversations"]
+        self.assertEqual(
+            [conversation.partner for conversation in conversations],
+            [self.partners[0], self.partners[2], self.partners[1]],
+        )
+
+    def test_snippet_is_truncated(self):
+        self.assertEqual(
+            Conversation.make_snippet("a\n b" + "c" * 100),
+            "a b" + "c" * (Conversation.SNIPPET_LENGTH - 4) + "…",
+        )
+
+    def test_rebuild_conversations_from_messages(self):
+        now = timezone.now()
+        for i, partner in enumerate(self.partners):
+            message = Message.objects.create(
+                sender=partner, receiver=self.user, content=f"message {i}"
+            )
+            Message.objects.filter(pk=message.pk).update(
+                created_at=now - timedelta(minutes=10 - i)
+            )
+        latest = Message.objects.create(
+            sender=self.user, receiver=self.partners[0], content="latest"
+        )
+        # 既存の会話の最新メッセージが古い場合は置き換える
+        Conversation.record_message(Message.objects.order_by("created_at").first())
+
+        call_command("rebuild_conversations", "--batch-size=2", stdout=mock.Mock())
 
-# Create your tests here.
+        conversations = list(Conversation.get_inbox(self.user))
+        self.assertEqual(conversations[0].last_message, latest)
+        self.assertEqual(
+            [conversation.get_partner(self.user) for conversation in conversations],
+            [self.partners[0], self.partners[2], self.partners[1]],
+        )
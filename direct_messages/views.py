@@ -3,29 +3,41 @@ from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
 from django.shortcuts import get_object_or_404, redirect, render
 from django.contrib import messages
+from django.db import transaction
 
 from accounts.models import CustomUser
-from .models import Message
+from config.pagination import CursorPaginationMixin
+from .models import Conversation, Message
 from .forms import MessageCreateForm
 
 
-class MessageListView(LoginRequiredMixin, ListView):
+class MessageListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     """メッセージ一覧ビュー"""
 
-    model = CustomUser
+    model = Conversation
     template_name = "direct_messages/index.html"
-    context_object_name = "followers"
+    context_object_name = "conversations"
+    paginate_by = 20
+    # 最新のメッセージの新しい順にページ分割する
+    cursor_ordering = ("-last_message_at", "-id")
 
     def get_queryset(self):
-        user = self.request.user
-        # ログインユーザーのフォロワー取得
-        return user.get_followers()
+        # ログインユーザーが参加している会話を取得
+        return Conversation.get_inbox(self.request.user)
+
+    def get_context_data(self, *args, **kwargs):
+        context = super().get_context_data(*args, **kwargs)
+        # 会話の相手をセット
+        for conversation in context["conversations"]:
+            conversation.partner = conversation.get_partner(self.request.user)
+        return context
 
 
 class MessageRoomView(LoginRequiredMixin, DetailView):
     """メッセージ部屋ビュー"""
 
     model = CustomUser
+    queryset = CustomUser.objects.select_related("stats")
     slug_field = "username"
     slug_url_kwarg = "username"
     template_name = "direct_messages/message_room.html"
@@ -44,6 +56,8 @@ class MessageRoomView(LoginRequiredMixin, DetailView):
             return redirect(
                 request.META.get("HTTP_REFERER", "direct_messages:message_list")
             )
+        # 相手から届いたメッセージを既読にする
+        Conversation.mark_read(request.user, self.object)
         return response
 
     def get_context_data(self, **kwargs):
@@ -86,8 +100,10 @@ class MessageCreateView(LoginRequiredMixin, CreateView):
         # フォームインスタンスに送信者と受信者を設定
         message.sender = self.request.user
         message.receiver = self.get_receiver()
-        # フォームデータ保存
-        message.save()
+        # フォームデータを保存し、会話の最新メッセージと未読数を更新
+        with transaction.atomic():
+            message.save()
+            Conversation.record_message(message)
         messages.success(
             self.request,
             "メッセージの送信に成功しました。",
@@ -101,7 +117,7 @@ class MessageCreateView(LoginRequiredMixin, CreateView):
         # コンテキスト生成
         context = self.get_context_data()
         context["follower"] = get_object_or_404(
-            CustomUser, username=self.kwargs["username"]
+            CustomUser.objects.select_related("stats"), username=self.kwargs["username"]
         )
         context["message_history"] = Message.get_messages(
             sender=self.request.user, receiver=self.get_receiver()
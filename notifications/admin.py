@@ -1,6 +1,6 @@
 from django.contrib import admin
 
-from .models import NotificationType, Notification
+from .models import NotificationType, Notification, NotificationActor, EmailOutbox
 
 
 @admin.register(NotificationType)
@@ -13,3 +13,15 @@ class NotificationTypeAdmin(admin.ModelAdmin):
 class NotificationAdmin(admin.ModelAdmin):
     model = Notification
     readonly_fields = ("created_at", "updated_at")
+
+
+@admin.register(NotificationActor)
+class NotificationActorAdmin(admin.ModelAdmin):
+    model = NotificationActor
+    readonly_fields = ("created_at", "updated_at")
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    model = EmailOutbox
+    readonly_fields = ("created_at", "updated_at")
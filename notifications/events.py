@@ -0,0 +1,185 @@
+# 通知のイベント（新しい通知・未読の通知数の変化）を接続中のクライアントに配信する
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+class EventBroker:
+    """
+    プロセス内のイベントの購読者（ユーザーごとのキュー）を管理する
+
+    購読者はイベントループ上で待機し、配信は任意のスレッドから行える。
+    """
+
+    def __init__(self, queue_size):
+        self.queue_size = queue_size
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    @asynccontextmanager
+    async def subscribe(self, user_id):
+        """ユーザー宛てのイベントを受け取るキューを登録する（終了時に解除する）"""
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.queue_size))
+        with self._lock:
+            self._subscribers[user_id].add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                self._subscribers[user_id].discard(subscriber)
+                if not self._subscribers[user_id]:
+                    del self._subscribers[user_id]
+
+    def dispatch(self, user_id, event):
+        """ユーザーの購読者全員にイベントを配信する"""
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(self._put, queue, event)
+            except RuntimeError:
+                # 終了済みのイベントループの購読者は、解除されるまで読み飛ばす
+                pass
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    @staticmethod
+    def _put(queue, event):
+        # MEMO: 受信が遅いクライアントでメモリが増え続けないよう、古いイベントから捨てる
+        if queue.full():
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+
+class BaseEventBackend:
+    """
+    イベントの配信方法の基底クラス
+
+    publish()で送信したイベントを、各プロセスのbrokerに届ける。
+    """
+
+    def __init__(self, broker):
+        self.broker = broker
+
+    def publish(self, user_id, event):
+        raise NotImplementedError("Subclasses must implement publish()")
+
+    async def start(self):
+        """購読の開始時に呼び出す（他のプロセスからの受信が必要な場合に実装する）"""
+
+
+class LocalEventBackend(BaseEventBackend):
+    """同じプロセス内の購読者にのみ配信する（開発・テスト用）"""
+
+    def publish(self, user_id, event):
+        self.broker.dispatch(user_id, event)
+
+
+class PostgresEventBackend(BaseEventBackend):
+    """
+    PostgreSQLのLISTEN/NOTIFYを使って、すべてのワーカーの購読者に配信する
+
+    各プロセスは最初の購読時に専用の接続でLISTENし、受け取ったイベントを
+    プロセス内の購読者に配信する。
+    """
+
+    CHANNEL = "notification_events"
+    # Djangoの接続設定のうち、psycopgの接続パラメーターではないもの
+    NON_CONNINFO_PARAMS = {"context", "cursor_factory", "prepare_threshold"}
+
+    def __init__(self, broker):
+        super().__init__(broker)
+        self._task = None
+
+    def publish(self, user_id, event):
+        payload = json.dumps({"user_id": user_id, "event": event})
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [self.CHANNEL, payload])
+
+    async def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.listen())
+
+    async def listen(self):
+        """通知を受信し続ける（切断された場合は間隔を空けて再接続する）"""
+        import psycopg
+
+        params = {
+            key: value
+            for key, value in connection.get_connection_params().items()
+            if key not in self.NON_CONNINFO_PARAMS
+        }
+        while True:
+            try:
+                async with await psycopg.AsyncConnection.connect(
+                    **params, autocommit=True
+                ) as conn:
+                    await conn.execute(f"LISTEN {self.CHANNEL}")
+                    async for notify in conn.notifies():
+                        payload = json.loads(notify.payload)
+                        self.broker.dispatch(payload["user_id"], payload["event"])
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("通知イベントの受信に失敗しました。再接続します。")
+                await asyncio.sleep(5)
+
+
+@lru_cache(maxsize=None)
+def get_event_backend():
+    """設定（NOTIFICATION_EVENT_BACKEND）に応じた配信方法を取得する"""
+    broker = EventBroker(settings.NOTIFICATION_EVENT_QUEUE_SIZE)
+    return import_string(settings.NOTIFICATION_EVENT_BACKEND)(broker)
+
+
+def publish_event(user_id, event_type, data):
+    """
+    イベントをトランザクション確定後に配信する
+
+    Args:
+        user_id (int): 配信先のユーザーID
+        event_type (str): イベントの種類（notificationまたはunread_count）
+        data (dict): イベントの内容
+    """
+
+    def publish():
+        try:
+            get_event_backend().publish(user_id, {"type": event_type, "data": data})
+        except Exception:
+            # MEMO: 配信に失敗しても、通知の作成自体は成功として扱う
+            logger.exception("通知イベントの配信に失敗しました。")
+
+    transaction.on_commit(publish)
+
+
+def publish_notification(notification):
+    """新しい通知（まとめた通知の更新を含む）のイベントを配信する"""
+    publish_event(
+        notification.receiver_id,
+        "notification",
+        {
+            "id": notification.pk,
+            "type": notification.notification_type.name,
+            "sender": notification.sender.display_name,
+            "actor_count": notification.actor_count,
+            "tweet_id": notification.tweet_id,
+        },
+    )
+
+
+def publish_unread_count(user_id, delta):
+    """未読の通知数の増減のイベントを配信する"""
+    if delta:
+        publish_event(user_id, "unread_count", {"delta": delta})
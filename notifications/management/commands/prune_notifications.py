@@ -0,0 +1,271 @@
+import gzip
+import json
+from collections import defaultdict
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.db.models import Count, Max, Sum
+from django.utils import timezone
+
+from accounts.models import UserStats
+from notifications.events import publish_unread_count
+from notifications.models import Notification, NotificationActor
+
+# アーカイブに出力する項目
+ARCHIVE_FIELDS = [
+    "id",
+    "notification_type__name",
+    "sender_id",
+    "receiver_id",
+    "tweet_id",
+    "comment_id",
+    "is_read",
+    "actor_count",
+    "created_at",
+    "updated_at",
+]
+
+
+class NotificationArchive:
+    """削除する通知をgzip圧縮したJSONLファイルに書き出す（最初の書き込み時に作成する）"""
+
+    def __init__(self, directory, now):
+        self.path = Path(directory) / f"notifications-{now:%Y%m%d%H%M%S}.jsonl.gz"
+        self.file = None
+        self.count = 0
+
+    def write(self, rows, reason):
+        if not rows:
+            return
+        if self.file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self.file = gzip.open(self.path, "at", encoding="utf-8")
+        for row in rows:
+            self.file.write(
+                json.dumps(
+                    {**row, "reason": reason}, cls=DjangoJSONEncoder, ensure_ascii=False
+                )
+                + "\n"
+            )
+        # MEMO: 削除をコミットする前に、書き出した内容をファイルに反映する
+        self.file.flush()
+        self.count += len(rows)
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+
+
+class Command(BaseCommand):
+    """通知の保持ポリシー（NOTIFICATION_RETENTION）を適用するコマンド"""
+
+    help = (
+        "取り消された反応の通知を削除し、期限を過ぎた既読の通知をまとめる・削除します。"
+        "削除した通知はgzip圧縮したJSONLファイルにアーカイブします"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="1トランザクションで処理する通知数（まとめる処理では通知のグループ数）",
+        )
+        parser.add_argument(
+            "--archive-dir",
+            default=settings.NOTIFICATION_ARCHIVE_DIR,
+            help="アーカイブの出力先",
+        )
+        parser.add_argument(
+            "--no-archive",
+            action="store_true",
+            help="アーカイブせずに削除する",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="処理対象の件数のみ表示する",
+        )
+        parser.add_argument(
+            "--vacuum",
+            action="store_true",
+            help="処理後にテーブルをVACUUMする（PostgreSQLのみ）",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        if options["dry_run"]:
+            self.write_targets(now)
+            return
+
+        self.batch_size = options["batch_size"]
+        self.archive = (
+            None
+            if options["no_archive"]
+            else NotificationArchive(options["archive_dir"], now)
+        )
+        try:
+            orphaned = self.delete_in_batches(Notification.get_orphaned(), "orphaned")
+            compacted = self.compact(now)
+            expired = self.delete_in_batches(
+                Notification.get_expired(now, "delete_after_days"), "expired"
+            )
+        finally:
+            if self.archive is not None:
+                self.archive.close()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"取り消された反応の通知: {orphaned}件、まとめた通知: {compacted}件、"
+                f"期限切れの通知: {expired}件を削除しました。"
+            )
+        )
+        if self.archive is not None and self.archive.count:
+            self.stdout.write(f"{self.archive.path}にアーカイブしました。")
+
+        if options["vacuum"]:
+            self.vacuum()
+
+    def write_targets(self, now):
+        """処理対象の件数を表示する"""
+        compactable = (
+            self.get_compactable_groups(now)
+            .aggregate(rows=Sum("row_count"), groups=Count("keep_id"))
+            .values()
+        )
+        self.stdout.write(
+            "取り消された反応の通知: {}件、まとめる対象: {}件（{}グループ）、"
+            "期限切れの通知: {}件".format(
+                Notification.get_orphaned().count(),
+                *[count or 0 for count in compactable],
+                Notification.get_expired(now, "delete_after_days").count(),
+            )
+        )
+
+    def delete_in_batches(self, queryset, reason):
+        """対象の通知をID順にバッチ単位でアーカイブして削除する"""
+        deleted = 0
+        last_id = 0
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    queryset.filter(pk__gt=last_id)
+                    .order_by("pk")
+                    .values(*ARCHIVE_FIELDS)[: self.batch_size]
+                )
+                if not rows:
+                    break
+                self.delete_rows(rows, reason)
+            deleted += len(rows)
+            last_id = rows[-1]["id"]
+        return deleted
+
+    def compact(self, now):
+        """期限を過ぎた既読の通知を、同じツイートへの同じ種別ごとに最新の1件にまとめる"""
+        deleted = 0
+        while True:
+            with transaction.atomic():
+                groups = {
+                    (
+                        group["notification_type_id"],
+                        group["receiver_id"],
+                        group["tweet_id"],
+                    ): group
+                    for group in self.get_compactable_groups(now)[: self.batch_size]
+                }
+                if not groups:
+                    break
+                candidates = Notification.get_expired(now, "compact_after_days").filter(
+                    notification_type_id__in={key[0] for key in groups},
+                    receiver_id__in={key[1] for key in groups},
+                    tweet_id__in={key[2] for key in groups},
+                )
+                rows = [
+                    row
+                    for row in candidates.values(
+                        "notification_type_id", *ARCHIVE_FIELDS
+                    )
+                    if (
+                        row["notification_type_id"],
+                        row["receiver_id"],
+                        row["tweet_id"],
+                    )
+                    in groups
+                ]
+                # 最新の通知を残し、反応したユーザー数を合算する
+                keep_ids = {group["keep_id"] for group in groups.values()}
+                self.merge_actors(groups, rows)
+                Notification.objects.bulk_update(
+                    [
+                        Notification(pk=group["keep_id"], actor_count=group["total"])
+                        for group in groups.values()
+                    ],
+                    ["actor_count"],
+                )
+                rows = [
+                    {field: row[field] for field in ARCHIVE_FIELDS}
+                    for row in rows
+                    if row["id"] not in keep_ids
+                ]
+                self.delete_rows(rows, "compacted")
+            deleted += len(rows)
+        return deleted
+
+    def merge_actors(self, groups, rows):
+        """まとめる通知に反応したユーザーを、残す通知に記録する（取り消し時に使用する）"""
+        keep_ids = {
+            row["id"]: groups[
+                (row["notification_type_id"], row["receiver_id"], row["tweet_id"])
+            ]["keep_id"]
+            for row in rows
+        }
+        actors = NotificationActor.objects.filter(
+            notification_id__in=keep_ids
+        ).values_list("notification_id", "user_id")
+        NotificationActor.record(
+            [(keep_ids[row["id"]], row["sender_id"]) for row in rows]
+            + [
+                (keep_ids[notification_id], user_id)
+                for notification_id, user_id in actors
+            ]
+        )
+
+    def get_compactable_groups(self, now):
+        """まとめる対象の(通知種別, 受信者, ツイート)のグループを取得する"""
+        return (
+            Notification.get_expired(now, "compact_after_days")
+            .values("notification_type_id", "receiver_id", "tweet_id")
+            .annotate(
+                row_count=Count("pk"), keep_id=Max("pk"), total=Sum("actor_count")
+            )
+            .filter(row_count__gt=1)
+            .order_by()
+        )
+
+    def delete_rows(self, rows, reason):
+        """通知をアーカイブして削除し、未読の通知数を更新する"""
+        if self.archive is not None:
+            self.archive.write(rows, reason)
+        Notification.objects.filter(pk__in=[row["id"] for row in rows]).delete()
+        # 取り消された反応の通知は未読の場合もあるため、未読の通知数から差し引く
+        unread_counts = defaultdict(int)
+        for row in rows:
+            if not row["is_read"]:
+                unread_counts[row["receiver_id"]] -= 1
+        if unread_counts:
+            UserStats.update_counts("unread_notification_count", unread_counts)
+            for receiver_id, delta in unread_counts.items():
+                publish_unread_count(receiver_id, delta)
+
+    def vacuum(self):
+        """削除で生じた不要領域を回収し、統計情報を更新する"""
+        if connection.vendor != "postgresql":
+            self.stdout.write("VACUUMはPostgreSQLでのみ実行できます。")
+            return
+        # MEMO: VACUUMはトランザクション内で実行できないため、自動コミットで実行する
+        with connection.cursor() as cursor:
+            cursor.execute(f"VACUUM (ANALYZE) {Notification._meta.db_table}")
+        self.stdout.write("VACUUMを実行しました。")
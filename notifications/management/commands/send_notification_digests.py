@@ -0,0 +1,93 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from accounts.models import CustomUser
+from notifications.models import Notification, EmailOutbox
+
+
+class Command(BaseCommand):
+    """未送信の通知をまとめたダイジェストメールを送信待ちに登録するコマンド"""
+
+    help = (
+        "前回のダイジェスト以降の通知を受信者ごとに1通のメールにまとめ、"
+        "送信待ちに登録します（送信はsend_outbox_emailsで行います）"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--max-lines",
+            type=int,
+            default=20,
+            help="1通のメールに記載する通知の最大件数",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="終了せず、一定間隔でダイジェストメールを登録し続ける",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.NOTIFICATION_DIGEST_INTERVAL_SECONDS,
+            help="--loop指定時に、ダイジェストメールを登録する間隔（秒）",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            enqueued = self.digest_all(options["max_lines"])
+            self.stdout.write(
+                self.style.SUCCESS(f"{enqueued}件のダイジェストメールを登録しました。")
+            )
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+    def digest_all(self, max_lines):
+        """未送信の通知がある受信者ごとにダイジェストを登録する（登録件数を返す）"""
+        enqueued = 0
+        for receiver_id in list(Notification.get_undigested_receiver_ids()):
+            if self.digest(receiver_id, max_lines):
+                enqueued += 1
+        return enqueued
+
+    def digest(self, receiver_id, max_lines):
+        """1人分の通知をまとめて送信待ちに登録する（登録した場合はTrue）"""
+        now = timezone.now()
+        with transaction.atomic():
+            # MEMO: 集計中に追加・更新された通知を取りこぼさないよう、対象の行をロックする
+            notifications = list(
+                Notification.objects.select_for_update(of=("self",))
+                .filter(receiver_id=receiver_id, digested_at__isnull=True)
+                .select_related("sender", "notification_type")
+                .order_by("-updated_at", "-id")
+            )
+            if not notifications:
+                return False
+            Notification.objects.filter(
+                pk__in=[notification.pk for notification in notifications]
+            ).update(digested_at=now)
+
+            # 既読の通知は画面で確認済みのため、メールには記載しない
+            unread = [
+                notification
+                for notification in notifications
+                if not notification.is_read
+            ]
+            if not unread:
+                return False
+
+            receiver = CustomUser.objects.get(pk=receiver_id)
+            lines = [notification.get_summary() for notification in unread[:max_lines]]
+            if len(unread) > max_lines:
+                lines.append(f"ほか{len(unread) - max_lines}件の通知があります。")
+            EmailOutbox.enqueue(
+                recipient=receiver.email,
+                subject=f"新しい通知が{len(unread)}件あります",
+                body="\n".join(lines),
+                dedupe_key=f"digest:{receiver_id}:{int(now.timestamp())}",
+            )
+        return True
@@ -0,0 +1,104 @@
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from notifications.models import EmailOutbox
+
+
+class Command(BaseCommand):
+    """送信待ちのメール（email_outbox）をまとめて送信するコマンド"""
+
+    help = "送信待ちのメールをバッチ単位で送信します（失敗時は間隔を空けて再送します）"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="1回の接続で送信するメール数",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="送信待ちがなくなっても終了せず、一定間隔で送信を続ける",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=10,
+            help="--loop指定時に、送信待ちがない場合に待機する秒数",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        sent = failed = 0
+        while True:
+            batch_sent, batch_failed, processed = self.send_batch(batch_size)
+            sent += batch_sent
+            failed += batch_failed
+            if processed < batch_size:
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{sent}件のメールを送信しました。（送信失敗: {failed}件）"
+            )
+        )
+
+    def send_batch(self, batch_size):
+        """1バッチ分のメールを1つの接続で送信する（送信済み件数, 失敗件数, 処理件数）"""
+        with transaction.atomic():
+            # MEMO: 複数のワーカーで動かしても同じメールを送信しないよう、
+            # 他のワーカーが処理中の行は読み飛ばす
+            emails = list(
+                EmailOutbox.get_pending().select_for_update(skip_locked=True)[
+                    :batch_size
+                ]
+            )
+            if not emails:
+                return 0, 0, 0
+
+            sent = 0
+            connection = get_connection()
+            try:
+                connection.open()
+            except Exception as e:
+                # 接続できない場合は、バッチ全体を再送対象にする
+                for email in emails:
+                    self.mark_failed(email, e)
+            else:
+                try:
+                    for email in emails:
+                        try:
+                            EmailMessage(
+                                subject=email.subject,
+                                body=email.body,
+                                from_email=settings.FROM_EMAIL,
+                                to=[email.recipient],
+                                connection=connection,
+                            ).send()
+                        except Exception as e:
+                            self.mark_failed(email, e)
+                        else:
+                            email.mark_sent()
+                            sent += 1
+                finally:
+                    connection.close()
+
+            EmailOutbox.objects.bulk_update(
+                emails,
+                ["status", "attempts", "next_attempt_at", "last_error", "sent_at"],
+            )
+        return sent, len(emails) - sent, len(emails)
+
+    def mark_failed(self, email, error):
+        email.mark_failed(
+            error,
+            max_attempts=settings.EMAIL_OUTBOX_MAX_ATTEMPTS,
+            retry_base_seconds=settings.EMAIL_OUTBOX_RETRY_BASE_SECONDS,
+        )
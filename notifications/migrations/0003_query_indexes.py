@@ -0,0 +1,21 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notifications", "0002_notification_comment"),
+        ("tweets", "0013_query_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                fields=["receiver", "-created_at"], name="notification_receiver_idx"
+            ),
+        ),
+    ]
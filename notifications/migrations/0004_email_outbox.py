@@ -0,0 +1,86 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notifications", "0003_query_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EmailOutbox",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="登録日時"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新日時"),
+                ),
+                ("recipient", models.EmailField(max_length=254, verbose_name="宛先")),
+                ("subject", models.CharField(max_length=255, verbose_name="件名")),
+                ("body", models.TextField(verbose_name="本文")),
+                (
+                    "dedupe_key",
+                    models.CharField(
+                        max_length=255, unique=True, verbose_name="重複排除キー"
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "送信待ち"),
+                            ("sent", "送信済み"),
+                            ("failed", "送信失敗"),
+                        ],
+                        default="pending",
+                        max_length=10,
+                        verbose_name="状態",
+                    ),
+                ),
+                (
+                    "attempts",
+                    models.PositiveIntegerField(default=0, verbose_name="送信試行回数"),
+                ),
+                (
+                    "next_attempt_at",
+                    models.DateTimeField(
+                        default=django.utils.timezone.now, verbose_name="次回送信日時"
+                    ),
+                ),
+                (
+                    "last_error",
+                    models.TextField(blank=True, verbose_name="直近のエラー"),
+                ),
+                (
+                    "sent_at",
+                    models.DateTimeField(
+                        blank=True, null=True, verbose_name="送信日時"
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "email_outbox",
+                "indexes": [
+                    models.Index(
+                        fields=["status", "next_attempt_at", "id"],
+                        name="email_outbox_pending_idx",
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:40
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_existing_digested(apps, schema_editor):
+    """既存の通知は個別にメール送信済みのため、ダイジェストの対象外にする"""
+    Notification = apps.get_model("notifications", "Notification")
+    Notification.objects.update(digested_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notifications", "0004_email_outbox"),
+        ("tweets", "0013_query_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="notification",
+            name="actor_count",
+            field=models.PositiveIntegerField(
+                default=1, verbose_name="反応したユーザー数"
+            ),
+        ),
+        migrations.AddField(
+            model_name="notification",
+            name="digested_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="ダイジェスト送信日時"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("digested_at__isnull", True)),
+                fields=["receiver"],
+                name="notification_undigested_idx",
+            ),
+        ),
+        migrations.RunPython(mark_existing_digested, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("notifications", "0005_notification_coalescing"),
+        ("tweets", "0013_query_indexes"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="notification",
+            index=models.Index(
+                condition=models.Q(("is_read", False)),
+                fields=["receiver", "id"],
+                name="notification_unread_idx",
+            ),
+        ),
+    ]
@@ -1,6 +1,16 @@
-from django.db import models
-from accounts.models import CustomUser
-from tweets.models import Tweet, Comment
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from accounts.models import CustomUser, UserStats
+from tweets.models import Tweet, Comment, Like, Retweet
+from .events import publish_notification, publish_unread_count
 
 
 class AbstractCommon(models.Model):
@@ -25,12 +35,99 @@ class NotificationType(AbstractCommon):
     def __str__(self):
         return f"{self.id}：{self.name}"
 
+    # プロセス内で保持する通知種別の一覧（バージョン, {通知種別名: 通知種別}）
+    # MEMO: 通知種別はほとんど変更されないため、書き込みのたびに取得しないよう保持する
+    _registry = (None, {})
+    REGISTRY_VERSION_KEY = "notification_types:version"
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.invalidate_registry()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.invalidate_registry()
+        return result
+
+    @classmethod
+    def get_by_name(cls, name):
+        """
+        通知種別名から通知種別を取得する（プロセス内に保持済みの場合はクエリを発行しない）
+
+        Raises:
+            NotificationType.DoesNotExist: 通知種別が存在しない場合
+        """
+        version = cls.get_registry_version()
+        registry_version, registry = cls._registry
+        # 他のプロセスで変更された場合や、未登録の種別の場合は読み込み直す
+        if registry_version != version or name not in registry:
+            registry = cls.load_registry(version)
+        try:
+            return registry[name]
+        except KeyError:
+            raise cls.DoesNotExist(f"通知種別「{name}」は存在しません。")
+
+    @classmethod
+    def load_registry(cls, version):
+        """通知種別の一覧をデータベースから読み込み、プロセス内に保持する"""
+        registry = {
+            notification_type.name: notification_type
+            for notification_type in cls.objects.all()
+        }
+        cls._registry = (version, registry)
+        return registry
+
+    @classmethod
+    def get_registry_version(cls):
+        """通知種別の一覧のバージョンを取得する（全プロセスで共有する）"""
+        version = cache.get(cls.REGISTRY_VERSION_KEY)
+        if version is None:
+            # 過去のバージョンと重複しないよう、現在時刻を初期値とする
+            cache.add(cls.REGISTRY_VERSION_KEY, time.time_ns(), None)
+            version = cache.get(cls.REGISTRY_VERSION_KEY)
+        return version
+
+    @classmethod
+    def invalidate_registry(cls):
+        """
+        各プロセスで保持する通知種別の一覧を無効化する（トランザクション確定後に反映）
+
+        MEMO: QuerySet.update()などsave()を経由しない変更の後は、明示的に呼び出すこと
+        """
+        transaction.on_commit(cls._bump_registry_version)
+
+    @classmethod
+    def _bump_registry_version(cls):
+        cls._registry = (None, {})
+        try:
+            cache.incr(cls.REGISTRY_VERSION_KEY)
+        except ValueError:
+            cache.set(cls.REGISTRY_VERSION_KEY, time.time_ns(), None)
+
 
 class Notification(AbstractCommon):
     """通知情報の格納用モデル"""
 
     class Meta:
         db_table = "notification"
+        indexes = [
+            # 受信者ごとの通知一覧を新しい順に取得する
+            models.Index(
+                fields=["receiver", "-created_at"], name="notification_receiver_idx"
+            ),
+            # 受信者ごとの未読の通知を既読にする
+            models.Index(
+                fields=["receiver", "id"],
+                condition=models.Q(is_read=False),
+                name="notification_unread_idx",
+            ),
+            # ダイジェスト未送信の通知がある受信者を取得する
+            models.Index(
+                fields=["receiver"],
+                condition=models.Q(digested_at__isnull=True),
+                name="notification_undigested_idx",
+            ),
+        ]
 
     notification_type = models.ForeignKey(
         NotificationType,
@@ -60,20 +157,501 @@ class Notification(AbstractCommon):
         verbose_name="コメント",
     )
     is_read = models.BooleanField("既読フラグ", default=False)
+    # 同じツイートへの同じ種別の通知をまとめた場合の、反応したユーザー数
+    actor_count = models.PositiveIntegerField("反応したユーザー数", default=1)
+    # ダイジェストメールで通知済みの日時（未送信の場合はNone）
+    digested_at = models.DateTimeField("ダイジェスト送信日時", null=True, blank=True)
 
     def __str__(self):
         return f"{self.notification_type}：{self.sender} -> {self.receiver}"
 
+    @property
+    def other_count(self):
+        """最新の送信者以外に反応したユーザー数"""
+        return self.actor_count - 1
+
     @classmethod
     def create_notification(
         cls, notification_type_name, sender, receiver, tweet, comment=None
     ):
-        """通知情報を作成する処理"""
-        notification_type = NotificationType.objects.get(name=notification_type_name)
-        return cls.objects.create(
-            notification_type=notification_type,
-            sender=sender,
-            receiver=receiver,
-            tweet=tweet,
-            comment=comment,
+        """通知情報を作成する処理（まとめる対象の種別は、期間内の未読の通知に集約する）"""
+        notification_type = NotificationType.get_by_name(notification_type_name)
+        if cls.is_coalesced_type(notification_type_name):
+            notification = cls.coalesce(notification_type, sender, receiver, tweet)
+            if notification is not None:
+                publish_notification(notification)
+                return notification
+        with transaction.atomic():
+            notification = cls.objects.create(
+                notification_type=notification_type,
+                sender=sender,
+                receiver=receiver,
+                tweet=tweet,
+                comment=comment,
+                digested_at=cls.get_initial_digested_at(),
+            )
+            UserStats.update_count(receiver, "unread_notification_count", 1)
+            # 接続中のクライアントに新しい通知を配信する
+            publish_notification(notification)
+            publish_unread_count(receiver.pk, 1)
+        return notification
+
+    @classmethod
+    def bulk_create_notifications(cls, entries, batch_size=1000):
+        """
+        複数の通知情報を1回のbulk_createでまとめて作成する処理
+
+        フォロワー全員への通知など、大量の通知を作成する場合に使用する。
+        まとめる対象の種別は、期間内の未読の通知と同じ通知同士を1件に集約する。
+
+        Args:
+            entries (Iterable[tuple]): (送信者, 受信者, ツイート, 通知種別名)のタプル
+                （コメントの通知の場合は、5番目の要素にコメントを指定する）
+            batch_size (int): 1回のINSERT文で作成する件数
+
+        Returns:
+            list[Notification]: 作成・更新した通知情報
+        """
+        digested_at = cls.get_initial_digested_at()
+        # まとめる対象の通知は(通知種別, 受信者, ツイート)ごとに集約する
+        grouped = defaultdict(list)
+        notifications = []
+        for sender, receiver, tweet, notification_type_name, *rest in entries:
+            notification_type = NotificationType.get_by_name(notification_type_name)
+            if cls.is_coalesced_type(notification_type_name):
+                key = (notification_type.pk, receiver.pk, tweet.pk)
+                grouped[key].append((sender, receiver, tweet, notification_type))
+                continue
+            notifications.append(
+                cls(
+                    notification_type=notification_type,
+                    sender=sender,
+                    receiver=receiver,
+                    tweet=tweet,
+                    comment=rest[0] if rest else None,
+                    digested_at=digested_at,
+                )
+            )
+
+        with transaction.atomic():
+            updated, actors = cls.coalesce_many(grouped) if grouped else ([], [])
+            coalesced = []
+            for group in grouped.values():
+                # 最新の送信者を表示するため、最後の送信者を採用する
+                sender, receiver, tweet, notification_type = group[-1]
+                notification = cls(
+                    notification_type=notification_type,
+                    sender=sender,
+                    receiver=receiver,
+                    tweet=tweet,
+                    actor_count=len(group),
+                    digested_at=digested_at,
+                )
+                notifications.append(notification)
+                if len(group) > 1:
+                    coalesced.append((notification, group))
+            created = cls.objects.bulk_create(notifications, batch_size=batch_size)
+            NotificationActor.record(
+                actors
+                + [
+                    (notification.pk, entry[0].pk)
+                    for notification, group in coalesced
+                    for entry in group
+                ]
+            )
+            # 受信者ごとの未読の通知数を、増加数ごとにまとめて更新する
+            unread_counts = defaultdict(int)
+            for notification in created:
+                unread_counts[notification.receiver_id] += 1
+            UserStats.update_counts("unread_notification_count", unread_counts)
+            # 接続中のクライアントに新しい通知を配信する
+            for notification in created + updated:
+                publish_notification(notification)
+            for receiver_id, count in unread_counts.items():
+                publish_unread_count(receiver_id, count)
+        return created + updated
+
+    # 通知のもとになる反応のモデル（通知種別名: モデル）
+    ENGAGEMENT_MODELS = {"like": Like, "retweet": Retweet}
+
+    @classmethod
+    def remove_engagement(cls, notification_type_name, sender, tweet):
+        """
+        取り消された反応（いいね・リツイート）の通知を削除する
+
+        他のユーザーの反応とまとめた通知の場合は、削除せずに件数を減らす。
+        """
+        notification_type = NotificationType.get_by_name(notification_type_name)
+        with transaction.atomic():
+            # 同じツイートへの同じ種別の通知のうち、取り消したユーザーが反応した通知を探す
+            # MEMO: まとめる前から送信者となっている通知は、反応したユーザーの記録がない
+            notification = (
+                cls.objects.select_for_update()
+                .filter(
+                    Q(sender=sender)
+                    | Exists(
+                        NotificationActor.objects.filter(
+                            notification=OuterRef("pk"), user=sender
+                        )
+                    ),
+                    notification_type=notification_type,
+                    receiver_id=tweet.user_id,
+                    tweet=tweet,
+                )
+                .order_by("-created_at")
+                .first()
+            )
+            if notification is None:
+                return
+
+            if notification.actor_count <= 1:
+                notification.delete()
+                if not notification.is_read:
+                    UserStats.update_count(
+                        notification.receiver, "unread_notification_count", -1
+                    )
+                    publish_unread_count(notification.receiver_id, -1)
+                return
+
+            notification.actor_count -= 1
+            notification.actors.filter(user=sender).delete()
+            if notification.sender_id == sender.pk:
+                # 表示する送信者を、残っている反応したユーザーのうち最新のユーザーに置き換える
+                notification.sender_id = (
+                    notification.actors.order_by("-id")
+                    .values_list("user_id", flat=True)
+                    .first()
+                    or notification.sender_id
+                )
+            # MEMO: 一覧の並び順やダイジェストの対象を変えないよう、更新日時は更新しない
+            cls.objects.filter(pk=notification.pk).update(
+                actor_count=notification.actor_count, sender=notification.sender_id
+            )
+
+    @classmethod
+    def get_orphaned(cls):
+        """もとになる反応が取り消された通知を取得する（まとめた通知は対象外）"""
+        condition = Q()
+        for notification_type_name, model in cls.ENGAGEMENT_MODELS.items():
+            engagements = model.objects.filter(
+                user=OuterRef("sender"), tweet=OuterRef("tweet")
+            )
+            condition |= Q(notification_type__name=notification_type_name) & ~Exists(
+                engagements
+            )
+        return cls.objects.filter(condition, actor_count=1)
+
+    @classmethod
+    def get_expired(cls, now, policy_key):
+        """
+        保持ポリシーの期限を過ぎた既読の通知を取得する
+
+        Args:
+            now (datetime): 基準日時
+            policy_key (str): 期限の種類（compact_after_daysまたはdelete_after_days）
+        """
+        condition = Q()
+        for notification_type_name, policy in settings.NOTIFICATION_RETENTION.items():
+            days = policy.get(policy_key)
+            if days is None:
+                continue
+            condition |= Q(
+                notification_type__name=notification_type_name,
+                created_at__lt=now - timedelta(days=days),
+            )
+        if not condition:
+            return cls.objects.none()
+        return cls.objects.filter(condition, is_read=True)
+
+    @classmethod
+    def mark_all_read(cls, receiver, until_id):
+        """
+        指定したID以下の未読の通知をまとめて既読にする
+
+        一覧の表示後に届いた通知を既読にしないよう、表示した通知の最大IDまでを対象にする。
+
+        Returns:
+            int: 既読にした通知の件数
+        """
+        with transaction.atomic():
+            updated = cls.objects.filter(
+                receiver=receiver, is_read=False, id__lte=until_id
+            ).update(is_read=True)
+            if updated:
+                UserStats.update_count(receiver, "unread_notification_count", -updated)
+                publish_unread_count(receiver.pk, -updated)
+        return updated
+
+    @classmethod
+    def coalesce_many(cls, grouped):
+        """
+        期間内の未読の同種の通知に、複数の通知をまとめて集約する
+
+        集約した分はgroupedから取り除く。
+
+        Returns:
+            tuple: 集約先の通知のリストと、反応したユーザーとして記録する
+                (通知ID, ユーザーID)のリスト
+        """
+        receiver_ids = {receiver_id for _, receiver_id, _ in grouped}
+        tweet_ids = {tweet_id for _, _, tweet_id in grouped}
+        candidates = (
+            cls.objects.select_for_update()
+            .filter(
+                notification_type_id__in={key[0] for key in grouped},
+                receiver_id__in=receiver_ids,
+                tweet_id__in=tweet_ids,
+                is_read=False,
+                created_at__gte=cls.get_coalesce_since(),
+            )
+            .order_by("created_at")
+        )
+        targets = {}
+        for notification in candidates:
+            key = (
+                notification.notification_type_id,
+                notification.receiver_id,
+                notification.tweet_id,
+            )
+            # 最新の通知に集約する
+            if key in grouped:
+                targets[key] = notification
+
+        actors = []
+        for key, notification in targets.items():
+            group = grouped.pop(key)
+            actors.append((notification.pk, notification.sender_id))
+            actors += [(notification.pk, entry[0].pk) for entry in group]
+            notification.actor_count += len(group)
+            notification.sender = group[-1][0]
+            notification.notification_type = group[-1][3]
+            if settings.NOTIFICATION_EMAIL_DIGEST:
+                notification.digested_at = None
+            notification.updated_at = timezone.now()
+        notifications = list(targets.values())
+        cls.objects.bulk_update(
+            notifications, ["actor_count", "sender", "digested_at", "updated_at"]
+        )
+        return notifications, actors
+
+    @staticmethod
+    def is_coalesced_type(notification_type_name):
+        """期間内の未読の通知に集約する種別かどうか"""
+        return bool(
+            notification_type_name in settings.NOTIFICATION_COALESCE_TYPES
+            and settings.NOTIFICATION_COALESCE_WINDOW_MINUTES
         )
+
+    @staticmethod
+    def get_coalesce_since():
+        """集約の対象とする通知の作成日時の下限を取得する"""
+        return timezone.now() - timedelta(
+            minutes=settings.NOTIFICATION_COALESCE_WINDOW_MINUTES
+        )
+
+    @staticmethod
+    def get_initial_digested_at():
+        """作成時のダイジェスト送信日時を取得する"""
+        # 個別にメールを送る場合は、ダイジェストの対象にしない
+        return None if settings.NOTIFICATION_EMAIL_DIGEST else timezone.now()
+
+    @classmethod
+    def coalesce(cls, notification_type, sender, receiver, tweet):
+        """
+        期間内の未読の同種の通知に集約する（行を追加せず、件数と送信者を更新する）
+
+        Returns:
+            Notification: 集約先の通知（集約先がない場合はNone）
+        """
+        since = cls.get_coalesce_since()
+        with transaction.atomic():
+            notification = (
+                cls.objects.select_for_update()
+                .filter(
+                    notification_type=notification_type,
+                    receiver=receiver,
+                    tweet=tweet,
+                    is_read=False,
+                    created_at__gte=since,
+                )
+                .order_by("-created_at")
+                .first()
+            )
+            if notification is None:
+                return None
+            # 集約前の送信者と、新たに反応したユーザーを記録する（取り消し時に使用する）
+            NotificationActor.record(
+                [
+                    (notification.pk, notification.sender_id),
+                    (notification.pk, sender.pk),
+                ]
+            )
+            notification.actor_count += 1
+            notification.sender = sender
+            if settings.NOTIFICATION_EMAIL_DIGEST:
+                # 新しい反応を次回のダイジェストに含める
+                notification.digested_at = None
+            notification.save(
+                update_fields=["actor_count", "sender", "digested_at", "updated_at"]
+            )
+        return notification
+
+    @classmethod
+    def get_undigested_receiver_ids(cls):
+        """ダイジェスト未送信の通知がある受信者のIDを取得する"""
+        return (
+            cls.objects.filter(digested_at__isnull=True)
+            .order_by("receiver_id")
+            .values_list("receiver_id", flat=True)
+            .distinct()
+        )
+
+    # ダイジェストメールに記載する通知種別ごとの文言
+    SUMMARY_TEMPLATES = {
+        "like": "{name}があなたのツイートをいいねしました。",
+        "retweet": "{name}があなたのツイートをリツイートしました。",
+        "comment": "{name}があなたのツイートにコメントしました。",
+    }
+
+    def get_summary(self):
+        """ダイジェストメールに記載する1行分の文言を取得する"""
+        name = f"{self.sender.username}さん"
+        if self.actor_count > 1:
+            name = f"{name}と他{self.other_count}人"
+        template = self.SUMMARY_TEMPLATES.get(
+            self.notification_type.name, "{name}があなたのツイートに反応しました。"
+        )
+        return template.format(name=name)
+
+    def enqueue_email(self, subject, body):
+        """通知メールを送信待ちに登録する（通知と同じトランザクション内で呼び出す）"""
+        # ダイジェスト配信時は個別に送らず、send_notification_digestsでまとめて送る
+        if settings.NOTIFICATION_EMAIL_DIGEST:
+            return
+        EmailOutbox.enqueue(
+            recipient=self.receiver.email,
+            subject=subject,
+            body=body,
+            dedupe_key=f"notification:{self.pk}",
+        )
+
+
+class NotificationActor(AbstractCommon):
+    """まとめた通知に反応したユーザーの格納用モデル"""
+
+    class Meta:
+        db_table = "notification_actor"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["notification", "user"],
+                name="unique_notification_actor",
+            )
+        ]
+
+    notification = models.ForeignKey(
+        Notification,
+        on_delete=models.CASCADE,
+        related_name="actors",
+        verbose_name="通知",
+    )
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name="notification_actors",
+        verbose_name="反応したユーザー",
+    )
+
+    def __str__(self):
+        return f"{self.notification_id}：{self.user}"
+
+    @classmethod
+    def record(cls, pairs):
+        """通知と反応したユーザーの組を記録する（記録済みの組は無視する）"""
+        actors = [
+            cls(notification_id=notification_id, user_id=user_id)
+            for notification_id, user_id in pairs
+        ]
+        if actors:
+            cls.objects.bulk_create(actors, ignore_conflicts=True)
+
+
+class EmailOutbox(AbstractCommon):
+    """
+    送信待ちのメールの格納用モデル（トランザクショナル・アウトボックス）
+
+    通知と同じトランザクションで登録し、send_outbox_emailsコマンドでまとめて送信する。
+    """
+
+    class Meta:
+        db_table = "email_outbox"
+        indexes = [
+            # 送信対象（未送信かつ送信予定日時を過ぎたもの）を古い順に取得する
+            models.Index(
+                fields=["status", "next_attempt_at", "id"],
+                name="email_outbox_pending_idx",
+            )
+        ]
+
+    STATUS_PENDING = "pending"
+    STATUS_SENT = "sent"
+    STATUS_FAILED = "failed"
+    STATUS_CHOICES = (
+        (STATUS_PENDING, "送信待ち"),
+        (STATUS_SENT, "送信済み"),
+        (STATUS_FAILED, "送信失敗"),
+    )
+
+    recipient = models.EmailField("宛先")
+    subject = models.CharField("件名", max_length=255)
+    body = models.TextField("本文")
+    # 同じメールを重複して登録・送信しないためのキー
+    dedupe_key = models.CharField("重複排除キー", max_length=255, unique=True)
+    status = models.CharField(
+        "状態", max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING
+    )
+    attempts = models.PositiveIntegerField("送信試行回数", default=0)
+    next_attempt_at = models.DateTimeField("次回送信日時", default=timezone.now)
+    last_error = models.TextField("直近のエラー", blank=True)
+    sent_at = models.DateTimeField("送信日時", null=True, blank=True)
+
+    def __str__(self):
+        return f"[{self.status}] {self.recipient}：{self.subject}"
+
+    @classmethod
+    def enqueue(cls, recipient, subject, body, dedupe_key):
+        """送信待ちのメールを登録する（同じキーのメールが登録済みの場合は何もしない）"""
+        cls.objects.bulk_create(
+            [
+                cls(
+                    recipient=recipient,
+                    subject=subject,
+                    body=body,
+                    dedupe_key=dedupe_key,
+                )
+            ],
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def get_pending(cls):
+        """送信予定日時を過ぎた送信待ちのメールを古い順に取得する"""
+        return cls.objects.filter(
+            status=cls.STATUS_PENDING, next_attempt_at__lte=timezone.now()
+        ).order_by("next_attempt_at", "id")
+
+    def mark_sent(self):
+        """送信済みにする"""
+        self.status = self.STATUS_SENT
+        self.attempts += 1
+        self.sent_at = timezone.now()
+        self.last_error = ""
+
+    def mark_failed(self, error, max_attempts, retry_base_seconds):
+        """送信失敗を記録し、上限回数までは指数的に間隔を空けて再送を予定する"""
+        self.attempts += 1
+        self.last_error = str(error)
+        if self.attempts >= max_attempts:
+            self.status = self.STATUS_FAILED
+        else:
+            delay = retry_base_seconds * 2 ** (self.attempts - 1)
+            self.next_attempt_at = timezone.now() + timedelta(seconds=delay)
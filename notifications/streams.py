@@ -0,0 +1,161 @@
+# 通知のイベントをServer-Sent Eventsで配信する処理をまとめる
+import asyncio
+import json
+from importlib import import_module
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.db import connections
+from django.http import parse_cookie
+from django.urls import reverse
+
+from accounts.models import UserStats
+from .events import get_event_backend
+
+# ストリームの応答ヘッダー
+STREAM_HEADERS = {
+    "Content-Type": "text/event-stream",
+    "Cache-Control": "no-cache",
+    # MEMO: リバースプロキシでイベントが溜め込まれないよう、バッファリングを無効にする
+    "X-Accel-Buffering": "no",
+}
+# ストリームを配信しているリクエストのスコープに設定するキー（request.scopeで参照する）
+STREAM_SCOPE_KEY = "notification_stream"
+
+
+def format_event(event_type, data):
+    """イベントをServer-Sent Eventsの形式に変換する"""
+    payload = json.dumps(data, ensure_ascii=False)
+    return f"event: {event_type}\ndata: {payload}\n\n"
+
+
+def get_unread_count(user_id):
+    """ストリームの開始時に送る未読の通知数を取得する"""
+    unread_count = (
+        UserStats.objects.filter(user_id=user_id)
+        .values_list("unread_notification_count", flat=True)
+        .first()
+    )
+    return unread_count or 0
+
+
+async def stream_events(user_id, unread_count):
+    """
+    ユーザー宛てのイベントをServer-Sent Eventsの形式で送り続ける
+
+    接続時に未読の通知数を送り、以降は新しい通知と未読の通知数の増減を送る。
+    """
+    backend = get_event_backend()
+    await backend.start()
+    async with backend.broker.subscribe(user_id) as queue:
+        # 再接続が集中しないよう、再接続までの待ち時間を長めに指定する
+        yield "retry: 10000\n\n"
+        yield format_event("unread_count", {"count": unread_count})
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    queue.get(), settings.NOTIFICATION_STREAM_KEEPALIVE_SECONDS
+                )
+            except asyncio.TimeoutError:
+                # 接続が切られないよう、定期的にコメント行を送る
+                yield ": keepalive\n\n"
+                continue
+            yield format_event(event["type"], event["data"])
+
+
+def get_stream_user(session_key):
+    """
+    セッションからストリームを購読するユーザーのIDと未読の通知数を取得する
+
+    Returns:
+        tuple: (ユーザーID, 未読の通知数)（未ログインの場合はユーザーIDがNone）
+    """
+    try:
+        if not session_key:
+            return None, 0
+        engine = import_module(settings.SESSION_ENGINE)
+        # MEMO: get_user()はrequest.sessionのみを参照するため、セッションだけを持たせる
+        user = get_user(SimpleNamespace(session=engine.SessionStore(session_key)))
+        if not user.is_authenticated:
+            return None, 0
+        return user.pk, get_unread_count(user.pk)
+    finally:
+        # 待機中の接続がデータベース接続を保持し続けないよう、配信前に切断する
+        connections.close_all()
+
+
+class NotificationStreamApplication:
+    """
+    通知のストリームを、Djangoのリクエスト処理を経由せずに配信するASGIアプリケーション
+
+    Djangoのリクエスト処理では、応答の送信が終わるまでリクエストごとのスレッドが
+    保持されるため、待機中の接続を多数保持できない。ここではイベントループ上の
+    タスクのみで接続を保持する。ストリーム以外のリクエストはDjangoに渡す。
+
+    Args:
+        application: Djangoのアプリケーション（get_asgi_application()）
+    """
+
+    def __init__(self, application):
+        self.application = application
+        self.path = reverse("notifications:notification_stream")
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] == "http"
+            and scope["method"] == "GET"
+            and scope["path"] == self.path
+        ):
+            await self.handle(scope, receive, send)
+        else:
+            if scope["type"] == "http":
+                # ストリームを配信できることを、テンプレートなどから判定できるようにする
+                scope = {**scope, STREAM_SCOPE_KEY: True}
+            await self.application(scope, receive, send)
+
+    async def handle(self, scope, receive, send):
+        headers = dict(scope["headers"])
+        cookies = parse_cookie(headers.get(b"cookie", b"").decode("latin-1"))
+        user_id, unread_count = await sync_to_async(
+            get_stream_user, thread_sensitive=False
+        )(cookies.get(settings.SESSION_COOKIE_NAME))
+        if user_id is None:
+            await send({"type": "http.response.start", "status": 401, "headers": []})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 200,
+                "headers": [
+                    (name.encode(), value.encode())
+                    for name, value in STREAM_HEADERS.items()
+                ],
+            }
+        )
+        # クライアントが切断したら、イベントの送信を止めて購読を解除する
+        sender = asyncio.ensure_future(self.send_events(send, user_id, unread_count))
+        disconnected = asyncio.ensure_future(self.wait_for_disconnect(receive))
+        done, pending = await asyncio.wait(
+            {sender, disconnected}, return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    async def send_events(self, send, user_id, unread_count):
+        async for chunk in stream_events(user_id, unread_count):
+            await send(
+                {
+                    "type": "http.response.body",
+                    "body": chunk.encode(),
+                    "more_body": True,
+                }
+            )
+
+    async def wait_for_disconnect(self, receive):
+        while (await receive())["type"] != "http.disconnect":
+            pass
@@ -1,3 +1,606 @@
-from django.test import TestCase
+import asyncio
+import gzip
+import json
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import CustomUser, UserStats
+from notifications.events import get_event_backend
+from notifications.models import EmailOutbox, Notification, NotificationType
+from notifications.streams import STREAM_SCOPE_KEY, NotificationStreamApplication
+from tweets.models import Comment, Tweet
+
+
+def create_user(username):
+    return CustomUser.objects.create_user(
+        username=username, email=f"{username}@example.com", password="password"
+    )
+
+
+class NotificationTestCase(TestCase):
+    """通知関連のテストの共通処理"""
+
+    def setUp(self):
+        cache.clear()
+        # 通知種別の一覧の無効化はトランザクション確定後に行われるため、ここで反映させる
+        with self.captureOnCommitCallbacks(execute=True):
+            for name in ["like", "retweet", "comment"]:
+                NotificationType.objects.create(name=name)
+        self.author = create_user("author")
+        self.tweet = Tweet.objects.create(user=self.author, content="tweet")
+        self.users = [create_user(f"user{i}") for i in range(3)]
+
+    def notify(self, name, sender, **kwargs):
+        return Notification.create_notification(
+            name, sender, self.author, self.tweet, **kwargs
+        )
+
+    def get_unread_count(self):
+        return UserStats.objects.get(user=self.author).unread_notification_count
+
+
+class NotificationTypeRegistryTests(NotificationTestCase):
+    """プロセス内に保持する通知種別の一覧"""
+
+    def test_get_by_name_uses_registry(self):
+        NotificationType.get_by_name("like")
+        with self.assertNumQueries(0):
+            self.assertEqual(NotificationType.get_by_name("like").name, "like")
+
+    def test_registry_is_reloaded_after_change(self):
+        NotificationType.get_by_name("like")
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationType.objects.filter(name="like").update(description="更新")
+            NotificationType.invalidate_registry()
+        with self.assertNumQueries(1):
+            self.assertEqual(NotificationType.get_by_name("like").description, "更新")
+
+    def test_unknown_type_raises_does_not_exist(self):
+        with self.assertRaises(NotificationType.DoesNotExist):
+            NotificationType.get_by_name("unknown")
+
+    def test_bulk_create_updates_unread_counts(self):
+        other_tweet = Tweet.objects.create(user=self.users[0], content="tweet")
+        comment = Comment.objects.create(
+            user=self.users[1], tweet=self.tweet, content="c"
+        )
+        created = Notification.bulk_create_notifications(
+            [
+                (self.users[1], self.author, self.tweet, "comment", comment),
+                (self.author, self.users[0], other_tweet, "retweet"),
+            ]
+        )
+
+        self.assertEqual(len(created), 2)
+        self.assertEqual(
+            Notification.objects.get(receiver=self.author).comment, comment
+        )
+        self.assertEqual(self.get_unread_count(), 1)
+        self.assertEqual(
+            UserStats.objects.get(user=self.users[0]).unread_notification_count, 1
+        )
+
+
+class NotificationCoalesceTests(NotificationTestCase):
+    """同じツイートへの同じ種別の未読の通知の集約"""
+
+    def test_unread_likes_are_coalesced(self):
+        for user in self.users:
+            self.notify("like", user)
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 3)
+        self.assertEqual(notification.other_count, 2)
+        self.assertEqual(notification.sender, self.users[-1])
+        self.assertEqual(self.get_unread_count(), 1)
+
+    def test_read_notification_is_not_coalesced(self):
+        first = self.notify("like", self.users[0])
+        Notification.mark_all_read(self.author, first.pk)
+        self.notify("like", self.users[1])
+
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertEqual(self.get_unread_count(), 1)
+
+    def test_notification_outside_window_is_not_coalesced(self):
+        self.notify("like", self.users[0])
+        Notification.objects.update(created_at=timezone.now() - timedelta(days=2))
+        self.notify("like", self.users[1])
+
+        self.assertEqual(Notification.objects.count(), 2)
+
+    def test_comments_and_other_types_are_not_coalesced(self):
+        for user in self.users[:2]:
+            comment = Comment.objects.create(user=user, tweet=self.tweet, content="c")
+            self.notify("comment", user, comment=comment)
+        self.notify("retweet", self.users[0])
+        self.notify("like", self.users[0])
+
+        self.assertEqual(Notification.objects.count(), 4)
+
+    def test_bulk_create_coalesces_with_existing_notification(self):
+        self.notify("like", self.users[0])
+        Notification.bulk_create_notifications(
+            [
+                (self.users[1], self.author, self.tweet, "like"),
+                (self.users[2], self.author, self.tweet, "like"),
+                (self.users[0], self.author, self.tweet, "retweet"),
+                (self.users[1], self.author, self.tweet, "retweet"),
+            ]
+        )
+
+        self.assertEqual(
+            sorted(
+                Notification.objects.values_list(
+                    "notification_type__name", "actor_count"
+                )
+            ),
+            [("like", 3), ("retweet", 2)],
+        )
+        self.assertEqual(self.get_unread_count(), 2)
+
+
+class NotificationRemoveEngagementTests(NotificationTestCase):
+    """取り消された反応の通知の削除"""
+
+    def remove(self, name, sender):
+        Notification.remove_engagement(name, sender, self.tweet)
+
+    def test_unlike_after_coalescing_decrements_actor_count(self):
+        for user in self.users:
+            self.notify("like", user)
+
+        # 最新の送信者以外の取り消しは、件数のみ減らす
+        self.remove("like", self.users[0])
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(notification.sender, self.users[2])
+
+        # 最新の送信者の取り消しは、残っているユーザーのうち最新のユーザーに置き換える
+        self.remove("like", self.users[2])
+        notification.refresh_from_db()
+        self.assertEqual(notification.actor_count, 1)
+        self.assertEqual(notification.sender, self.users[1])
+
+        self.remove("like", self.users[1])
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(self.get_unread_count(), 0)
+
+    def test_unlike_targets_notification_the_user_was_coalesced_into(self):
+        self.notify("like", self.users[0])
+        first = self.notify("like", self.users[1])
+        Notification.mark_all_read(self.author, first.pk)
+        second = self.notify("like", self.users[2])
+
+        self.remove("like", self.users[0])
+
+        first.refresh_from_db()
+        self.assertEqual(first.actor_count, 1)
+        self.assertEqual(first.sender, self.users[1])
+        self.assertEqual(Notification.objects.get(pk=second.pk).actor_count, 1)
+
+    def test_unlike_after_bulk_coalescing(self):
+        Notification.bulk_create_notifications(
+            [(user, self.author, self.tweet, "like") for user in self.users]
+        )
+
+        self.remove("like", self.users[0])
+
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 2)
+        self.assertEqual(notification.sender, self.users[2])
+
+    def test_user_who_did_not_engage_is_ignored(self):
+        for user in self.users[:2]:
+            self.notify("like", user)
+
+        self.remove("like", self.users[2])
+        self.remove("retweet", self.users[0])
+
+        self.assertEqual(Notification.objects.get().actor_count, 2)
+
+
+class NotificationInboxTests(NotificationTestCase):
+    """通知一覧の表示と一括既読"""
+
+    def setUp(self):
+        super().setUp()
+        self.tweets = [
+            Tweet.objects.create(user=self.author, content=f"tweet {i}")
+            for i in range(25)
+        ]
+        for tweet in self.tweets:
+            Notification.create_notification("like", self.users[0], self.author, tweet)
+        self.client.force_login(self.author)
+
+    def test_list_is_paginated_newest_first(self):
+        first = self.client.get("/notifications/").context
+        second = self.client.get(
+            "/notifications/", {"cursor": first["page_obj"].next_cursor}
+        ).context
+
+        ids = [item.pk for item in [*first["page_obj"], *second["page_obj"]]]
+        self.assertEqual(
+            ids, list(Notification.objects.order_by("-pk").values_list("pk", flat=True))
+        )
+        self.assertEqual(first["read_until_id"], ids[0])
+        self.assertIsNone(second["read_until_id"])
+
+    def test_mark_all_read_until_displayed_notification(self):
+        until_id = self.client.get("/notifications/").context["read_until_id"]
+        # 一覧の表示後に届いた通知は既読にしない
+        Notification.create_notification(
+            "retweet", self.users[1], self.author, self.tweet
+        )
+
+        response = self.client.post("/notifications/read/", {"until_id": until_id})
+
+        self.assertRedirects(response, "/notifications/")
+        self.assertEqual(
+            list(
+                Notification.objects.filter(is_read=False).values_list("pk", flat=True)
+            ),
+            [until_id + 1],
+        )
+        self.assertEqual(self.get_unread_count(), 1)
+
+    def test_mark_all_read_requires_until_id(self):
+        response = self.client.post("/notifications/read/", {"until_id": "x"})
+
+        self.assertRedirects(response, "/notifications/")
+        self.assertEqual(self.get_unread_count(), 25)
+
+    def test_mark_all_read_only_affects_own_notifications(self):
+        Notification.create_notification(
+            "like", self.author, self.users[0], self.tweets[0]
+        )
+        self.assertEqual(
+            Notification.mark_all_read(
+                self.author, Notification.objects.latest("pk").pk
+            ),
+            25,
+        )
+        self.assertEqual(
+            UserStats.objects.get(user=self.users[0]).unread_notification_count, 1
+        )
+
+
+class NotificationDigestTests(NotificationTestCase):
+    """通知のダイジェストメールの登録（send_notification_digests）"""
+
+    def send_notification_digests(self):
+        call_command("send_notification_digests", stdout=mock.Mock())
+
+    def test_digest_is_enqueued_once_per_receiver(self):
+        self.notify("like", self.users[0])
+        self.notify("like", self.users[1])
+        self.notify("retweet", self.users[0])
+        self.send_notification_digests()
+        self.send_notification_digests()
+
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.recipient, "author@example.com")
+        self.assertEqual(email.subject, "新しい通知が2件あります")
+        self.assertIn(
+            "user1さんと他1人があなたのツイートをいいねしました。", email.body
+        )
+        self.assertFalse(Notification.objects.filter(digested_at__isnull=True).exists())
+
+    def test_coalesced_reaction_is_included_in_next_digest(self):
+        self.notify("like", self.users[0])
+        self.send_notification_digests()
+        self.notify("like", self.users[1])
+
+        # 重複排除キーが秒単位のため、1秒後に登録する
+        later = timezone.now() + timedelta(seconds=1)
+        with mock.patch("django.utils.timezone.now", return_value=later):
+            self.send_notification_digests()
+        self.assertEqual(EmailOutbox.objects.count(), 2)
+
+    def test_read_notifications_are_not_emailed(self):
+        notification = self.notify("like", self.users[0])
+        Notification.mark_all_read(self.author, notification.pk)
+        self.send_notification_digests()
+
+        self.assertFalse(EmailOutbox.objects.exists())
+        self.assertFalse(Notification.objects.filter(digested_at__isnull=True).exists())
+
+    @override_settings(NOTIFICATION_EMAIL_DIGEST=False)
+    def test_notifications_are_not_digested_when_disabled(self):
+        self.notify("like", self.users[0])
+        self.send_notification_digests()
+
+        self.assertFalse(EmailOutbox.objects.exists())
+
+
+@override_settings(
+    EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+    FROM_EMAIL="noreply@example.com",
+    EMAIL_OUTBOX_MAX_ATTEMPTS=3,
+    EMAIL_OUTBOX_RETRY_BASE_SECONDS=60,
+)
+class EmailOutboxTests(TestCase):
+    """送信待ちのメールの送信（send_outbox_emails）"""
+
+    def send_outbox_emails(self):
+        call_command("send_outbox_emails", stdout=mock.Mock())
+
+    def test_enqueue_ignores_duplicate_key(self):
+        EmailOutbox.enqueue("a@example.com", "件名", "本文", dedupe_key="key")
+        EmailOutbox.enqueue("a@example.com", "件名", "本文", dedupe_key="key")
+        self.assertEqual(EmailOutbox.objects.count(), 1)
+
+    def test_sends_pending_emails_once(self):
+        EmailOutbox.enqueue("a@example.com", "件名", "本文", dedupe_key="key")
+        self.send_outbox_emails()
+        self.send_outbox_emails()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["a@example.com"])
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.status, EmailOutbox.STATUS_SENT)
+        self.assertEqual(email.attempts, 1)
+        self.assertIsNotNone(email.sent_at)
+
+    def test_failed_email_is_retried_with_backoff(self):
+        EmailOutbox.enqueue("a@example.com", "件名", "本文", dedupe_key="key")
+        with mock.patch(
+            "django.core.mail.EmailMessage.send", side_effect=OSError("SMTP error")
+        ):
+            before = timezone.now()
+            self.send_outbox_emails()
+            email = EmailOutbox.objects.get()
+            self.assertEqual(email.status, EmailOutbox.STATUS_PENDING)
+            self.assertEqual(email.attempts, 1)
+            self.assertEqual(email.last_error, "SMTP error")
+            self.assertGreaterEqual(
+                email.next_attempt_at, before + timedelta(seconds=60)
+            )
+
+            # 再送予定日時までは送信しない
+            self.send_outbox_emails()
+            self.assertEqual(EmailOutbox.objects.get().attempts, 1)
+
+            # 再送のたびに間隔を2倍にする
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            before = timezone.now()
+            self.send_outbox_emails()
+            email = EmailOutbox.objects.get()
+            self.assertEqual(email.attempts, 2)
+            self.assertGreaterEqual(
+                email.next_attempt_at, before + timedelta(seconds=120)
+            )
+
+            # 上限回数に達したら送信失敗とする
+            EmailOutbox.objects.update(next_attempt_at=timezone.now())
+            self.send_outbox_emails()
+            email = EmailOutbox.objects.get()
+            self.assertEqual(email.status, EmailOutbox.STATUS_FAILED)
+            self.assertEqual(email.attempts, 3)
+
+        EmailOutbox.objects.update(next_attempt_at=timezone.now())
+        self.send_outbox_emails()
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_connection_error_retries_whole_batch(self):
+        for i in range(3):
+            EmailOutbox.enqueue(f"{i}@example.com", "件名", "本文", dedupe_key=i)
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.open",
+            side_effect=OSError("connection refused"),
+        ):
+            self.send_outbox_emails()
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(
+            list(EmailOutbox.objects.values_list("status", "attempts").distinct()),
+            [(EmailOutbox.STATUS_PENDING, 1)],
+        )
+
+
+class PruneNotificationsTests(NotificationTestCase):
+    """通知の保持ポリシーの適用（prune_notifications）"""
+
+    def setUp(self):
+        super().setUp()
+        self.archive_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.archive_dir.cleanup)
+
+    def prune_notifications(self, *args):
+        stdout = mock.Mock()
+        call_command(
+            "prune_notifications",
+            "--batch-size=2",
+            f"--archive-dir={self.archive_dir.name}",
+            *args,
+            stdout=stdout,
+        )
+        return stdout
+
+    def create(self, name, sender, days_ago, is_read=True, engaged=True):
+        if engaged and name in Notification.ENGAGEMENT_MODELS:
+            Notification.ENGAGEMENT_MODELS[name].objects.get_or_create(
+                user=sender, tweet=self.tweet
+            )
+        notification = Notification.objects.create(
+            notification_type=NotificationType.get_by_name(name),
+            sender=sender,
+            receiver=self.author,
+            tweet=self.tweet,
+            is_read=is_read,
+        )
+        Notification.objects.filter(pk=notification.pk).update(
+            created_at=timezone.now() - timedelta(days=days_ago)
+        )
+        return notification
+
+    def read_archive(self):
+        rows = []
+        for path in sorted(Path(self.archive_dir.name).glob("*.jsonl.gz")):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                rows.extend(json.loads(line) for line in f)
+        return rows
+
+    def test_orphaned_notification_is_deleted(self):
+        kept = self.create("like", self.users[0], days_ago=0, is_read=False)
+        orphaned = self.create(
+            "like", self.users[1], days_ago=0, is_read=False, engaged=False
+        )
+        UserStats.update_count(self.author, "unread_notification_count", 2)
+        self.prune_notifications()
+
+        self.assertEqual(list(Notification.objects.all()), [kept])
+        self.assertEqual(self.get_unread_count(), 1)
+        self.assertEqual(
+            [(row["id"], row["reason"]) for row in self.read_archive()],
+            [(orphaned.pk, "orphaned")],
+        )
+
+    def test_old_read_notifications_are_compacted(self):
+        for user in self.users:
+            self.create("like", user, days_ago=31)
+        latest = Notification.objects.latest("pk")
+        recent = self.create("retweet", self.users[0], days_ago=1)
+        self.create("retweet", self.users[1], days_ago=1)
+        self.prune_notifications()
+
+        compacted = Notification.objects.get(notification_type__name="like")
+        self.assertEqual(compacted.pk, latest.pk)
+        self.assertEqual(compacted.actor_count, 3)
+        self.assertEqual(
+            set(compacted.actors.values_list("user_id", flat=True)),
+            {user.pk for user in self.users},
+        )
+        self.assertEqual(
+            Notification.objects.filter(notification_type__name="retweet").count(), 2
+        )
+        self.assertEqual({row["reason"] for row in self.read_archive()}, {"compacted"})
+        self.assertNotIn(recent.pk, [row["id"] for row in self.read_archive()])
+
+    def test_expired_read_notifications_are_deleted(self):
+        comment = Comment.objects.create(
+            user=self.users[0], tweet=self.tweet, content="c"
+        )
+        expired = self.create("comment", self.users[0], days_ago=366)
+        unread = self.create("comment", self.users[1], days_ago=366, is_read=False)
+        recent = self.create("comment", self.users[2], days_ago=364)
+        Notification.objects.update(comment=comment)
+        self.prune_notifications("--no-archive")
+
+        self.assertEqual(
+            set(Notification.objects.values_list("pk", flat=True)),
+            {unread.pk, recent.pk},
+        )
+        self.assertFalse(Notification.objects.filter(pk=expired.pk).exists())
+        self.assertEqual(self.read_archive(), [])
+
+    def test_dry_run_does_not_delete(self):
+        self.create("like", create_user("other"), days_ago=0, engaged=False)
+        for user in self.users:
+            self.create("like", user, days_ago=200)
+        stdout = self.prune_notifications("--dry-run")
+
+        self.assertEqual(Notification.objects.count(), 4)
+        stdout.write.assert_called_once_with(
+            "取り消された反応の通知: 1件、まとめる対象: 3件（1グループ）、"
+            "期限切れの通知: 3件\n"
+        )
+
+
+@override_settings(NOTIFICATION_EVENT_BACKEND="notifications.events.LocalEventBackend")
+class NotificationStreamTests(TransactionTestCase):
+    """通知のストリーム（NotificationStreamApplication）による配信"""
+
+    def setUp(self):
+        cache.clear()
+        get_event_backend.cache_clear()
+        self.addCleanup(get_event_backend.cache_clear)
+        for name in ["like", "retweet", "comment"]:
+            NotificationType.objects.create(name=name)
+        self.author = create_user("author")
+        self.user = create_user("user")
+        self.tweet = Tweet.objects.create(user=self.author, content="tweet")
+        self.inner_scopes = []
+        self.application = NotificationStreamApplication(self.inner_application)
+
+    async def inner_application(self, scope, receive, send):
+        self.inner_scopes.append(scope)
+
+    def get_scope(self, path, user=None):
+        headers = []
+        if user is not None:
+            self.client.force_login(user)
+            session_key = self.client.cookies[settings.SESSION_COOKIE_NAME].value
+            headers.append(
+                (b"cookie", f"{settings.SESSION_COOKIE_NAME}={session_key}".encode())
+            )
+        return {"type": "http", "method": "GET", "path": path, "headers": headers}
+
+    async def read_stream(self, scope, until):
+        """ストリームに接続し、untilを含むまで受信してから切断する（受信した本文を返す）"""
+        disconnect = asyncio.Event()
+        messages = []
+
+        async def receive():
+            await disconnect.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            messages.append(message)
+            body = b"".join(message.get("body", b"") for message in messages)
+            if until in body.decode():
+                disconnect.set()
+
+        await asyncio.wait_for(self.application(scope, receive, send), 5)
+        return messages
+
+    def test_other_requests_are_passed_to_django(self):
+        async_to_sync(self.application)(self.get_scope("/"), None, None)
+
+        self.assertTrue(self.inner_scopes[0][STREAM_SCOPE_KEY])
+        # ASGIのストリームを経由しない場合は、画面から購読しない
+        self.client.force_login(self.user)
+        self.assertNotContains(self.client.get("/"), "EventSource")
+
+    def test_anonymous_user_is_rejected(self):
+        scope = self.get_scope(reverse("notifications:notification_stream"))
+        messages = async_to_sync(self.read_stream)(scope, "")
+
+        self.assertEqual(messages[0]["status"], 401)
+
+    def test_notifications_are_delivered_to_subscriber(self):
+        scope = self.get_scope(
+            reverse("notifications:notification_stream"), user=self.author
+        )
+
+        async def subscribe_and_notify():
+            stream = asyncio.ensure_future(self.read_stream(scope, '"delta": 1'))
+            broker = get_event_backend().broker
+            while not broker.subscriber_count():
+                await asyncio.sleep(0.01)
+            await sync_to_async(Notification.create_notification)(
+                "like", self.user, self.author, self.tweet
+            )
+            return await stream
+
+        messages = async_to_sync(subscribe_and_notify)()
+        body = b"".join(message.get("body", b"") for message in messages).decode()
+
+        self.assertEqual(messages[0]["status"], 200)
+        self.assertIn('event: unread_count\ndata: {"count": 0}', body)
+        self.assertIn('event: unread_count\ndata: {"delta": 1}', body)
+        self.assertIn('"type": "like"', body)
+        # 切断したら購読を解除する
+        self.assertEqual(get_event_backend().broker.subscriber_count(), 0)
@@ -5,4 +5,6 @@ from . import views
 app_name = "notifications"
 urlpatterns = [
     path("", views.NotificationListView.as_view(), name="notification_list"),
+    path("read/", views.NotificationReadView.as_view(), name="notification_read"),
+    path("stream/", views.NotificationStreamView.as_view(), name="notification_stream"),
 ]
@@ -1,7 +1,14 @@
-from django.views.generic import ListView
+from asgiref.sync import sync_to_async
+from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
+from django.db import connections
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import redirect
+from django.views.generic import ListView, View
 
+from config.pagination import CursorPaginator
 from .models import Notification
+from .streams import STREAM_HEADERS, get_unread_count, stream_events
 
 
 class NotificationListView(LoginRequiredMixin, ListView):
@@ -10,6 +17,8 @@ class NotificationListView(LoginRequiredMixin, ListView):
     model = Notification
     template_name = "notifications/index.html"
     context_object_name = "notification_list"
+    notification_paginate_by = 20
+    cursor_kwarg = "cursor"
 
     def get_queryset(self):
         # ログインユーザーへの通知情報を返す
@@ -17,5 +26,68 @@ class NotificationListView(LoginRequiredMixin, ListView):
         return user.get_notifications()
 
     def get_context_data(self, *args, **kwargs):
-        context = super().get_context_data(*args, **kwargs)
+        # MEMO: 件数の集計を避けるため、ListViewのページネーションは使わない
+        queryset = self.object_list
+        paginator = CursorPaginator(
+            queryset, self.notification_paginate_by, ordering=queryset.query.order_by
+        )
+        page_obj = paginator.get_page(self.request.GET.get(self.cursor_kwarg))
+        context = super().get_context_data(*args, object_list=page_obj, **kwargs)
+        context.update(
+            {
+                "page_obj": page_obj,
+                "is_paginated": page_obj.has_other_pages(),
+                # 一括既読の対象とする通知IDの上限（最新のページを表示した場合のみ）
+                "read_until_id": (
+                    max(notification.pk for notification in page_obj)
+                    if page_obj and not page_obj.has_previous()
+                    else None
+                ),
+            }
+        )
         return context
+
+
+class NotificationReadView(LoginRequiredMixin, View):
+    """通知の一括既読ビュー"""
+
+    def post(self, request, *args, **kwargs):
+        try:
+            until_id = int(request.POST.get("until_id", ""))
+        except ValueError:
+            messages.error(
+                self.request,
+                "既読にする通知が指定されていません。",
+                extra_tags="danger",
+            )
+            return redirect("notifications:notification_list")
+
+        updated = Notification.mark_all_read(request.user, until_id)
+        messages.success(
+            self.request,
+            f"{updated}件の通知を既読にしました。",
+            extra_tags="success",
+        )
+        return redirect("notifications:notification_list")
+
+
+class NotificationStreamView(View):
+    """
+    通知のイベントをServer-Sent Eventsで配信するビュー（非同期）
+
+    MEMO: ASGIで動かす場合はconfig.asgiのNotificationStreamApplicationが配信するため、
+    このビューは開発用サーバーなどASGI以外で動かす場合にのみ使われる。
+    その場合、画面（base.html）からは購読しない。
+    """
+
+    async def get(self, request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return HttpResponse(status=401)
+
+        unread_count = await sync_to_async(get_unread_count)(user.pk)
+        # MEMO: 接続を閉じるまでデータベース接続を保持し続けないよう、配信前に切断する
+        await sync_to_async(connections.close_all)()
+        return StreamingHttpResponse(
+            stream_events(user.pk, unread_count), headers=STREAM_HEADERS
+        )
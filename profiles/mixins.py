@@ -1,6 +1,8 @@
 from django.contrib.auth.mixins import UserPassesTestMixin
 from django.shortcuts import redirect, resolve_url
 
+from config.pagination import CursorPaginator
+
 
 class FollowStatusMixin:
     """フォロー関係をまとめるMixin"""
@@ -18,9 +20,22 @@ class FollowStatusMixin:
 class TweetListMixin:
     """ツイート一覧表示用の共通処理をまとめるMixin"""
 
+    tweet_paginate_by = 5
+    cursor_kwarg = "cursor"
+
     def get_tweet_context(self, user):
         """ツイート一覧表示に必要なコンテキストを取得する"""
-        return {"tweet_list": self.get_tweet_queryset(user)}
+        queryset = self.get_tweet_queryset(user)
+        # クエリセットの並び順をキーにしてページ分割する
+        paginator = CursorPaginator(
+            queryset, self.tweet_paginate_by, ordering=queryset.query.order_by
+        )
+        page_obj = paginator.get_page(self.request.GET.get(self.cursor_kwarg))
+        return {
+            "tweet_list": page_obj,
+            "page_obj": page_obj,
+            "is_paginated": page_obj.has_other_pages(),
+        }
 
     def get_tweet_queryset(self, user):
         """ツイート一覧を取得する（サブクラスでの実装必須）"""
@@ -1,3 +1,71 @@
+from django.core.cache import cache
 from django.test import TestCase
 
-# Create your tests here.
+from accounts.models import CustomUser
+from tweets.models import Comment, Like, Retweet, Tweet
+
+
+def create_user(username):
+    return CustomUser.objects.create_user(
+        username=username, email=f"{username}@example.com", password="password"
+    )
+
+
+class ProfileTweetListTests(TestCase):
+    """プロフィールのタブ（ツイート・いいね・リツイート・コメント）のページ分割"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user("user")
+        self.author = create_user("author")
+        self.tweets = [
+            Tweet.objects.create(user=self.author, content=f"tweet {i}")
+            for i in range(12)
+        ]
+        self.client.force_login(self.user)
+
+    def get_all_pages(self, path):
+        """全ページを順にたどり、表示したツイートIDを返す"""
+        ids = []
+        cursor = None
+        while True:
+            page = self.client.get(path, {"cursor": cursor} if cursor else {}).context[
+                "page_obj"
+            ]
+            self.assertLessEqual(len(page), 5)
+            ids.extend(tweet.id for tweet in page)
+            if not page.has_next():
+                return ids
+            cursor = page.next_cursor
+
+    def test_my_tweets_are_paginated_newest_first(self):
+        self.assertEqual(
+            self.get_all_pages(f"/profile/{self.author.username}/"),
+            [tweet.id for tweet in reversed(self.tweets)],
+        )
+
+    def test_engaged_tabs_are_ordered_by_engagement_time(self):
+        # ツイートの投稿順とは逆順に反応する
+        for tweet in reversed(self.tweets):
+            Like.objects.create(user=self.user, tweet=tweet)
+            Retweet.objects.create(user=self.user, tweet=tweet)
+        expected = [tweet.id for tweet in self.tweets]
+
+        for tab in ["likes", "retweets"]:
+            with self.subTest(tab=tab):
+                self.assertEqual(
+                    self.get_all_pages(f"/profile/{self.user.username}/{tab}/"),
+                    expected,
+                )
+
+    def test_commented_tab_shows_each_tweet_once(self):
+        for tweet in self.tweets:
+            Comment.objects.create(user=self.user, tweet=tweet, content="1")
+        # 再度コメントしたツイートは、最新のコメントの位置に表示する
+        Comment.objects.create(user=self.user, tweet=self.tweets[0], content="2")
+        Comment.objects.create(user=self.user, tweet=self.tweets[0], content="3")
+
+        self.assertEqual(
+            self.get_all_pages(f"/profile/{self.user.username}/comments/"),
+            [self.tweets[0].id] + [tweet.id for tweet in reversed(self.tweets[1:])],
+        )
@@ -16,6 +16,7 @@ class BaseProfileView(LoginRequiredMixin, DetailView):
     """プロフィール関連ビューの基底クラス"""
 
     model = CustomUser
+    queryset = CustomUser.objects.select_related("stats")
     context_object_name = "user_profile"
     slug_field = "username"
     slug_url_kwarg = "username"
@@ -1,12 +1,28 @@
 from django.contrib import admin
 
-from .models import Tweet, Like, Retweet, Comment, Bookmark
+from .models import (
+    Tweet,
+    Like,
+    Retweet,
+    Comment,
+    Bookmark,
+    HomeTimelineEntry,
+    HomeTimelineFanOut,
+    RecommendedTweet,
+)
 
 
 @admin.register(Tweet)
 class TweetAdmin(admin.ModelAdmin):
     model = Tweet
-    readonly_fields = ("created_at", "updated_at")
+    readonly_fields = (
+        "like_count",
+        "retweet_count",
+        "bookmark_count",
+        "comment_count",
+        "created_at",
+        "updated_at",
+    )
 
 
 @admin.register(Like)
@@ -31,3 +47,21 @@ class CommentAdmin(admin.ModelAdmin):
 class BookmarkAdmin(admin.ModelAdmin):
     model = Bookmark
     readonly_fields = ("created_at", "updated_at")
+
+
+@admin.register(HomeTimelineEntry)
+class HomeTimelineEntryAdmin(admin.ModelAdmin):
+    model = HomeTimelineEntry
+    readonly_fields = ("created_at", "updated_at")
+
+
+@admin.register(HomeTimelineFanOut)
+class HomeTimelineFanOutAdmin(admin.ModelAdmin):
+    model = HomeTimelineFanOut
+    readonly_fields = ("created_at", "updated_at")
+
+
+@admin.register(RecommendedTweet)
+class RecommendedTweetAdmin(admin.ModelAdmin):
+    model = RecommendedTweet
+    readonly_fields = ("created_at", "updated_at")
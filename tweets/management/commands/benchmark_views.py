@@ -0,0 +1,343 @@
+import io
+import json
+import math
+import statistics
+import time
+import tracemalloc
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import CustomUser, FollowRelation
+from direct_messages.models import Message
+from notifications.models import Notification
+from tweets.models import Tweet, Like, Retweet, Bookmark, Comment
+
+# ビューごとのクエリ数の上限（データ量に関わらず一定であること）
+# MEMO: ビューの処理を変更してクエリ数が変わる場合は、あわせて見直すこと
+QUERY_BUDGETS = {
+    "TimelineView": 8,
+    "FollowingTweetListView": 8,
+    "BookmarkListView": 8,
+    "TweetDetailView": 8,
+    "MyTweetListView": 10,
+    "LikedTweetListView": 10,
+    "RetweetedTweetListView": 10,
+    "CommentedTweetListView": 10,
+    "NotificationListView": 6,
+    "MessageListView": 5,
+    "MessageRoomView": 7,
+}
+
+# 規模1あたりの疑似データの件数（seed_datasetの引数）
+BASE_DATASET = {
+    "users": 100,
+    "tweets": 1000,
+    "likes": 5000,
+    "retweets": 1000,
+    "bookmarks": 1000,
+    "comments": 2000,
+    "messages": 1000,
+}
+
+
+class Command(BaseCommand):
+    """主要なビューの性能（クエリ数・SQL時間・応答時間・メモリ）を計測するコマンド"""
+
+    help = (
+        "テスト用データベースに規模の異なる疑似データを投入して主要なビューを計測し、"
+        "JSON形式のレポートを出力します。クエリ数の上限を超えた場合や、"
+        "クエリ数・応答時間がデータ量に応じて増える場合は失敗します"
+    )
+
+    # 応答時間の計測に使う時計（テストで差し替える）
+    timer = staticmethod(time.perf_counter)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scales",
+            default="1,2,4",
+            help="データの規模（カンマ区切り。1あたりユーザー100人・ツイート1000件）",
+        )
+        parser.add_argument(
+            "--repeat",
+            type=int,
+            default=5,
+            help="応答時間を計測する回数（最小値を採用）",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="疑似データのシード")
+        parser.add_argument(
+            "--max-growth",
+            type=float,
+            default=1.0,
+            help="応答時間の増え方の上限（データ量に対する指数。1.0で線形）",
+        )
+        parser.add_argument(
+            "--min-growth-ms",
+            type=float,
+            default=20.0,
+            help="応答時間の増え方を判定する、最小規模からの増加量の下限（ミリ秒）",
+        )
+        parser.add_argument(
+            "--output",
+            default="benchmark_report.json",
+            help="レポートの出力先",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            scales = sorted({int(scale) for scale in options["scales"].split(",")})
+        except ValueError:
+            raise CommandError("--scalesは整数をカンマ区切りで指定してください。")
+        if not scales or scales[0] < 1:
+            raise CommandError("--scalesは1以上の整数を指定してください。")
+
+        # MEMO: 実データを壊さないよう、テスト用データベースを作成して計測する
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            runs = [self.run_scale(scale, options) for scale in scales]
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        report = {
+            "generated_at": timezone.now().isoformat(),
+            "database": connection.vendor,
+            "seed": options["seed"],
+            "repeat": options["repeat"],
+            "runs": runs,
+            "growth": self.get_growth(runs),
+        }
+        report["failures"] = self.get_failures(
+            report, options["max_growth"], options["min_growth_ms"]
+        )
+        with open(options["output"], "w") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+        self.write_summary(report)
+        self.stdout.write(f"レポートを{options['output']}に出力しました。")
+        if report["failures"]:
+            raise CommandError(
+                "性能の基準を満たさないビューがあります。\n"
+                + "\n".join(report["failures"])
+            )
+        self.stdout.write(self.style.SUCCESS("すべてのビューが基準を満たしました。"))
+
+    def run_scale(self, scale, options):
+        """1つの規模のデータを投入して、各ビューを計測する"""
+        self.stdout.write(self.style.MIGRATE_HEADING(f"== 規模 {scale}"))
+        call_command("flush", interactive=False, verbosity=0)
+        cache.clear()
+        dataset = {name: count * scale for name, count in BASE_DATASET.items()}
+        call_command(
+            "seed_dataset",
+            seed=options["seed"],
+            avg_following=20,
+            stdout=io.StringIO(),
+            **dataset,
+        )
+
+        client = Client()
+        targets = self.get_targets()
+        client.force_login(targets["viewer"])
+        views = {}
+        for name, url in targets["urls"].items():
+            views[name] = self.measure(client, url, options["repeat"])
+            self.stdout.write(
+                f"{name}: {views[name]['queries']}クエリ "
+                f"{views[name]['latency_ms']:.1f}ms"
+            )
+        return {
+            "scale": scale,
+            "rows": {
+                model._meta.db_table: model.objects.count()
+                for model in [
+                    CustomUser,
+                    FollowRelation,
+                    Tweet,
+                    Like,
+                    Retweet,
+                    Bookmark,
+                    Comment,
+                    Notification,
+                    Message,
+                ]
+            },
+            "views": views,
+        }
+
+    def get_targets(self):
+        """閲覧ユーザーと計測対象のURLを取得する"""
+        # フォロー数が最も多いユーザーで閲覧し、フォロワー数が最も多いユーザーを表示する
+        viewer = (
+            CustomUser.objects.annotate(count=Count("following_relations"))
+            .order_by("-count", "pk")
+            .first()
+        )
+        # MEMO: 一覧が空の場合は発行されないクエリがあり、規模間でクエリ数を比べられない
+        # ため、ツイートのあるユーザーを表示する
+        profile = (
+            CustomUser.objects.filter(stats__tweet_count__gt=0)
+            .order_by("-stats__follower_count", "pk")
+            .first()
+        )
+        tweet = Tweet.objects.order_by("-comment_count", "pk").first()
+        # メッセージ画面は閲覧ユーザーのフォロワーとの間でのみ表示できる
+        partner = (
+            CustomUser.objects.filter(following_relations__followee=viewer)
+            .annotate(count=Count("received_messages"))
+            .order_by("-count", "pk")
+            .first()
+        )
+        if partner is None:
+            raise CommandError("閲覧ユーザーのフォロワーが存在しません。")
+        username = profile.username
+        return {
+            "viewer": viewer,
+            "urls": {
+                "TimelineView": reverse("tweets:timeline"),
+                "FollowingTweetListView": reverse("tweets:following"),
+                "BookmarkListView": reverse("tweets:bookmark"),
+                "TweetDetailView": reverse("tweets:tweet_detail", args=[tweet.pk]),
+                "MyTweetListView": reverse("profiles:my_tweet_list", args=[username]),
+                "LikedTweetListView": reverse(
+                    "profiles:liked_tweet_list", args=[username]
+                ),
+                "RetweetedTweetListView": reverse(
+                    "profiles:retweeted_tweet_list", args=[username]
+                ),
+                "CommentedTweetListView": reverse(
+                    "profiles:commented_tweet_list", args=[username]
+                ),
+                "NotificationListView": reverse("notifications:notification_list"),
+                "MessageListView": reverse("direct_messages:message_list"),
+                "MessageRoomView": reverse(
+                    "direct_messages:message_room", args=[partner.username]
+                ),
+            },
+        }
+
+    def measure(self, client, url, repeat):
+        """単一のURLを計測する（キャッシュが温まった状態で計測する）"""
+        self.get(client, url)
+
+        latencies = []
+        for _ in range(repeat):
+            started_at = self.timer()
+            self.get(client, url)
+            latencies.append((self.timer() - started_at) * 1000)
+
+        # クエリ数・SQL時間・メモリは計測の影響を受けるため、別のリクエストで計測する
+        query_times = []
+
+        def record_query(execute, sql, params, many, context):
+            started_at = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                query_times.append((time.perf_counter() - started_at) * 1000)
+
+        tracemalloc.start()
+        try:
+            with connection.execute_wrapper(record_query):
+                self.get(client, url)
+            _, peak_memory = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        return {
+            "url": url,
+            "queries": len(query_times),
+            "sql_ms": round(sum(query_times), 3),
+            # MEMO: 他の処理の影響による揺らぎを除くため、最小値を代表値とする
+            "latency_ms": round(min(latencies), 3),
+            "latency_median_ms": round(statistics.median(latencies), 3),
+            "latency_max_ms": round(max(latencies), 3),
+            "peak_memory_kb": round(peak_memory / 1024, 1),
+        }
+
+    def get(self, client, url):
+        response = client.get(url)
+        if response.status_code != 200:
+            raise CommandError(f"{url}の応答が{response.status_code}でした。")
+        return response
+
+    def get_growth(self, runs):
+        """
+        応答時間がデータ量の何乗で増えたかを求める
+
+        全規模の(規模, 応答時間)を両対数で直線に当てはめた傾きとする（減少は0とする）。
+        """
+        if len(runs) < 2:
+            return {}
+        scales = [math.log(run["scale"]) for run in runs]
+        growth = {}
+        for name in runs[0]["views"]:
+            latencies = [
+                math.log(max(run["views"][name]["latency_ms"], 0.001)) for run in runs
+            ]
+            slope = statistics.linear_regression(scales, latencies).slope
+            growth[name] = round(max(slope, 0), 3)
+        return growth
+
+    def get_failures(self, report, max_growth, min_growth_ms):
+        """
+        基準を満たさない項目の一覧を取得する
+
+        クエリ数は上限を超えた場合と、最小規模より増えた場合に失敗とする。
+        応答時間は揺らぎを誤検知しないよう、増え方の指数が上限を超え、かつ
+        最小規模からの増加量がmin_growth_ms以上の場合のみ失敗とする。
+        """
+        failures = []
+        first = report["runs"][0]
+        for run in report["runs"]:
+            for name, result in run["views"].items():
+                if result["queries"] > QUERY_BUDGETS[name]:
+                    failures.append(
+                        f"{name}: 規模{run['scale']}でクエリ数が上限を超えました"
+                        f"（{result['queries']} > {QUERY_BUDGETS[name]}）"
+                    )
+                elif result["queries"] > first["views"][name]["queries"]:
+                    failures.append(
+                        f"{name}: 規模{run['scale']}でクエリ数が増えました"
+                        f"（{first['views'][name]['queries']} -> {result['queries']}）"
+                    )
+        last = report["runs"][-1]
+        for name, exponent in report["growth"].items():
+            delta = (
+                last["views"][name]["latency_ms"] - first["views"][name]["latency_ms"]
+            )
+            if exponent > max_growth and delta >= min_growth_ms:
+                failures.append(
+                    f"{name}: 応答時間の増え方が基準を超えました"
+                    f"（指数{exponent} > {max_growth}、{delta:.1f}ms増加）"
+                )
+        return failures
+
+    def write_summary(self, report):
+        """規模ごとの応答時間・クエリ数を表形式で出力する"""
+        scales = [run["scale"] for run in report["runs"]]
+        # MEMO: 全角文字は表示幅が2文字分のため、その分を詰めて揃える
+        header = "ビュー".ljust(21) + "".join(
+            f"規模{scale}".rjust(16) for scale in scales
+        )
+        self.stdout.write(self.style.MIGRATE_HEADING(header))
+        for name in QUERY_BUDGETS:
+            results = [run["views"][name] for run in report["runs"]]
+            cells = "".join(
+                f"{result['latency_ms']:>11.1f}ms/{result['queries']:>3}q"
+                for result in results
+            )
+            growth = report["growth"].get(name)
+            suffix = f"  指数{growth}" if growth is not None else ""
+            self.stdout.write(f"{name.ljust(24)}{cells}{suffix}")
@@ -0,0 +1,139 @@
+import heapq
+import math
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+
+from accounts.models import UserStats
+from tweets.models import Tweet, RecommendedTweet
+
+
+class Command(BaseCommand):
+    """おすすめタイムラインの候補ツイートをスコア順に集計するコマンド"""
+
+    help = "最近のツイートをスコアリングし、おすすめタイムラインの候補を作り直します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=2000,
+            help="1回にスコアリングするツイート数",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="終了せず、一定間隔で候補を作り直し続ける",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=settings.RECOMMENDATION_REFRESH_SECONDS,
+            help="--loop指定時に、候補を作り直す間隔（秒）",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            # MEMO: 前回の作り直しの後に投稿されたツイートは、次の作り直しで候補に加わる
+            self.build(options["batch_size"])
+            if not options["loop"]:
+                break
+            time.sleep(options["interval"])
+
+    def build(self, batch_size):
+        """最近のツイートをスコアリングし、おすすめの候補を入れ替える"""
+        started_at = time.perf_counter()
+        now = timezone.now()
+        since = now - timedelta(hours=settings.RECOMMENDATION_WINDOW_HOURS)
+
+        # スコア上位の候補のみを保持する（ヒープの先頭が最小スコア）
+        top_candidates = []
+        scored = 0
+        # 期間内のツイートの最小のIDから走査し、期間外のID範囲を読み飛ばす
+        first_id = Tweet.objects.filter(created_at__gte=since).aggregate(
+            first_id=Min("pk")
+        )["first_id"]
+        last_id = first_id - 1 if first_id is not None else None
+        while last_id is not None:
+            rows = list(
+                Tweet.objects.filter(created_at__gte=since, pk__gt=last_id)
+                .order_by("pk")
+                .values_list(
+                    "id",
+                    "user_id",
+                    "created_at",
+                    "like_count",
+                    "retweet_count",
+                    "comment_count",
+                )[:batch_size]
+            )
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            scored += len(rows)
+
+            for tweet_id, score in zip(
+                [row[0] for row in rows], self.score_batch(rows, now)
+            ):
+                candidate = (score, tweet_id)
+                if len(top_candidates) < settings.RECOMMENDATION_MAX_CANDIDATES:
+                    heapq.heappush(top_candidates, candidate)
+                elif candidate > top_candidates[0]:
+                    heapq.heapreplace(top_candidates, candidate)
+
+        # 候補を入れ替える
+        with transaction.atomic():
+            RecommendedTweet.objects.all().delete()
+            RecommendedTweet.objects.bulk_create(
+                [
+                    RecommendedTweet(tweet_id=tweet_id, score=score)
+                    for score, tweet_id in top_candidates
+                ],
+                batch_size=1000,
+            )
+
+        elapsed = time.perf_counter() - started_at
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{scored}件のツイートをスコアリングし、{len(top_candidates)}件の候補を保存しました。"
+                f"（処理時間: {elapsed:.2f}秒）"
+            )
+        )
+
+    def score_batch(self, rows, now):
+        """1バッチ分のツイートのスコアを列単位でまとめて計算する"""
+        weights = settings.RECOMMENDATION_WEIGHTS
+        half_life = settings.RECOMMENDATION_FRESHNESS_HALF_LIFE_HOURS
+
+        # 投稿者のフォロワー数をバッチ単位で1回だけ取得する
+        user_ids = {row[1] for row in rows}
+        follower_counts = dict(
+            UserStats.objects.filter(user_id__in=user_ids).values_list(
+                "user_id", "follower_count"
+            )
+        )
+
+        ages = [(now - row[2]).total_seconds() / 3600 for row in rows]
+        # エンゲージメントの伸び: 重み付きの反応数を経過時間で割る
+        engagements = [row[3] + 2 * row[4] + 3 * row[5] for row in rows]
+        velocities = [
+            engagement / (age + 2) for engagement, age in zip(engagements, ages)
+        ]
+        # 投稿者の人気度: フォロワー数の対数（閲覧者によらず共通）
+        popularities = [math.log1p(follower_counts.get(row[1], 0)) for row in rows]
+        # 新しさ: 半減期で指数的に減衰させる
+        freshnesses = [0.5 ** (age / half_life) for age in ages]
+
+        return [
+            weights["velocity"] * velocity
+            + weights["popularity"] * popularity
+            + weights["freshness"] * freshness
+            for velocity, popularity, freshness in zip(
+                velocities, popularities, freshnesses
+            )
+        ]
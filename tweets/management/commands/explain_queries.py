@@ -0,0 +1,165 @@
+import re
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+
+from accounts.models import CustomUser, UserStats
+from direct_messages.models import Conversation, Message
+from tweets.models import Tweet, Comment, HomeTimelineEntry
+
+# テーブルを全件走査する実行計画（SQLite: インデックスを使わないSCAN、PostgreSQL: Seq Scan）
+FULL_SCAN_PATTERNS = [
+    re.compile(r"\bSCAN (\w+)\b(?! USING)"),
+    re.compile(r"\bSeq Scan on (\w+)"),
+]
+
+
+class Command(BaseCommand):
+    """主要な画面で発行されるクエリの実行計画を出力するコマンド"""
+
+    help = (
+        "主要なクエリの実行計画（EXPLAIN）を出力し、インデックスの利用状況を確認します"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--username",
+            help="閲覧ユーザー名（省略時はフォロー数が最も多いユーザー）",
+        )
+        parser.add_argument(
+            "--analyze",
+            action="store_true",
+            help="実際にクエリを実行して計測する（PostgreSQLのみ）",
+        )
+        parser.add_argument(
+            "--fail-on-full-scan",
+            action="store_true",
+            help="全件走査しているクエリがあれば失敗にする",
+        )
+
+    def handle(self, *args, **options):
+        user = self.get_user(options["username"])
+        tweet = Tweet.objects.order_by("-comment_count").first()
+        other = (
+            CustomUser.objects.filter(follower_relations__follower=user).first() or user
+        )
+        if tweet is None:
+            raise CommandError("ツイートが存在しません。")
+
+        explain_options = {}
+        if options["analyze"]:
+            if connection.vendor != "postgresql":
+                raise CommandError("--analyzeはPostgreSQLでのみ使用できます。")
+            explain_options = {"analyze": True, "buffers": True}
+
+        full_scans = []
+        for name, queryset in self.get_querysets(user, tweet, other):
+            plan = queryset.explain(**explain_options)
+            self.stdout.write(self.style.MIGRATE_HEADING(f"== {name}"))
+            self.stdout.write(plan)
+            self.stdout.write("")
+            full_scans += [
+                f"{name}: {table}を全件走査しています。"
+                for table in self.get_full_scan_tables(plan)
+            ]
+
+        if not full_scans:
+            self.stdout.write(
+                self.style.SUCCESS("全件走査しているクエリはありません。")
+            )
+            return
+        for message in full_scans:
+            self.stdout.write(self.style.WARNING(message))
+        # MEMO: 件数の少ないテーブルではインデックスより全件走査が選ばれることがあるため、
+        #       既定では警告のみとし、失敗にするかは指定で切り替える
+        if options["fail_on_full_scan"]:
+            raise CommandError("全件走査しているクエリがあります。")
+
+    def get_full_scan_tables(self, plan):
+        """実行計画から全件走査しているテーブル名を取得する"""
+        return [
+            match.group(1)
+            for line in plan.splitlines()
+            for pattern in FULL_SCAN_PATTERNS
+            for match in pattern.finditer(line)
+        ]
+
+    def get_user(self, username):
+        """閲覧ユーザーを取得する"""
+        if username:
+            try:
+                return CustomUser.objects.get(username=username)
+            except CustomUser.DoesNotExist:
+                raise CommandError(f"{username}は存在しません。")
+        user = (
+            CustomUser.objects.annotate(following_count=Count("following_relations"))
+            .order_by("-following_count")
+            .first()
+        )
+        if user is None:
+            raise CommandError("ユーザーが存在しません。")
+        return user
+
+    def get_querysets(self, user, tweet, other):
+        """確認対象のクエリ（名前, クエリセット）の一覧"""
+        return [
+            # tweet_user_created_idx
+            (
+                "ユーザーのツイート一覧",
+                Tweet.objects.filter(user=user).order_by("-created_at", "-id")[:6],
+            ),
+            # tweet_created_idx
+            (
+                "新しい順のツイート一覧",
+                Tweet.objects.order_by("-created_at", "-id")[:6],
+            ),
+            # home_timeline_owner_idx（インデックスのみで取得）
+            (
+                "フォロー中タイムライン",
+                HomeTimelineEntry.objects.filter(owner=user)
+                .order_by("-tweet_created_at", "-tweet")
+                .values("tweet_id")[: settings.HOME_TIMELINE_MAX_LENGTH],
+            ),
+            # user_stats_follower_idx（インデックスのみで取得）
+            (
+                "投稿時の配信を行わないユーザーID",
+                UserStats.objects.filter(
+                    follower_count__gt=settings.HOME_TIMELINE_FANOUT_THRESHOLD
+                ).values_list("user_id", flat=True),
+            ),
+            # like_user_created_idx / unique_like_relation（インデックスのみで取得）
+            (
+                "いいねしたツイートID（関連情報）",
+                user.likes.values_list("tweet_id", flat=True),
+            ),
+            # unique_like_relation（インデックスのみで取得）
+            (
+                "表示中のツイートに対するいいね（関連情報）",
+                user.likes.filter(tweet_id__in=[tweet.id]).values_list(
+                    "tweet_id", flat=True
+                ),
+            ),
+            # like_user_created_idx
+            (
+                "いいねしたツイート一覧（いいね日時順）",
+                Tweet.get_liked_tweets(user)[:6],
+            ),
+            # follow_followee_follower_idx（インデックスのみで取得）
+            (
+                "フォロワーID（関連情報）",
+                user.follower_relations.values_list("follower_id", flat=True),
+            ),
+            # comment_tweet_created_idx
+            (
+                "ツイートのコメント一覧",
+                Comment.objects.filter(tweet=tweet).order_by("created_at", "id")[:20],
+            ),
+            # notification_receiver_idx
+            ("通知一覧", user.get_notifications()[:20]),
+            # message_pair_idx
+            ("メッセージ履歴", Message.get_messages(sender=user, receiver=other)),
+            # conversation_user1_recent_idx / conversation_user2_recent_idx
+            ("メッセージ一覧", Conversation.get_inbox(user)[:20]),
+        ]
@@ -0,0 +1,63 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tweets.models import HomeTimelineEntry, HomeTimelineFanOut
+
+
+class Command(BaseCommand):
+    """配信待ちのツイート（home_timeline_fan_out）をフォロワーのタイムラインに配信するコマンド"""
+
+    help = "配信待ちのツイートをフォロワーのタイムラインに配信します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10,
+            help="1トランザクションで配信するツイート数",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="配信待ちがなくなっても終了せず、一定間隔で配信を続ける",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=1,
+            help="--loop指定時に、配信待ちがない場合に待機する秒数",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        processed = 0
+        while True:
+            batch_processed = self.fan_out_batch(batch_size)
+            processed += batch_processed
+            if batch_processed < batch_size:
+                if not options["loop"]:
+                    break
+                time.sleep(options["interval"])
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{processed}件のツイートを配信しました。")
+        )
+
+    def fan_out_batch(self, batch_size):
+        """1バッチ分のツイートを配信し、配信待ちから削除する（処理件数を返す）"""
+        with transaction.atomic():
+            # MEMO: 複数のワーカーで動かしても同じツイートを配信しないよう、
+            # 他のワーカーが処理中の行は読み飛ばす
+            tasks = list(
+                HomeTimelineFanOut.get_pending().select_for_update(
+                    skip_locked=True, of=("self",)
+                )[:batch_size]
+            )
+            for task in tasks:
+                HomeTimelineEntry.fan_out(task.tweet)
+            HomeTimelineFanOut.objects.filter(
+                pk__in=[task.pk for task in tasks]
+            ).delete()
+        return len(tasks)
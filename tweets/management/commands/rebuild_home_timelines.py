@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.models import CustomUser
+from tweets.models import HomeTimelineEntry
+
+
+class Command(BaseCommand):
+    """フォロー中タイムラインをフォロー関係から再構築するコマンド"""
+
+    help = "フォロー中タイムライン（事前計算済みのツイート一覧）を再構築します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--username",
+            help="対象ユーザー名（省略時は全ユーザー）",
+        )
+        parser.add_argument(
+            "--trim-only",
+            action="store_true",
+            help="再構築せず、上限件数を超えた古いツイートの削除のみ行う",
+        )
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.order_by("pk")
+        if options["username"]:
+            users = users.filter(username=options["username"])
+            if not users.exists():
+                raise CommandError(f"{options['username']}は存在しません。")
+
+        processed = 0
+        for user in users.iterator():
+            # ユーザー単位でトランザクションを分けて処理する
+            with transaction.atomic():
+                if options["trim_only"]:
+                    HomeTimelineEntry.trim(user)
+                else:
+                    self.rebuild(user)
+            processed += 1
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{processed}人のタイムラインを処理しました。")
+        )
+
+    def rebuild(self, user):
+        """単一ユーザーのタイムラインを作り直す"""
+        HomeTimelineEntry.objects.filter(owner=user).delete()
+        for relation in user.get_followings():
+            HomeTimelineEntry.backfill(owner=user, followee=relation.followee)
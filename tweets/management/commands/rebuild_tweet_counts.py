@@ -0,0 +1,66 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from tweets.models import Tweet, Like, Retweet, Bookmark, Comment
+
+# カウンター名と集計対象モデルの対応
+COUNTER_MODELS = {
+    "like_count": Like,
+    "retweet_count": Retweet,
+    "bookmark_count": Bookmark,
+    "comment_count": Comment,
+}
+
+
+class Command(BaseCommand):
+    """ツイートのエンゲージメント数（いいね・リツイート・ブックマーク・コメント）を再集計するコマンド"""
+
+    help = "ツイートのエンゲージメント数のカウンターを実データから再集計します"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="1トランザクションで更新するツイート数",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        counts = {
+            field_name: Coalesce(Subquery(self.get_count_subquery(model)), 0)
+            for field_name, model in COUNTER_MODELS.items()
+        }
+
+        # ID範囲ごとに分割して更新し、ロックの保持時間を抑える
+        updated = 0
+        last_id = 0
+        while True:
+            tweet_ids = list(
+                Tweet.objects.filter(pk__gt=last_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:batch_size]
+            )
+            if not tweet_ids:
+                break
+            with transaction.atomic():
+                updated += Tweet.objects.filter(
+                    pk__gte=tweet_ids[0], pk__lte=tweet_ids[-1]
+                ).update(**counts)
+            last_id = tweet_ids[-1]
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{updated}件のツイートのカウンターを再集計しました。")
+        )
+
+    def get_count_subquery(self, model):
+        """ツイートごとの件数を返すサブクエリを生成する"""
+        return (
+            model.objects.filter(tweet=OuterRef("pk"))
+            .order_by()
+            .values("tweet")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
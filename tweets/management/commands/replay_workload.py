@@ -0,0 +1,417 @@
+import json
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import nullcontext
+from urllib.parse import urljoin
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from accounts.models import CustomUser, FollowRelation
+from config.utils import ZipfSampler
+from tweets.models import Tweet
+
+# 操作の種類と発生比率（重み）
+WORKLOAD_MIX = {
+    "timeline": 30,
+    "following": 15,
+    "profile": 12,
+    "notifications": 8,
+    "like_toggle": 12,
+    "retweet_toggle": 4,
+    "bookmark_toggle": 4,
+    "tweet_create": 3,
+    "comment_create": 3,
+    "message_create": 5,
+}
+
+# 集計するデータベースのエラー（一意制約違反・ロック待ちのタイムアウトなど）
+DB_ERROR_NAMES = ("IntegrityError", "OperationalError")
+
+
+def new_endpoint_stats():
+    """エンドポイントごとの集計値の初期値"""
+    return {
+        "latencies": [],
+        "statuses": Counter(),
+        "db_errors": Counter(),
+        "db_ms": 0.0,
+    }
+
+
+class InProcessTransport:
+    """テストクライアントでアプリを直接呼び出すクライアント"""
+
+    def __init__(self):
+        self.client = Client(raise_request_exception=False)
+
+    def login(self, user):
+        self.client.force_login(user)
+
+    def get(self, path):
+        return self.client.get(path).status_code
+
+    def post(self, path, data):
+        return self.client.post(path, data).status_code
+
+
+class HttpTransport:
+    """起動中のサーバーにHTTPでリクエストするクライアント"""
+
+    def __init__(self, base_url, password):
+        self.base_url = base_url
+        self.password = password
+        self.session = None
+
+    def login(self, user):
+        # 疑似データのユーザーのメールアドレスとパスワードでログインする
+        self.session = requests.Session()
+        login_url = urljoin(self.base_url, reverse("accounts:login"))
+        self.session.get(login_url, timeout=30)
+        response = self.session.post(
+            login_url,
+            data={
+                "login": user.email,
+                "password": self.password,
+                "csrfmiddlewaretoken": self.session.cookies.get("csrftoken", ""),
+            },
+            headers={"Referer": login_url},
+            allow_redirects=False,
+            timeout=30,
+        )
+        if response.status_code != 302:
+            raise CommandError(f"{user.username}でログインできませんでした。")
+
+    def get(self, path):
+        response = self.session.get(
+            urljoin(self.base_url, path), allow_redirects=False, timeout=30
+        )
+        return response.status_code
+
+    def post(self, path, data):
+        url = urljoin(self.base_url, path)
+        response = self.session.post(
+            url,
+            data=data,
+            headers={
+                "X-CSRFToken": self.session.cookies.get("csrftoken", ""),
+                "Referer": url,
+            },
+            allow_redirects=False,
+            timeout=30,
+        )
+        return response.status_code
+
+
+class Command(BaseCommand):
+    """実際に近い比率の操作を並行して実行し、エンドポイントごとの性能を計測するコマンド"""
+
+    help = (
+        "閲覧・いいね等の切り替え・投稿・メッセージ送信などの操作を、人気度に偏りを付けて"
+        "並行実行し、エンドポイントごとのスループットと応答時間の分布を出力します。"
+        "--base-url省略時はアプリ内で実行し、現在のデータベースに書き込みます"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests", type=int, default=2000, help="リクエストの総数"
+        )
+        parser.add_argument(
+            "--concurrency", type=int, default=8, help="並行して動かすクライアント数"
+        )
+        parser.add_argument(
+            "--session-length",
+            type=int,
+            default=20,
+            help="1ユーザーとして続けて行う操作の数",
+        )
+        parser.add_argument(
+            "--zipf",
+            type=float,
+            default=1.1,
+            help="ユーザー・ツイートの人気度の偏り（Zipf分布の指数）",
+        )
+        parser.add_argument(
+            "--tweet-pool",
+            type=int,
+            default=10000,
+            help="操作の対象とする最近のツイート数",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+        parser.add_argument(
+            "--base-url",
+            help="計測対象のサーバーのURL（例: http://127.0.0.1:8000/）",
+        )
+        parser.add_argument(
+            "--password",
+            default="password",
+            help="--base-url指定時にログインに使うパスワード（seed_datasetの既定値）",
+        )
+        parser.add_argument(
+            "--max-error-rate",
+            type=float,
+            default=0.0,
+            help="許容する5xx・通信エラーの割合（超えたエンドポイントがあれば失敗）",
+        )
+        parser.add_argument("--output", help="JSON形式のレポートの出力先")
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        user_ids = list(
+            CustomUser.objects.filter(is_active=True)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        tweet_ids = list(
+            Tweet.objects.order_by("-created_at", "-id").values_list("pk", flat=True)[
+                : options["tweet_pool"]
+            ]
+        )
+        if len(user_ids) < 2 or not tweet_ids:
+            raise CommandError(
+                "ユーザー・ツイートがありません。seed_datasetで投入してください。"
+            )
+
+        self.usernames = dict(
+            CustomUser.objects.filter(pk__in=user_ids).values_list("pk", "username")
+        )
+        # 操作するユーザーの偏り（活動量）と、閲覧されるユーザー・ツイートの偏り（人気度）
+        self.active_users = ZipfSampler(user_ids, options["zipf"], rng)
+        self.popular_users = ZipfSampler(user_ids, options["zipf"], rng)
+        self.popular_tweets = ZipfSampler(tweet_ids, options["zipf"], rng)
+        self.actions = list(WORKLOAD_MIX)
+        self.action_weights = list(WORKLOAD_MIX.values())
+        self.options = options
+
+        in_process = options["base_url"] is None
+        if in_process:
+            # テストサーバー名の許可・メール送信の無効化のため、テスト環境を設定する
+            setup_test_environment()
+        concurrency = max(1, options["concurrency"])
+        per_client = [
+            options["requests"] // concurrency
+            + (1 if index < options["requests"] % concurrency else 0)
+            for index in range(concurrency)
+        ]
+        results = [None] * concurrency
+        threads = [
+            threading.Thread(
+                target=self.run_client,
+                args=(index, count, in_process, results),
+            )
+            for index, count in enumerate(per_client)
+        ]
+
+        started_at = time.perf_counter()
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            if in_process:
+                teardown_test_environment()
+        elapsed = time.perf_counter() - started_at
+
+        report = self.build_report(results, elapsed, concurrency)
+        report["failures"] = self.get_failures(report, options["max_error_rate"])
+        self.write_report(report)
+        if options["output"]:
+            with open(options["output"], "w") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(f"レポートを{options['output']}に出力しました。")
+        if report["failures"]:
+            raise CommandError(
+                "エラーの割合が上限を超えたエンドポイントがあります。\n"
+                + "\n".join(report["failures"])
+            )
+
+    def run_client(self, index, count, in_process, results):
+        """1つのクライアントとして操作を実行する（スレッドごとに実行される）"""
+        rng = random.Random(self.options["seed"] * 1000 + index + 1)
+        stats = defaultdict(new_endpoint_stats)
+        current = {"action": None}
+
+        def record_query(execute, sql, params, many, context):
+            # 操作ごとのSQL時間とエラーを集計する
+            started_at = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            except Exception as e:
+                stats[current["action"]]["db_errors"][type(e).__name__] += 1
+                raise
+            finally:
+                stats[current["action"]]["db_ms"] += (
+                    time.perf_counter() - started_at
+                ) * 1000
+
+        transport = (
+            InProcessTransport()
+            if in_process
+            else HttpTransport(self.options["base_url"], self.options["password"])
+        )
+        # MEMO: HTTP経由ではサーバー側のSQLを観測できないため、アプリ内実行時のみ集計する
+        query_recorder = (
+            connection.execute_wrapper(record_query) if in_process else nullcontext()
+        )
+        try:
+            with query_recorder:
+                done = 0
+                while done < count:
+                    user = CustomUser.objects.get(
+                        pk=self.active_users.sample(1, rng)[0]
+                    )
+                    current["action"] = "login"
+                    transport.login(user)
+                    follower_names = list(
+                        FollowRelation.objects.filter(followee=user).values_list(
+                            "follower__username", flat=True
+                        )[:50]
+                    )
+                    for _ in range(min(self.options["session_length"], count - done)):
+                        action, method, path, data = self.next_request(
+                            rng, user, follower_names
+                        )
+                        current["action"] = action
+                        started_at = time.perf_counter()
+                        try:
+                            if method == "GET":
+                                status = transport.get(path)
+                            else:
+                                status = transport.post(path, data)
+                        except requests.RequestException as e:
+                            status = type(e).__name__
+                        stats[action]["latencies"].append(
+                            (time.perf_counter() - started_at) * 1000
+                        )
+                        stats[action]["statuses"][str(status)] += 1
+                        done += 1
+        finally:
+            results[index] = dict(stats)
+            connection.close()
+
+    def next_request(self, rng, user, follower_names):
+        """次に実行する操作を選ぶ（操作名, メソッド, パス, 送信データ）"""
+        action = rng.choices(self.actions, weights=self.action_weights)[0]
+        # メッセージはフォロワーにのみ送信できるため、フォロワーがいなければ閲覧にする
+        if action == "message_create" and not follower_names:
+            action = "profile"
+        tweet_id = self.popular_tweets.sample(1, rng)[0]
+        content = f"負荷試験{rng.randrange(10**9)}"
+
+        if action == "timeline":
+            return action, "GET", reverse("tweets:timeline"), None
+        if action == "following":
+            return action, "GET", reverse("tweets:following"), None
+        if action == "notifications":
+            return action, "GET", reverse("notifications:notification_list"), None
+        if action == "profile":
+            username = self.usernames[self.popular_users.sample(1, rng)[0]]
+            return (
+                action,
+                "GET",
+                reverse("profiles:my_tweet_list", args=[username]),
+                None,
+            )
+        if action in ("like_toggle", "retweet_toggle", "bookmark_toggle"):
+            return action, "POST", reverse(f"tweets:{action}"), {"tweet_id": tweet_id}
+        if action == "tweet_create":
+            return action, "POST", reverse("tweets:tweet_create"), {"content": content}
+        if action == "comment_create":
+            path = reverse("tweets:comment_create", args=[tweet_id])
+            return action, "POST", path, {"content": content}
+        path = reverse(
+            "direct_messages:message_create", args=[rng.choice(follower_names)]
+        )
+        return action, "POST", path, {"content": content}
+
+    def build_report(self, results, elapsed, concurrency):
+        """クライアントごとの結果をまとめてレポートを作成する"""
+        merged = defaultdict(new_endpoint_stats)
+        for stats in results:
+            for action, values in (stats or {}).items():
+                merged[action]["latencies"] += values["latencies"]
+                merged[action]["statuses"].update(values["statuses"])
+                merged[action]["db_errors"].update(values["db_errors"])
+                merged[action]["db_ms"] += values["db_ms"]
+
+        endpoints = {}
+        total = 0
+        for action in WORKLOAD_MIX:
+            values = merged.get(action)
+            if not values or not values["latencies"]:
+                continue
+            latencies = sorted(values["latencies"])
+            count = len(latencies)
+            total += count
+            server_errors = sum(
+                number
+                for status, number in values["statuses"].items()
+                if not status.isdigit() or int(status) >= 500
+            )
+            endpoints[action] = {
+                "requests": count,
+                "throughput": round(count / elapsed, 2),
+                "p50_ms": round(self.percentile(latencies, 50), 2),
+                "p95_ms": round(self.percentile(latencies, 95), 2),
+                "p99_ms": round(self.percentile(latencies, 99), 2),
+                "max_ms": round(latencies[-1], 2),
+                "db_ms_per_request": round(values["db_ms"] / count, 2),
+                "statuses": dict(values["statuses"]),
+                "error_rate": round(server_errors / count, 4),
+                "db_errors": dict(values["db_errors"]),
+                "db_error_rates": {
+                    name: round(values["db_errors"][name] / count, 4)
+                    for name in DB_ERROR_NAMES
+                },
+            }
+        return {
+            "mode": "http" if self.options["base_url"] else "in-process",
+            "database": connection.vendor,
+            "concurrency": concurrency,
+            "elapsed_seconds": round(elapsed, 3),
+            "requests": total,
+            "throughput": round(total / elapsed, 2),
+            "endpoints": endpoints,
+        }
+
+    def get_failures(self, report, max_error_rate):
+        """5xx・通信エラーの割合が上限を超えたエンドポイントを列挙する"""
+        return [
+            f"{action}: エラーの割合が上限を超えました"
+            f"（{result['error_rate']:.1%} > {max_error_rate:.1%}）"
+            for action, result in report["endpoints"].items()
+            if result["error_rate"] > max_error_rate
+        ]
+
+    def percentile(self, sorted_values, percent):
+        """最近傍順位法でパーセンタイル値を求める"""
+        rank = max(1, -(-len(sorted_values) * percent // 100))
+        return sorted_values[int(rank) - 1]
+
+    def write_report(self, report):
+        self.stdout.write(
+            self.style.MIGRATE_HEADING(
+                f"{report['requests']}件 / {report['elapsed_seconds']}秒 "
+                f"（{report['throughput']}件/秒, 並行数{report['concurrency']}）"
+            )
+        )
+        self.stdout.write(
+            f"{'endpoint':<16}{'req':>6}{'p50':>9}{'p95':>9}{'p99':>9}"
+            f"{'db/req':>9}{'5xx':>7}{'integrity':>11}{'operational':>13}"
+        )
+        for action, result in report["endpoints"].items():
+            rates = result["db_error_rates"]
+            self.stdout.write(
+                f"{action:<16}{result['requests']:>6}"
+                f"{result['p50_ms']:>9.1f}{result['p95_ms']:>9.1f}"
+                f"{result['p99_ms']:>9.1f}{result['db_ms_per_request']:>9.1f}"
+                f"{result['error_rate']:>7.1%}{rates['IntegrityError']:>11.1%}"
+                f"{rates['OperationalError']:>13.1%}"
+            )
@@ -0,0 +1,448 @@
+import random
+import time
+from array import array
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from accounts.models import CustomUser, FollowRelation
+from config.utils import ZipfSampler
+from direct_messages.models import Message
+from notifications.models import Notification, NotificationType
+from tweets.models import Tweet, Like, Retweet, Bookmark, Comment
+
+# 通知種別名と説明（各ビューで使用している通知種別）
+NOTIFICATION_TYPES = {
+    "like": "いいね",
+    "retweet": "リツイート",
+    "comment": "コメント",
+}
+
+# 反応のモデルと、反応時に作成する通知の種別名
+ENGAGEMENT_NOTIFICATION_TYPES = {Like: "like", Retweet: "retweet", Comment: "comment"}
+
+# ツイートから反応までの平均経過時間（秒）
+ENGAGEMENT_MEAN_DELAY = 6 * 3600
+
+
+@contextmanager
+def preserve_timestamps(*models):
+    """bulk_create時に登録日時・更新日時が現在日時で上書きされないようにする"""
+    fields = [
+        field
+        for model in models
+        for field in model._meta.concrete_fields
+        if getattr(field, "auto_now", False) or getattr(field, "auto_now_add", False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now = auto_now
+            field.auto_now_add = auto_now_add
+
+
+class Command(BaseCommand):
+    """性能検証用の大量の疑似データを投入するコマンド"""
+
+    help = (
+        "性能検証用に、ユーザー・フォロー・ツイート・反応・通知・メッセージの疑似データを"
+        "一括投入します（同じシードなら同じデータになります）"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000, help="ユーザー数")
+        parser.add_argument(
+            "--avg-following",
+            type=int,
+            default=50,
+            help="1ユーザーあたりの平均フォロー数",
+        )
+        parser.add_argument("--tweets", type=int, default=10000, help="ツイート数")
+        parser.add_argument("--likes", type=int, default=50000, help="いいね数")
+        parser.add_argument("--retweets", type=int, default=10000, help="リツイート数")
+        parser.add_argument(
+            "--bookmarks", type=int, default=10000, help="ブックマーク数"
+        )
+        parser.add_argument("--comments", type=int, default=20000, help="コメント数")
+        parser.add_argument("--messages", type=int, default=10000, help="メッセージ数")
+        parser.add_argument(
+            "--days", type=int, default=30, help="ツイートを分布させる日数"
+        )
+        parser.add_argument(
+            "--end",
+            help="データの最終日時（ISO形式。省略時は当日0時UTC）",
+        )
+        parser.add_argument(
+            "--zipf",
+            type=float,
+            default=1.1,
+            help="人気度の偏り（Zipf分布の指数）",
+        )
+        parser.add_argument("--seed", type=int, default=0, help="乱数のシード")
+        parser.add_argument(
+            "--prefix",
+            default="seed",
+            help="生成するユーザー名の接頭辞",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="1トランザクションで登録する件数",
+        )
+        parser.add_argument(
+            "--skip-derived",
+            action="store_true",
+            help="カウンター・ユーザー統計・タイムライン・おすすめ・会話の再集計を行わない",
+        )
+
+    def handle(self, *args, **options):
+        started_at = time.perf_counter()
+        self.rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        self.zipf = options["zipf"]
+        self.use_copy = connection.vendor == "postgresql"
+
+        if options["users"] < 2:
+            raise CommandError("ユーザー数は2以上を指定してください。")
+        prefix = options["prefix"]
+        if CustomUser.objects.filter(username__startswith=prefix).exists():
+            raise CommandError(
+                f"ユーザー名が{prefix}で始まるユーザーが既に存在します。"
+                "--prefixを変更してください。"
+            )
+
+        self.end = self.get_end(options["end"]).timestamp()
+        self.start = self.end - timedelta(days=options["days"]).total_seconds()
+
+        with preserve_timestamps(
+            CustomUser,
+            FollowRelation,
+            Tweet,
+            Like,
+            Retweet,
+            Bookmark,
+            Comment,
+            Notification,
+            Message,
+        ):
+            self.notification_types = self.get_notification_types()
+            self.create_users(prefix, options["users"])
+            self.create_follows(options["avg_following"])
+            self.create_tweets(options["tweets"])
+            if self.tweet_ids:
+                for model, count in [
+                    (Like, options["likes"]),
+                    (Retweet, options["retweets"]),
+                    (Bookmark, options["bookmarks"]),
+                    (Comment, options["comments"]),
+                ]:
+                    self.create_engagements(model, count)
+            self.create_messages(options["messages"])
+
+        # 非正規化したカウンター等を投入したデータから再集計する
+        if not options["skip_derived"]:
+            for command in [
+                "rebuild_tweet_counts",
+                "rebuild_user_stats",
+                "rebuild_home_timelines",
+                "build_recommendations",
+                "rebuild_conversations",
+            ]:
+                call_command(command, stdout=self.stdout)
+
+        elapsed = time.perf_counter() - started_at
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"疑似データを投入しました。（処理時間: {elapsed:.2f}秒）"
+            )
+        )
+
+    def get_end(self, value):
+        """データの最終日時を取得する"""
+        if value is None:
+            today = datetime.now(dt_timezone.utc).date()
+            return datetime(today.year, today.month, today.day, tzinfo=dt_timezone.utc)
+        end = parse_datetime(value)
+        if end is None:
+            raise CommandError(f"{value}は日時として解釈できません。")
+        if end.tzinfo is None:
+            end = end.replace(tzinfo=dt_timezone.utc)
+        return end
+
+    def get_notification_types(self):
+        """通知種別名と通知種別IDの対応を取得する（存在しなければ作成する）"""
+        notification_types = {}
+        for name, description in NOTIFICATION_TYPES.items():
+            notification_type, _ = NotificationType.objects.get_or_create(
+                name=name, defaults={"description": description}
+            )
+            notification_types[name] = notification_type.pk
+        return notification_types
+
+    def create_users(self, prefix, count):
+        """ユーザーを作成する"""
+        started_at = time.perf_counter()
+        # MEMO: ハッシュ化は重いため、全ユーザーで同じパスワード（password）を使う
+        password = make_password("password", salt="seeddataset")
+        user_ids = []
+        for offset in range(0, count, self.batch_size):
+            users = []
+            for index in range(offset, min(offset + self.batch_size, count)):
+                username = f"{prefix}{index:07d}"
+                joined_at = self.to_datetime(
+                    self.start - self.rng.uniform(0, 365 * 86400)
+                )
+                users.append(
+                    CustomUser(
+                        username=username,
+                        email=f"{username}@example.com",
+                        password=password,
+                        name=f"ユーザー{index}",
+                        date_joined=joined_at,
+                        created_at=joined_at,
+                        updated_at=joined_at,
+                    )
+                )
+            user_ids += self.insert_objects(CustomUser, users)
+
+        self.user_ids = user_ids
+        # 投稿・反応の多さ（活動量）と、フォロー・メッセージの集まりやすさ（人気度）
+        self.active_users = ZipfSampler(user_ids, self.zipf, self.rng)
+        self.popular_users = ZipfSampler(user_ids, self.zipf, self.rng)
+        self.report("ユーザー", len(user_ids), started_at)
+
+    def create_follows(self, avg_following):
+        """フォロー関係を作成する（フォロワー数がべき乗則に従う）"""
+        started_at = time.perf_counter()
+        max_following = len(self.user_ids) - 1
+        fields = ["follower_id", "followee_id", "created_at", "updated_at"]
+        rows = []
+        created = 0
+        for follower_id in self.user_ids:
+            # フォロー数はパレート分布（平均がavg_following）で決める
+            count = min(
+                max_following,
+                int(avg_following / 2 * self.rng.paretovariate(2)),
+            )
+            followee_ids = set()
+            # 自分自身・重複を除いた分を引き直す（試行回数に上限を設ける）
+            for _ in range(3):
+                for followee_id in self.popular_users.sample(count - len(followee_ids)):
+                    if followee_id == follower_id or followee_id in followee_ids:
+                        continue
+                    followee_ids.add(followee_id)
+                    followed_at = self.to_datetime(
+                        self.rng.uniform(self.start - 30 * 86400, self.start)
+                    )
+                    rows.append((follower_id, followee_id, followed_at, followed_at))
+                if len(followee_ids) >= count:
+                    break
+            if len(rows) >= self.batch_size:
+                created += self.insert_rows(FollowRelation, fields, rows)
+                rows = []
+        created += self.insert_rows(FollowRelation, fields, rows)
+        self.report("フォロー関係", created, started_at)
+
+    def create_tweets(self, count):
+        """ツイートを作成する（IDの順と投稿日時の順を揃える）"""
+        started_at = time.perf_counter()
+        timestamps = sorted(
+            self.rng.uniform(self.start, self.end) for _ in range(count)
+        )
+        authors = self.active_users.sample(count)
+        self.tweet_ids = array("q")
+        self.tweet_authors = array("q", authors)
+        self.tweet_timestamps = array("d", timestamps)
+        for offset in range(0, count, self.batch_size):
+            tweets = []
+            for index in range(offset, min(offset + self.batch_size, count)):
+                posted_at = self.to_datetime(timestamps[index])
+                tweets.append(
+                    Tweet(
+                        user_id=authors[index],
+                        content=f"サンプルツイート{index}",
+                        created_at=posted_at,
+                        updated_at=posted_at,
+                    )
+                )
+            self.tweet_ids.extend(self.insert_objects(Tweet, tweets))
+        self.report("ツイート", len(self.tweet_ids), started_at)
+
+    def create_engagements(self, model, count):
+        """反応（いいね・リツイート・ブックマーク・コメント）と通知を作成する"""
+        started_at = time.perf_counter()
+        is_comment = model is Comment
+        notification_type_id = self.notification_types.get(
+            ENGAGEMENT_NOTIFICATION_TYPES.get(model)
+        )
+        tweets = ZipfSampler(range(len(self.tweet_ids)), self.zipf, self.rng)
+        fields = ["user_id", "tweet_id", "created_at", "updated_at"]
+
+        seen = set()
+        created = 0
+        notified = 0
+        # 重複で件数が足りない場合に備え、試行回数に上限を設ける
+        for _ in range(10):
+            remaining = count - created
+            if remaining <= 0:
+                break
+            for offset in range(0, remaining, self.batch_size):
+                size = min(self.batch_size, remaining - offset)
+                rows = []
+                for user_id, index in zip(
+                    self.active_users.sample(size), tweets.sample(size)
+                ):
+                    # コメント以外はユーザーとツイートの組み合わせが一意
+                    if not is_comment:
+                        key = (user_id << 32) | index
+                        if key in seen:
+                            continue
+                        seen.add(key)
+                    engaged_at = self.to_datetime(
+                        min(
+                            self.end,
+                            self.tweet_timestamps[index]
+                            + self.rng.expovariate(1 / ENGAGEMENT_MEAN_DELAY),
+                        )
+                    )
+                    row = [user_id, self.tweet_ids[index], engaged_at, engaged_at]
+                    if is_comment:
+                        row.append(f"サンプルコメント{created + len(rows)}")
+                    rows.append((row, self.tweet_authors[index]))
+
+                if is_comment:
+                    comment_ids = self.insert_objects(
+                        Comment,
+                        [
+                            Comment(**dict(zip(fields + ["content"], row)))
+                            for row, _ in rows
+                        ],
+                    )
+                else:
+                    comment_ids = [None] * len(rows)
+                    self.insert_rows(model, fields, [row for row, _ in rows])
+                created += len(rows)
+
+                # 自分以外のツイートへの反応は、ビューと同様に通知を作成する
+                if notification_type_id is not None:
+                    notifications = [
+                        (
+                            notification_type_id,
+                            row[0],
+                            author_id,
+                            row[1],
+                            comment_id,
+                            # 直近1日以外の通知は大半を既読にする
+                            row[2].timestamp() < self.end - 86400
+                            and self.rng.random() < 0.8,
+                            # 疑似データは1反応1件とし、ダイジェスト送信済みとする
+                            1,
+                            row[2],
+                            row[2],
+                            row[2],
+                        )
+                        for (row, author_id), comment_id in zip(rows, comment_ids)
+                        if row[0] != author_id
+                    ]
+                    notified += self.insert_rows(
+                        Notification,
+                        [
+                            "notification_type_id",
+                            "sender_id",
+                            "receiver_id",
+                            "tweet_id",
+                            "comment_id",
+                            "is_read",
+                            "actor_count",
+                            "digested_at",
+                            "created_at",
+                            "updated_at",
+                        ],
+                        notifications,
+                    )
+
+        self.report(model._meta.db_table, created, started_at)
+        if notification_type_id is not None:
+            self.report(f"通知（{model._meta.db_table}）", notified, started_at)
+
+    def create_messages(self, count):
+        """ダイレクトメッセージを作成する（人気ユーザーほど多く受信する）"""
+        started_at = time.perf_counter()
+        fields = ["sender_id", "receiver_id", "content", "created_at", "updated_at"]
+        created = 0
+        for offset in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - offset)
+            rows = []
+            for sender_id, receiver_id in zip(
+                self.active_users.sample(size), self.popular_users.sample(size)
+            ):
+                if sender_id == receiver_id:
+                    continue
+                sent_at = self.to_datetime(self.rng.uniform(self.start, self.end))
+                rows.append(
+                    (
+                        sender_id,
+                        receiver_id,
+                        f"サンプルメッセージ{offset + len(rows)}",
+                        sent_at,
+                        sent_at,
+                    )
+                )
+            created += self.insert_rows(Message, fields, rows)
+        self.report("メッセージ", created, started_at)
+
+    def insert_objects(self, model, objects):
+        """モデルのインスタンスを一括登録し、採番されたIDの一覧を返す"""
+        with transaction.atomic():
+            model.objects.bulk_create(objects, batch_size=self.batch_size)
+        return [obj.pk for obj in objects]
+
+    def insert_rows(self, model, field_names, rows):
+        """
+        行データを一括登録する（PostgreSQLではCOPYを使う）
+
+        Args:
+            model (Model): 登録先のモデル
+            field_names (list): 列に対応するフィールド名（外部キーは`_id`付き）
+            rows (list): 行データ（タプル）の一覧
+
+        Returns:
+            int: 登録した件数
+        """
+        if not rows:
+            return 0
+        with transaction.atomic():
+            if self.use_copy:
+                quote_name = connection.ops.quote_name
+                columns = ", ".join(
+                    quote_name(model._meta.get_field(name).column)
+                    for name in field_names
+                )
+                table = quote_name(model._meta.db_table)
+                with connection.cursor() as cursor:
+                    with cursor.copy(f"COPY {table} ({columns}) FROM STDIN") as copy:
+                        for row in rows:
+                            copy.write_row(row)
+            else:
+                model.objects.bulk_create(
+                    [model(**dict(zip(field_names, row))) for row in rows],
+                    batch_size=self.batch_size,
+                )
+        return len(rows)
+
+    def to_datetime(self, timestamp):
+        return datetime.fromtimestamp(timestamp, tz=dt_timezone.utc)
+
+    def report(self, label, count, started_at):
+        elapsed = time.perf_counter() - started_at
+        self.stdout.write(f"{label}: {count}件（{elapsed:.2f}秒）")
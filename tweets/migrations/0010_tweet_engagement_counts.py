@@ -0,0 +1,58 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:10
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_counts(apps, schema_editor):
+    """既存ツイートのエンゲージメント数を集計して設定する"""
+    Tweet = apps.get_model("tweets", "Tweet")
+    counts = {}
+    for field_name, model_name in [
+        ("like_count", "Like"),
+        ("retweet_count", "Retweet"),
+        ("bookmark_count", "Bookmark"),
+        ("comment_count", "Comment"),
+    ]:
+        model = apps.get_model("tweets", model_name)
+        subquery = (
+            model.objects.filter(tweet=OuterRef("pk"))
+            .order_by()
+            .values("tweet")
+            .annotate(count=Count("pk"))
+            .values("count")
+        )
+        counts[field_name] = Coalesce(Subquery(subquery), 0)
+    Tweet.objects.update(**counts)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tweets", "0009_bookmark"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tweet",
+            name="bookmark_count",
+            field=models.PositiveIntegerField(default=0, verbose_name="ブックマーク数"),
+        ),
+        migrations.AddField(
+            model_name="tweet",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0, verbose_name="コメント数"),
+        ),
+        migrations.AddField(
+            model_name="tweet",
+            name="like_count",
+            field=models.PositiveIntegerField(default=0, verbose_name="いいね数"),
+        ),
+        migrations.AddField(
+            model_name="tweet",
+            name="retweet_count",
+            field=models.PositiveIntegerField(default=0, verbose_name="リツイート数"),
+        ),
+        migrations.RunPython(backfill_counts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:13
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_home_timelines(apps, schema_editor):
+    """既存ユーザーのタイムラインに、フォロー中のユーザーの最近のツイートを登録する"""
+    CustomUser = apps.get_model(settings.AUTH_USER_MODEL)
+    FollowRelation = apps.get_model("accounts", "FollowRelation")
+    Tweet = apps.get_model("tweets", "Tweet")
+    HomeTimelineEntry = apps.get_model("tweets", "HomeTimelineEntry")
+    owner_ids = CustomUser.objects.filter(
+        pk__in=FollowRelation.objects.values("follower_id")
+    ).values_list("pk", flat=True)
+    for owner_id in owner_ids.order_by("pk").iterator():
+        recent_tweets = (
+            Tweet.objects.filter(
+                user_id__in=FollowRelation.objects.filter(follower_id=owner_id).values(
+                    "followee_id"
+                )
+            )
+            .order_by("-created_at", "-id")
+            .values_list("id", "created_at")[: settings.HOME_TIMELINE_MAX_LENGTH]
+        )
+        HomeTimelineEntry.objects.bulk_create(
+            [
+                HomeTimelineEntry(
+                    owner_id=owner_id, tweet_id=tweet_id, tweet_created_at=created_at
+                )
+                for tweet_id, created_at in recent_tweets
+            ],
+            batch_size=1000,
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tweets", "0010_tweet_engagement_counts"),
+        ("accounts", "0003_followrelation"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HomeTimelineEntry",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="登録日時"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新日時"),
+                ),
+                (
+                    "tweet_created_at",
+                    models.DateTimeField(verbose_name="ツイート登録日時"),
+                ),
+                (
+                    "owner",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="home_timeline_entries",
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                (
+                    "tweet",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="home_timeline_entries",
+                        to="tweets.tweet",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "home_timeline",
+                "indexes": [
+                    models.Index(
+                        fields=["owner", "-tweet_created_at", "-tweet"],
+                        name="home_timeline_owner_idx",
+                    )
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("owner", "tweet"), name="unique_home_timeline_entry"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_home_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tweets", "0011_home_timeline"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RecommendedTweet",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="登録日時"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新日時"),
+                ),
+                ("score", models.FloatField(verbose_name="スコア")),
+                (
+                    "tweet",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="recommendation",
+                        to="tweets.tweet",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "recommended_tweet",
+                "indexes": [
+                    models.Index(
+                        fields=["-score", "-tweet"], name="recommended_tweet_score_idx"
+                    )
+                ],
+            },
+        ),
+    ]
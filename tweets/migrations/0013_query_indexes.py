@@ -0,0 +1,55 @@
+# Generated by Django 5.1.2 on 2026-10-18 03:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tweets", "0012_recommended_tweet"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bookmark",
+            index=models.Index(
+                fields=["user", "-created_at", "tweet"],
+                name="bookmark_user_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["tweet", "created_at", "id"], name="comment_tweet_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["user", "-created_at", "tweet"], name="comment_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="like",
+            index=models.Index(
+                fields=["user", "-created_at", "tweet"], name="like_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="retweet",
+            index=models.Index(
+                fields=["user", "-created_at", "tweet"], name="retweet_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tweet",
+            index=models.Index(
+                fields=["user", "-created_at", "-id"], name="tweet_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tweet",
+            index=models.Index(fields=["-created_at", "-id"], name="tweet_created_idx"),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.2 on 2026-10-18 04:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tweets", "0013_query_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="HomeTimelineFanOut",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "created_at",
+                    models.DateTimeField(auto_now_add=True, verbose_name="登録日時"),
+                ),
+                (
+                    "updated_at",
+                    models.DateTimeField(auto_now=True, verbose_name="更新日時"),
+                ),
+                (
+                    "tweet",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="fan_out",
+                        to="tweets.tweet",
+                    ),
+                ),
+            ],
+            options={
+                "db_table": "home_timeline_fan_out",
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.2 on 2026-10-18 04:23
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tweets", "0014_home_timeline_fan_out"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="bookmark",
+            name="bookmark_user_created_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="comment",
+            name="comment_user_created_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="like",
+            name="like_user_created_idx",
+        ),
+        migrations.RemoveIndex(
+            model_name="retweet",
+            name="retweet_user_created_idx",
+        ),
+        migrations.AddIndex(
+            model_name="bookmark",
+            index=models.Index(
+                fields=["user", "-created_at", "-tweet"],
+                name="bookmark_user_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["user", "-created_at", "-tweet"],
+                name="comment_user_created_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="like",
+            index=models.Index(
+                fields=["user", "-created_at", "-tweet"], name="like_user_created_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="retweet",
+            index=models.Index(
+                fields=["user", "-created_at", "-tweet"],
+                name="retweet_user_created_idx",
+            ),
+        ),
+    ]
@@ -1,7 +1,18 @@
-from django.db import models
-from accounts.models import CustomUser
+import heapq
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, models, transaction
+from django.db.models import Exists, F, OuterRef, Window
+from django.db.models.functions import Greatest, RowNumber
+from accounts.models import CustomUser, UserStats
+from config.metrics import registry
 from config.utils import get_resized_image_url
 
+logger = logging.getLogger(__name__)
+
 
 class AbstractCommon(models.Model):
     """共通フィールド用の抽象基底クラス"""
@@ -13,17 +24,69 @@ class AbstractCommon(models.Model):
     updated_at = models.DateTimeField("更新日時", auto_now=True)
 
 
+class TweetQuerySet(models.QuerySet):
+    """ログインユーザーの情報を評価時に付与するツイート用クエリセット"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._status_user = None
+
+    def _clone(self):
+        clone = super()._clone()
+        # スライス・フィルタ後のクエリセットにもログインユーザーを引き継ぐ
+        clone._status_user = self._status_user
+        return clone
+
+    def with_status(self, requesting_user):
+        """評価された行にだけログインユーザーの情報を付与するクエリセットを返す"""
+        clone = self._chain()
+        clone._status_user = requesting_user
+        return clone
+
+    def _fetch_all(self):
+        is_fetched = self._result_cache is not None
+        super()._fetch_all()
+        # 初回評価時のみ、実際に取得した行（ページネーション後の行）に情報を付与する
+        if (
+            is_fetched
+            or self._status_user is None
+            or self._iterable_class is not models.query.ModelIterable
+        ):
+            return
+        # 取得した行のツイート・投稿者に限定してログインユーザーとの関係を取得する
+        relations = self._status_user.get_relations_for(
+            tweet_ids=[tweet.id for tweet in self._result_cache],
+            user_ids={tweet.user_id for tweet in self._result_cache},
+        )
+        for tweet in self._result_cache:
+            tweet.add_status(self._status_user, relations)
+
+
 class Tweet(AbstractCommon):
     """ツイート情報の格納用モデル"""
 
     class Meta:
         db_table = "tweet"
+        indexes = [
+            # ユーザーごとのツイート一覧（プロフィール・読み込み時のタイムライン統合）
+            models.Index(
+                fields=["user", "-created_at", "-id"], name="tweet_user_created_idx"
+            ),
+            # 新しい順のツイート一覧（おすすめ未集計時・スコア集計対象の抽出）
+            models.Index(fields=["-created_at", "-id"], name="tweet_created_idx"),
+        ]
+
+    objects = TweetQuerySet.as_manager()
 
     user = models.ForeignKey(
         CustomUser, on_delete=models.CASCADE, related_name="tweets"
     )
     content = models.CharField("ツイート内容", max_length=140, null=False, blank=False)
     image = models.ImageField("ツイート画像", upload_to="tweets/", blank=True)
+    like_count = models.PositiveIntegerField("いいね数", default=0)
+    retweet_count = models.PositiveIntegerField("リツイート数", default=0)
+    bookmark_count = models.PositiveIntegerField("ブックマーク数", default=0)
+    comment_count = models.PositiveIntegerField("コメント数", default=0)
 
     def __str__(self):
         return f"{self.user.username}のツイート: ${self.content[:20]}"
@@ -31,25 +94,30 @@ class Tweet(AbstractCommon):
     @classmethod
     def get_base_queryset(cls):
         """基本のクエリセット"""
-        return (
-            cls.objects.select_related("user")
-            .prefetch_related("likes", "retweets", "bookmarks")
-            .order_by("-created_at")
-        )
+        return cls.objects.select_related("user").order_by("-created_at", "-id")
 
     @classmethod
     def get_timeline_tweets(cls, requesting_user):
         """おすすめのツイート一覧を取得する"""
         queryset = cls.get_base_queryset()
+        if RecommendedTweet.objects.exists():
+            # 集計済みのおすすめ候補をスコア順に取得する
+            queryset = (
+                queryset.filter(recommendation__isnull=False)
+                .annotate(recommendation_score=F("recommendation__score"))
+                .order_by("-recommendation_score", "-id")
+            )
+        else:
+            # おすすめ候補が未集計の場合は新しい順に取得する
+            queryset = queryset.order_by("-created_at", "-id")
         return cls.get_tweets_with_status(queryset, requesting_user)
 
     @classmethod
     def get_following_tweets(cls, requesting_user):
         """フォロー中のツイート一覧を取得する"""
-        following_user_ids = requesting_user.following_relations.values_list(
-            "followee", flat=True
-        )
-        queryset = cls.get_base_queryset().filter(user_id__in=following_user_ids)
+        # 投稿時に配信済みのホームタイムラインからツイートIDを取得する
+        tweet_ids = HomeTimelineEntry.get_tweet_ids(owner=requesting_user)
+        queryset = cls.get_base_queryset().filter(id__in=tweet_ids)
         return cls.get_tweets_with_status(queryset, requesting_user)
 
     @classmethod
@@ -60,36 +128,73 @@ class Tweet(AbstractCommon):
 
     @classmethod
     def get_liked_tweets(cls, user, requesting_user=None):
-        """いいねしたツイート一覧を取得する"""
-        liked_tweet_ids = user.likes.values_list("tweet", flat=True)
-        queryset = cls.get_base_queryset().filter(id__in=liked_tweet_ids)
+        """いいねしたツイート一覧を取得する（いいねした日時の新しい順）"""
+        queryset = cls.get_engaged_tweets("likes", user)
         return cls.get_tweets_with_status(queryset, requesting_user)
 
     @classmethod
     def get_retweeted_tweets(cls, user, requesting_user=None):
-        """リツイートしたツイート一覧を取得する"""
-        retweeted_tweet_ids = user.retweets.values_list("tweet", flat=True)
-        queryset = cls.get_base_queryset().filter(id__in=retweeted_tweet_ids)
+        """リツイートしたツイート一覧を取得する（リツイートした日時の新しい順）"""
+        queryset = cls.get_engaged_tweets("retweets", user)
         return cls.get_tweets_with_status(queryset, requesting_user)
 
     @classmethod
     def get_commented_tweets(cls, user, requesting_user=None):
-        """コメントしたツイート一覧を取得する"""
-        commented_tweet_ids = user.comments.values_list("tweet", flat=True)
-        queryset = cls.get_base_queryset().filter(id__in=commented_tweet_ids)
+        """コメントしたツイート一覧を取得する（最後にコメントした日時の新しい順）"""
+        queryset = cls.get_engaged_tweets("comments", user).annotate(
+            engagement_id=F("comments__id")
+        )
+        # 同じツイートへの複数のコメントは、最新のコメントの1行にまとめる
+        newer_comments = Comment.objects.filter(
+            models.Q(created_at__gt=OuterRef("engaged_at"))
+            | models.Q(
+                created_at=OuterRef("engaged_at"), id__gt=OuterRef("engagement_id")
+            ),
+            user=user,
+            tweet=OuterRef("pk"),
+        )
+        queryset = queryset.filter(~Exists(newer_comments))
         return cls.get_tweets_with_status(queryset, requesting_user)
 
     @classmethod
     def get_bookmarked_tweets(cls, requesting_user):
-        """ブックマークしたツイート一覧を取得する"""
-        bookmarked_tweet_ids = requesting_user.bookmarks.values_list("tweet", flat=True)
-        queryset = cls.get_base_queryset().filter(id__in=bookmarked_tweet_ids)
+        """ブックマークしたツイート一覧を取得する（ブックマークした日時の新しい順）"""
+        queryset = cls.get_engaged_tweets("bookmarks", requesting_user)
         return cls.get_tweets_with_status(queryset, requesting_user)
 
+    @classmethod
+    def get_engaged_tweets(cls, relation, user):
+        """
+        ユーザーが反応したツイート一覧を、反応した日時の新しい順に取得する
+
+        反応のテーブル（いいね・リツイート等）を起点に結合し、(user, -created_at, -tweet)の
+        インデックスの範囲走査で取得できるよう、反応日時と反応のテーブルのツイートIDの順に並べる。
+
+        Args:
+            relation (str): 反応のテーブルへの逆参照名（likes, retweets, bookmarks, comments）
+            user (CustomUser): 反応したユーザー
+
+        Returns:
+            QuerySet: 反応日時（engaged_at）・反応のテーブルのツイートID（engaged_tweet_id）を
+                付与したツイートのクエリセット
+        """
+        # MEMO: ツイートIDは結合先（tweet.id）ではなく反応のテーブルの列で並べる。
+        # 結合先の列で並べると、インデックスの順序を使えずに並べ替えが発生する
+        return (
+            cls.get_base_queryset()
+            .filter(**{f"{relation}__user": user})
+            .annotate(
+                engaged_at=F(f"{relation}__created_at"),
+                engaged_tweet_id=F(f"{relation}__tweet_id"),
+            )
+            .order_by("-engaged_at", "-engaged_tweet_id")
+        )
+
     @classmethod
     def get_tweet_detail(cls):
         """単一のツイート情報を取得"""
-        return cls.get_base_queryset().prefetch_related("comments__user")
+        # MEMO: コメントはページ単位で別途取得するため、ここでは取得しない
+        return cls.get_base_queryset()
 
     @classmethod
     def get_tweets_with_status(cls, queryset, requesting_user=None):
@@ -99,17 +204,56 @@ class Tweet(AbstractCommon):
         if requesting_user is None:
             return queryset
 
-        # ログインユーザーに関連する情報取得（いいね・リツイート・ブックマークなど）
-        relations = requesting_user.get_relations()
-        if relations:
-            for tweet in queryset:
-                # 各ツイートに情報を付与する
-                tweet.add_status(requesting_user, relations)
+        # MEMO: 情報の付与はクエリセット評価時に行うため、ページネーションで
+        # スライスされた後の行（表示対象のページ）にのみ適用される
+        return queryset.with_status(requesting_user)
+
+    def get_fragment_cache_key(self):
+        """ツイートカードの描画結果のキャッシュキー（ツイート・投稿者のプロフィールの更新で変わる）"""
+        return (
+            f"tweet_fragments:{self.id}:{self.updated_at.timestamp()}:"
+            f"{self.user_id}:{self.user.profile_updated_at.timestamp()}"
+        )
 
-        return queryset
+    def update_count(self, field_name, amount):
+        """エンゲージメント数のカウンターをDB上で増減する"""
+        # 同時更新でも値が失われないようにF式で更新し、0未満にはしない
+        Tweet.objects.filter(pk=self.pk).update(
+            **{field_name: Greatest(F(field_name) + amount, 0)}
+        )
+
+    def add_engagement(self, model, user):
+        """
+        ツイートへの反応（いいね・リツイート・ブックマーク）を登録する
+
+        Returns:
+            bool: 登録した場合はTrue（同時に登録済みだった場合はFalse）
+        """
+        try:
+            with transaction.atomic():
+                model.objects.create(user=user, tweet=self)
+        except IntegrityError:
+            return False
+        return True
+
+    def remove_engagement(self, engagement):
+        """
+        ツイートへの反応を削除する
+
+        Returns:
+            bool: 削除した場合はTrue（同時に削除済みだった場合はFalse）
+        """
+        deleted, _ = type(engagement).objects.filter(pk=engagement.pk).delete()
+        return deleted > 0
+
+    def get_relations_for_user(self, requesting_user):
+        """単一のツイートに関するログインユーザーの情報を取得する"""
+        return requesting_user.get_relations_for(
+            tweet_ids=[self.id], user_ids=[self.user_id]
+        )
 
     def add_status(self, requesting_user, relations):
-        """単一のツイートにログインユーザーの情報や画像リサイズを付与する"""
+        """単一のツイートにログインユーザーの情報を付与する"""
 
         # ログインユーザーが指定されていない場合は、そのまま返す
         if requesting_user is None:
@@ -128,11 +272,15 @@ class Tweet(AbstractCommon):
             )
             # ツイート投稿者がフォロワーかどうか設定
             self.user.is_following = self.user.id in relations["follower_user_ids"]
-            # ツイート画像のリサイズ
-            if self.image:
-                self.resized_image_url = get_resized_image_url(self.image.url, 150, 150)
         return self
 
+    @property
+    def resized_image_url(self):
+        """リサイズしたツイート画像のURL（画像がない場合はNone）"""
+        if not self.image:
+            return None
+        return get_resized_image_url(self.image.url, 150, 150)
+
 
 class Like(AbstractCommon):
     """いいね情報の格納用モデル"""
@@ -140,11 +288,19 @@ class Like(AbstractCommon):
     class Meta:
         db_table = "like"
         constraints = [
+            # ユーザーとツイートの組み合わせの一意性（関連情報の取得にも使用）
             models.UniqueConstraint(
                 fields=["user", "tweet"],
                 name="unique_like_relation",
             )
         ]
+        indexes = [
+            # ユーザーごとの一覧を操作日時順に取得する
+            models.Index(
+                fields=["user", "-created_at", "-tweet"],
+                name="like_user_created_idx",
+            )
+        ]
 
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name="likes")
     tweet = models.ForeignKey(Tweet, on_delete=models.CASCADE, related_name="likes")
@@ -159,11 +315,19 @@ class Retweet(AbstractCommon):
     class Meta:
         db_table = "retweet"
         constraints = [
+            # ユーザーとツイートの組み合わせの一意性（関連情報の取得にも使用）
             models.UniqueConstraint(
                 fields=["user", "tweet"],
                 name="unique_retweet_relation",
             )
         ]
+        indexes = [
+            # ユーザーごとの一覧を操作日時順に取得する
+            models.Index(
+                fields=["user", "-created_at", "-tweet"],
+                name="retweet_user_created_idx",
+            )
+        ]
 
     user = models.ForeignKey(
         CustomUser, on_delete=models.CASCADE, related_name="retweets"
@@ -180,11 +344,19 @@ class Bookmark(AbstractCommon):
     class Meta:
         db_table = "bookmark"
         constraints = [
+            # ユーザーとツイートの組み合わせの一意性（関連情報の取得にも使用）
             models.UniqueConstraint(
                 fields=["user", "tweet"],
                 name="unique_bookmark_relation",
             )
         ]
+        indexes = [
+            # ユーザーごとの一覧を操作日時順に取得する
+            models.Index(
+                fields=["user", "-created_at", "-tweet"],
+                name="bookmark_user_created_idx",
+            )
+        ]
 
     user = models.ForeignKey(
         CustomUser, on_delete=models.CASCADE, related_name="bookmarks"
@@ -200,6 +372,17 @@ class Comment(AbstractCommon):
 
     class Meta:
         db_table = "comment"
+        indexes = [
+            # ツイートごとのコメント一覧を投稿日時順に取得する
+            models.Index(
+                fields=["tweet", "created_at", "id"], name="comment_tweet_created_idx"
+            ),
+            # ユーザーごとのコメント一覧を投稿日時順に取得する
+            models.Index(
+                fields=["user", "-created_at", "-tweet"],
+                name="comment_user_created_idx",
+            ),
+        ]
 
     user = models.ForeignKey(
         CustomUser, on_delete=models.CASCADE, related_name="comments"
@@ -209,3 +392,291 @@ class Comment(AbstractCommon):
 
     def __str__(self):
         return f"[{self.id}] {self.user.username} commented: {self.content} on {self.tweet.content}"
+
+    @classmethod
+    def get_tweet_comments(cls, tweet):
+        """ツイートに対するコメント一覧を投稿日時の古い順に取得する"""
+        return (
+            cls.objects.select_related("user")
+            .filter(tweet=tweet)
+            .order_by("created_at", "id")
+        )
+
+
+class HomeTimelineEntry(AbstractCommon):
+    """フォロー中タイムライン（ユーザーごとに事前計算したツイート一覧）の格納用モデル"""
+
+    class Meta:
+        db_table = "home_timeline"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["owner", "tweet"],
+                name="unique_home_timeline_entry",
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["owner", "-tweet_created_at", "-tweet"],
+                name="home_timeline_owner_idx",
+            )
+        ]
+
+    owner = models.ForeignKey(
+        CustomUser, on_delete=models.CASCADE, related_name="home_timeline_entries"
+    )
+    tweet = models.ForeignKey(
+        Tweet, on_delete=models.CASCADE, related_name="home_timeline_entries"
+    )
+    tweet_created_at = models.DateTimeField("ツイート登録日時")
+
+    def __str__(self):
+        return f"[{self.id}] {self.owner.username} timeline: {self.tweet.content}"
+
+    PULL_USER_IDS_CACHE_KEY = "home_timeline:pull_user_ids"
+
+    @classmethod
+    def get_tweet_ids(cls, owner):
+        """タイムラインのツイートIDを新しい順に上限件数まで取得する"""
+        entries = cls.objects.filter(owner=owner).order_by(
+            "-tweet_created_at", "-tweet"
+        )
+
+        # フォロー中に配信対象外（フォロワーが多い）のユーザーがいなければ、そのまま返す
+        pull_user_ids = cls.get_pull_sources(owner)
+        if not pull_user_ids:
+            return entries.values("tweet_id")[: settings.HOME_TIMELINE_MAX_LENGTH]
+
+        # 配信済みのツイートと、配信対象外ユーザーの最近のツイートを読み込み時に統合する
+        sources = [
+            list(
+                entries.values_list("tweet_created_at", "tweet_id")[
+                    : settings.HOME_TIMELINE_MAX_LENGTH
+                ]
+            )
+        ]
+        for user_id in pull_user_ids:
+            sources.append(
+                list(
+                    Tweet.objects.filter(user_id=user_id)
+                    .order_by("-created_at", "-id")
+                    .values_list("created_at", "id")[
+                        : settings.HOME_TIMELINE_PULL_LIMIT
+                    ]
+                )
+            )
+        return cls.merge_sources(sources)
+
+    @classmethod
+    def get_pull_sources(cls, owner):
+        """
+        読み込み時にツイートを取得する、フォロー中の配信対象外ユーザーのIDを取得する
+
+        上限数（HOME_TIMELINE_MAX_PULL_SOURCES）を超える場合は、最近ツイートした
+        ユーザーを優先する（超えた分は警告を記録して除外する）。
+        """
+        max_sources = settings.HOME_TIMELINE_MAX_PULL_SOURCES
+        latest_tweets = Tweet.objects.filter(user=OuterRef("followee_id")).order_by(
+            "-created_at", "-id"
+        )
+        pull_user_ids = list(
+            owner.following_relations.filter(followee_id__in=cls.get_pull_user_ids())
+            .annotate(
+                latest_tweet_at=models.Subquery(latest_tweets.values("created_at")[:1])
+            )
+            .order_by(F("latest_tweet_at").desc(nulls_last=True), "followee_id")
+            .values_list("followee_id", flat=True)[: max_sources + 1]
+        )
+        if len(pull_user_ids) > max_sources:
+            logger.warning(
+                "home timeline pull sources truncated: owner=%d limit=%d",
+                owner.pk,
+                max_sources,
+            )
+        return pull_user_ids[:max_sources]
+
+    @classmethod
+    def merge_sources(cls, sources):
+        """(登録日時, ツイートID)の降順リストをk-wayマージしてツイートIDを返す"""
+        started_at = time.perf_counter()
+        tweet_ids = []
+        seen = set()
+        for _, tweet_id in heapq.merge(*sources, reverse=True):
+            # 配信と読み込みの両方に含まれるツイートは1件にまとめる
+            if tweet_id in seen:
+                continue
+            seen.add(tweet_id)
+            tweet_ids.append(tweet_id)
+            if len(tweet_ids) >= settings.HOME_TIMELINE_MAX_LENGTH:
+                break
+        elapsed_ms = (time.perf_counter() - started_at) * 1000
+        registry.observe("home_timeline_merge_seconds", elapsed_ms / 1000)
+        logger.debug(
+            "home timeline merge: sources=%d rows=%d elapsed_ms=%.3f",
+            len(sources),
+            len(tweet_ids),
+            elapsed_ms,
+        )
+        return tweet_ids
+
+    @classmethod
+    def get_pull_user_ids(cls):
+        """フォロワー数が閾値を超え、投稿時の配信を行わないユーザーのIDを取得する"""
+
+        def get_user_ids():
+            return set(
+                UserStats.objects.filter(
+                    follower_count__gt=settings.HOME_TIMELINE_FANOUT_THRESHOLD
+                ).values_list("user_id", flat=True)
+            )
+
+        # 全ユーザーを対象とした抽出になるため、一定時間キャッシュする
+        return cache.get_or_set(
+            cls.PULL_USER_IDS_CACHE_KEY,
+            get_user_ids,
+            settings.HOME_TIMELINE_PULL_USER_IDS_TIMEOUT,
+        )
+
+    @classmethod
+    def fan_out(cls, tweet, batch_size=1000):
+        """投稿されたツイートをフォロワー全員のタイムラインに配信する"""
+        # フォロワーが多いユーザーのツイートは読み込み時に取得するため配信しない
+        if tweet.user_id in cls.get_pull_user_ids():
+            return
+        follower_ids = tweet.user.follower_relations.values_list(
+            "follower_id", flat=True
+        )
+        entries = []
+        for follower_id in follower_ids.iterator(chunk_size=batch_size):
+            entries.append(
+                cls(
+                    owner_id=follower_id,
+                    tweet=tweet,
+                    tweet_created_at=tweet.created_at,
+                )
+            )
+            # メモリ使用量を抑えるため、一定件数ごとに書き込む
+            if len(entries) >= batch_size:
+                cls.bulk_create_and_trim(entries)
+                entries = []
+        if entries:
+            cls.bulk_create_and_trim(entries)
+
+    @classmethod
+    def bulk_create_and_trim(cls, entries):
+        """タイムラインに一括で追加し、上限件数を超えた古いツイートを削除する"""
+        cls.objects.bulk_create(entries, ignore_conflicts=True)
+        cls.trim_owners({entry.owner_id for entry in entries})
+
+    @classmethod
+    def backfill(cls, owner, followee):
+        """フォローしたユーザーの最近のツイートをタイムラインに追加する"""
+        # 読み込み時に取得するユーザーの場合は追加しない
+        if followee.id in cls.get_pull_user_ids():
+            return
+        recent_tweets = followee.tweets.order_by("-created_at", "-id").values_list(
+            "id", "created_at"
+        )[: settings.HOME_TIMELINE_MAX_LENGTH]
+        entries = [
+            cls(owner=owner, tweet_id=tweet_id, tweet_created_at=created_at)
+            for tweet_id, created_at in recent_tweets
+        ]
+        cls.objects.bulk_create(entries, ignore_conflicts=True)
+        cls.trim(owner)
+
+    @classmethod
+    def remove(cls, owner, followee):
+        """フォロー解除したユーザーのツイートをタイムラインから削除する"""
+        cls.objects.filter(owner=owner, tweet__user=followee).delete()
+
+    @classmethod
+    def trim_owners(cls, owner_ids):
+        """
+        複数ユーザーのタイムラインから、上限件数を超えた古いツイートをまとめて削除する
+
+        ユーザーごとの新しい順の順位をウィンドウ関数で求め、1回の削除で処理する。
+        """
+        overflowed_ids = list(
+            cls.objects.filter(owner_id__in=owner_ids)
+            .annotate(
+                position=Window(
+                    RowNumber(),
+                    partition_by=F("owner_id"),
+                    order_by=[F("tweet_created_at").desc(), F("tweet_id").desc()],
+                )
+            )
+            .filter(position__gt=settings.HOME_TIMELINE_MAX_LENGTH)
+            .values_list("pk", flat=True)
+        )
+        if not overflowed_ids:
+            return 0
+        deleted, _ = cls.objects.filter(pk__in=overflowed_ids).delete()
+        return deleted
+
+    @classmethod
+    def trim(cls, owner):
+        """上限件数を超えた古いツイートをタイムラインから削除する"""
+        max_length = settings.HOME_TIMELINE_MAX_LENGTH
+        # 上限件数の次の行（削除対象の先頭）を境界として取得する
+        boundary = list(
+            cls.objects.filter(owner=owner)
+            .order_by("-tweet_created_at", "-tweet")
+            .values_list("tweet_created_at", "tweet_id")[max_length : max_length + 1]
+        )
+        if not boundary:
+            return 0
+        created_at, tweet_id = boundary[0]
+        deleted, _ = cls.objects.filter(
+            models.Q(tweet_created_at__lt=created_at)
+            | models.Q(tweet_created_at=created_at, tweet_id__lte=tweet_id),
+            owner=owner,
+        ).delete()
+        return deleted
+
+
+class HomeTimelineFanOut(AbstractCommon):
+    """
+    フォロワーのタイムラインへの配信待ちのツイートの格納用モデル
+
+    ツイートと同じトランザクションで登録し、fan_out_tweetsコマンドで配信する。
+    """
+
+    class Meta:
+        db_table = "home_timeline_fan_out"
+
+    tweet = models.OneToOneField(
+        Tweet, on_delete=models.CASCADE, related_name="fan_out"
+    )
+
+    def __str__(self):
+        return f"[{self.id}] fan out: {self.tweet_id}"
+
+    @classmethod
+    def enqueue(cls, tweet):
+        """配信待ちのツイートを登録する"""
+        cls.objects.create(tweet=tweet)
+
+    @classmethod
+    def get_pending(cls):
+        """配信待ちのツイートを登録順に取得する"""
+        return cls.objects.select_related("tweet__user").order_by("id")
+
+
+class RecommendedTweet(AbstractCommon):
+    """おすすめタイムラインの候補（スコア集計済みのツイート）の格納用モデル"""
+
+    class Meta:
+        db_table = "recommended_tweet"
+        indexes = [
+            models.Index(
+                fields=["-score", "-tweet"],
+                name="recommended_tweet_score_idx",
+            )
+        ]
+
+    tweet = models.OneToOneField(
+        Tweet, on_delete=models.CASCADE, related_name="recommendation"
+    )
+    score = models.FloatField("スコア")
+
+    def __str__(self):
+        return f"[{self.id}] {self.score:.3f}: {self.tweet.content}"
@@ -0,0 +1,32 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+from config.metrics import record_cache_access
+
+register = template.Library()
+
+# キャッシュするツイートカードの部品（名前, テンプレート）
+TWEET_FRAGMENT_TEMPLATES = {
+    "icon": "tweets/_tweet_card_icon.html",
+    "meta": "tweets/_tweet_card_meta.html",
+    "content": "tweets/_tweet_card_content.html",
+}
+
+
+@register.simple_tag
+def tweet_fragments(tweet):
+    """ツイートカードのうち、閲覧ユーザーに依存しない部分の描画結果を取得する"""
+    key = tweet.get_fragment_cache_key()
+    fragments = cache.get(key)
+    record_cache_access(hits=int(fragments is not None), misses=int(fragments is None))
+    if fragments is None:
+        fragments = {
+            name: render_to_string(template_name, {"tweet": tweet})
+            for name, template_name in TWEET_FRAGMENT_TEMPLATES.items()
+        }
+        cache.set(key, fragments, settings.TWEET_FRAGMENT_CACHE_TIMEOUT)
+    # キャッシュから復元した文字列はエスケープ済みのHTMLとして扱う
+    return {name: mark_safe(html) for name, html in fragments.items()}
@@ -1,3 +1,818 @@
-from django.test import TestCase
+import base64
+import io
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db.models import F
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from accounts.models import CustomUser, FollowRelation, UserStats
+from notifications.models import Notification, NotificationType
+from .templatetags import tweet_tags
+from .management.commands import benchmark_views, explain_queries, replay_workload
+from .models import (
+    Bookmark,
+    Comment,
+    HomeTimelineEntry,
+    HomeTimelineFanOut,
+    Like,
+    RecommendedTweet,
+    Retweet,
+    Tweet,
+)
+
+
+def create_user(username):
+    return CustomUser.objects.create_user(
+        username=username, email=f"{username}@example.com", password="password"
+    )
+
+
+class TweetTestCase(TestCase):
+    """ツイート関連のテストの共通処理"""
+
+    def setUp(self):
+        cache.clear()
+        # 通知種別の一覧の無効化はトランザクション確定後に行われるため、ここで反映させる
+        with self.captureOnCommitCallbacks(execute=True):
+            for name in ["like", "retweet", "comment"]:
+                NotificationType.objects.create(name=name)
+
+
+class EngagementToggleTests(TweetTestCase):
+    """いいね・リツイート・ブックマークの切り替えとカウンターの整合性"""
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user("author")
+        self.user = create_user("user")
+        self.tweet = Tweet.objects.create(user=self.author, content="tweet")
+        self.client.force_login(self.user)
+
+    def toggle(self, name):
+        return self.client.post(f"/tweets/{name}-toggle", {"tweet_id": self.tweet.id})
+
+    def assertCountersMatchRows(self):
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.like_count, Like.objects.count())
+        self.assertEqual(self.tweet.retweet_count, Retweet.objects.count())
+        self.assertEqual(self.tweet.bookmark_count, Bookmark.objects.count())
+        stats = UserStats.objects.get(user=self.user)
+        self.assertEqual(stats.like_count, self.user.likes.count())
+        self.assertEqual(stats.bookmark_count, self.user.bookmarks.count())
+
+    def test_toggle_keeps_counters_in_sync(self):
+        for name in ["like", "retweet", "bookmark"]:
+            self.toggle(name)
+        self.assertCountersMatchRows()
+        self.assertEqual(self.tweet.like_count, 1)
+        self.assertEqual(Notification.objects.filter(receiver=self.author).count(), 2)
+
+        for name in ["like", "retweet", "bookmark"]:
+            self.toggle(name)
+        self.assertCountersMatchRows()
+        self.assertEqual(self.tweet.like_count, 0)
+        self.assertFalse(Notification.objects.exists())
+
+    def test_duplicate_add_is_not_counted(self):
+        self.assertTrue(self.tweet.add_engagement(Like, self.user))
+        # 同時に登録された場合は一意制約で失敗し、件数は増やさない
+        self.assertFalse(self.tweet.add_engagement(Like, self.user))
+        self.assertEqual(Like.objects.count(), 1)
+
+    def test_stale_remove_is_not_counted(self):
+        self.toggle("like")
+        like = Like.objects.get()
+        # 別のリクエストで先に削除された場合は、件数を減らさない
+        self.toggle("like")
+        self.assertFalse(self.tweet.remove_engagement(like))
+        self.assertCountersMatchRows()
+
+    def test_counters_do_not_drift_below_rows(self):
+        other = create_user("other")
+        Like.objects.create(user=other, tweet=self.tweet)
+        self.tweet.update_count("like_count", 1)
+        # 登録済みの状態で削除を2回行っても、他のユーザーのいいねの分は残る
+        self.toggle("like")
+        like = Like.objects.get(user=self.user)
+        self.toggle("like")
+        self.tweet.remove_engagement(like)
+        self.assertCountersMatchRows()
+        self.assertEqual(self.tweet.like_count, 1)
+
+
+def encode_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+class CursorPaginationTests(TweetTestCase):
+    """キーセット方式のページネーション"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("user")
+        self.tweets = [
+            Tweet.objects.create(user=self.user, content=f"tweet {i}")
+            for i in range(12)
+        ]
+        self.client.force_login(self.user)
+
+    def get_page(self, url, cursor=None):
+        response = self.client.get(url, {"cursor": cursor} if cursor else {})
+        self.assertEqual(response.status_code, 200)
+        return response.context["page_obj"]
+
+    def test_forward_and_back(self):
+        newest = [tweet.id for tweet in reversed(self.tweets)]
+        first = self.get_page("/")
+        self.assertEqual([tweet.id for tweet in first], newest[:5])
+        self.assertFalse(first.has_previous())
+
+        second = self.get_page("/", first.next_cursor)
+        self.assertEqual([tweet.id for tweet in second], newest[5:10])
+        third = self.get_page("/", second.next_cursor)
+        self.assertEqual([tweet.id for tweet in third], newest[10:])
+        self.assertFalse(third.has_next())
+
+        back = self.get_page("/", second.previous_cursor)
+        self.assertEqual([tweet.id for tweet in back], newest[:5])
+
+    def test_invalid_cursor_falls_back_to_first_page(self):
+        created_at = self.tweets[5].created_at.isoformat()
+        cursors = [
+            "!!!",
+            encode_cursor(["n", created_at]),
+            encode_cursor({"d": "n", "k": ["created_at", "id"], "v": ["abc", 1]}),
+            encode_cursor(
+                {"d": "n", "k": ["created_at", "id"], "v": [created_at, "x"]}
+            ),
+            encode_cursor({"d": "n", "k": ["created_at", "id"], "v": [None, 1]}),
+            encode_cursor({"d": "x", "k": ["created_at", "id"], "v": [created_at, 1]}),
+            encode_cursor({"d": "n", "k": ["created_at", "id"], "v": [created_at]}),
+        ]
+        first = [tweet.id for tweet in self.get_page("/")]
+        for cursor in cursors:
+            with self.subTest(cursor=cursor):
+                self.assertEqual(
+                    [tweet.id for tweet in self.get_page("/", cursor)], first
+                )
+
+    def test_stale_cursor_from_other_ordering(self):
+        # 並び順のキーが異なるカーソル（別の並び順で発行されたもの）は先頭ページとして扱う
+        cursor = encode_cursor(
+            {"d": "n", "k": ["recommendation_score", "id"], "v": [1.5, 1]}
+        )
+        first = [tweet.id for tweet in self.get_page("/")]
+        self.assertEqual([tweet.id for tweet in self.get_page("/", cursor)], first)
+
+    def test_tampered_cursor_on_list_views(self):
+        # 並び順のキーは正しく、境界値の型が正しくないカーソル
+        urls = {
+            "/": ["created_at", "id"],
+            "/bookmark/": ["engaged_at", "engaged_tweet_id"],
+            f"/profile/{self.user.username}/likes/": ["engaged_at", "engaged_tweet_id"],
+            "/notifications/": ["created_at", "id"],
+            "/messages/": ["last_message_at", "id"],
+        }
+        for url, keys in urls.items():
+            cursor = encode_cursor({"d": "n", "k": keys, "v": ["not a date", "x"]})
+            with self.subTest(url=url):
+                self.assertEqual(
+                    self.client.get(url, {"cursor": cursor}).status_code, 200
+                )
+
+
+class HomeTimelineFanOutTests(TweetTestCase):
+    """投稿時のフォロワーのタイムラインへの配信"""
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user("author")
+        self.followers = [create_user(f"follower{i}") for i in range(3)]
+        for follower in self.followers:
+            FollowRelation.objects.create(follower=follower, followee=self.author)
+        self.client.force_login(self.author)
+
+    def get_timeline(self, owner):
+        return list(
+            HomeTimelineEntry.objects.filter(owner=owner)
+            .order_by("-tweet_created_at", "-tweet")
+            .values_list("tweet_id", flat=True)
+        )
+
+    def test_post_enqueues_and_worker_fans_out(self):
+        self.client.post("/create/", {"content": "hello"})
+        tweet = Tweet.objects.get()
+        # 投稿のリクエストでは配信待ちに登録するのみ
+        self.assertTrue(HomeTimelineFanOut.objects.filter(tweet=tweet).exists())
+        self.assertFalse(HomeTimelineEntry.objects.exists())
+
+        call_command("fan_out_tweets", stdout=io.StringIO())
+        for follower in self.followers:
+            self.assertEqual(self.get_timeline(follower), [tweet.id])
+        self.assertFalse(HomeTimelineFanOut.objects.exists())
+
+    @override_settings(HOME_TIMELINE_MAX_LENGTH=3)
+    def test_fan_out_trims_to_max_length(self):
+        tweets = [
+            Tweet.objects.create(user=self.author, content=f"tweet {i}")
+            for i in range(5)
+        ]
+        for tweet in tweets:
+            HomeTimelineEntry.fan_out(tweet)
+        newest = [tweet.id for tweet in reversed(tweets)][:3]
+        for follower in self.followers:
+            self.assertEqual(self.get_timeline(follower), newest)
+
+    @override_settings(HOME_TIMELINE_MAX_LENGTH=2)
+    def test_trim_owners_only_touches_overflowed_owners(self):
+        tweets = [
+            Tweet.objects.create(user=self.author, content=f"tweet {i}")
+            for i in range(3)
+        ]
+        HomeTimelineEntry.objects.bulk_create(
+            [
+                HomeTimelineEntry(
+                    owner=self.followers[0],
+                    tweet=tweet,
+                    tweet_created_at=tweet.created_at,
+                )
+                for tweet in tweets
+            ]
+            + [
+                HomeTimelineEntry(
+                    owner=self.followers[1],
+                    tweet=tweets[0],
+                    tweet_created_at=tweets[0].created_at,
+                )
+            ]
+        )
+        deleted = HomeTimelineEntry.trim_owners(
+            [follower.pk for follower in self.followers]
+        )
+        self.assertEqual(deleted, 1)
+        self.assertEqual(
+            self.get_timeline(self.followers[0]), [tweets[2].id, tweets[1].id]
+        )
+        self.assertEqual(self.get_timeline(self.followers[1]), [tweets[0].id])
+
+
+@override_settings(HOME_TIMELINE_FANOUT_THRESHOLD=1)
+class HybridHomeTimelineTests(TweetTestCase):
+    """フォロワーが多いユーザーのツイートを読み込み時に統合するタイムライン"""
+
+    def setUp(self):
+        super().setUp()
+        self.owner = create_user("owner")
+        self.fans = [create_user(f"fan{i}") for i in range(2)]
+        self.regular = create_user("regular")
+        self.celebrities = [create_user(f"celebrity{i}") for i in range(3)]
+        FollowRelation.objects.create(follower=self.owner, followee=self.regular)
+        for celebrity in self.celebrities:
+            FollowRelation.objects.create(follower=self.owner, followee=celebrity)
+            # フォロワー数が閾値（1人）を超えるユーザーは配信対象外になる
+            for fan in self.fans:
+                FollowRelation.objects.create(follower=fan, followee=celebrity)
+        call_command("rebuild_user_stats", stdout=io.StringIO())
+
+    def post(self, user, content):
+        tweet = Tweet.objects.create(user=user, content=content)
+        HomeTimelineEntry.fan_out(tweet)
+        return tweet
+
+    def test_merges_pushed_and_pulled_tweets(self):
+        tweets = [
+            self.post(self.regular, "regular 1"),
+            self.post(self.celebrities[0], "celebrity 1"),
+            self.post(self.regular, "regular 2"),
+            self.post(self.celebrities[1], "celebrity 2"),
+        ]
+        # 配信対象外のユーザーのツイートは配信しない
+        self.assertEqual(HomeTimelineEntry.objects.filter(owner=self.owner).count(), 2)
+        self.assertEqual(
+            HomeTimelineEntry.get_tweet_ids(self.owner),
+            [tweet.id for tweet in reversed(tweets)],
+        )
+
+    def test_merge_removes_duplicates(self):
+        tweet = self.post(self.celebrities[0], "celebrity")
+        # 閾値を超える前に配信済みだったツイートも1件にまとめる
+        HomeTimelineEntry.objects.create(
+            owner=self.owner, tweet=tweet, tweet_created_at=tweet.created_at
+        )
+        self.assertEqual(HomeTimelineEntry.get_tweet_ids(self.owner), [tweet.id])
+
+    @override_settings(HOME_TIMELINE_MAX_PULL_SOURCES=2)
+    def test_pull_sources_prefer_recently_active_users(self):
+        self.post(self.celebrities[2], "oldest")
+        self.post(self.celebrities[0], "older")
+        self.post(self.celebrities[1], "newest")
+        with self.assertLogs("tweets.models", "WARNING"):
+            pull_user_ids = HomeTimelineEntry.get_pull_sources(self.owner)
+        self.assertEqual(
+            pull_user_ids, [self.celebrities[1].pk, self.celebrities[0].pk]
+        )
+
+
+class TweetStatusTests(TweetTestCase):
+    """表示中のページのツイートに付与するログインユーザーの情報"""
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user("author")
+        self.user = create_user("user")
+        self.tweet = Tweet.objects.create(user=self.author, content="tweet")
+        self.client.force_login(self.user)
+
+    def get_tweet(self):
+        return self.client.get("/").context["page_obj"][0]
+
+    def test_status_reflects_toggles_immediately(self):
+        tweet = self.get_tweet()
+        self.assertFalse(tweet.is_liked_by_user)
+        self.assertFalse(tweet.user.is_followed_by_user)
+
+        self.client.post("/tweets/like-toggle", {"tweet_id": self.tweet.id})
+        self.client.post("/tweets/bookmark-toggle", {"tweet_id": self.tweet.id})
+        FollowRelation.objects.create(follower=self.user, followee=self.author)
+        tweet = self.get_tweet()
+        self.assertTrue(tweet.is_liked_by_user)
+        self.assertFalse(tweet.is_retweeted_by_user)
+        self.assertTrue(tweet.is_bookmarked_by_user)
+        self.assertTrue(tweet.user.is_followed_by_user)
+        self.assertFalse(tweet.user.is_following)
+
+    def test_status_queries_do_not_depend_on_relation_count(self):
+        for i in range(20):
+            other = Tweet.objects.create(user=self.author, content=f"other {i}")
+            Like.objects.create(user=self.user, tweet=other)
+        # おすすめの有無・ツイート・反応・フォロー関係（反応の件数によらず一定）
+        with self.assertNumQueries(4):
+            list(Tweet.get_timeline_tweets(self.user)[:5])
+
+
+class RecommendationTimelineTests(TweetTestCase):
+    """集計済みの候補によるおすすめタイムライン"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("user")
+        self.tweets = [
+            Tweet.objects.create(user=self.user, content=f"tweet {i}") for i in range(8)
+        ]
+        # 反応が多いツイートほどスコアが高くなる
+        for count, tweet in enumerate(self.tweets):
+            Tweet.objects.filter(pk=tweet.pk).update(like_count=count * 10)
+        self.client.force_login(self.user)
+
+    def build(self):
+        call_command("build_recommendations", stdout=io.StringIO())
+
+    def test_scores_only_tweets_in_window(self):
+        old = self.tweets[-1]
+        Tweet.objects.filter(pk=old.pk).update(
+            created_at=timezone.now() - timedelta(days=30)
+        )
+        self.build()
+        self.assertEqual(RecommendedTweet.objects.count(), len(self.tweets) - 1)
+        self.assertFalse(RecommendedTweet.objects.filter(tweet=old).exists())
+
+    def test_timeline_pages_by_score(self):
+        self.build()
+        by_score = [tweet.id for tweet in reversed(self.tweets)]
+        response = self.client.get("/")
+        first = response.context["page_obj"]
+        self.assertEqual([tweet.id for tweet in first], by_score[:5])
+        second = self.client.get("/", {"cursor": first.next_cursor}).context["page_obj"]
+        self.assertEqual([tweet.id for tweet in second], by_score[5:])
+
+    def test_cursor_from_previous_ordering_restarts(self):
+        # 候補の集計前（新しい順）に発行されたカーソル
+        cursor = self.client.get("/").context["page_obj"].next_cursor
+        self.build()
+        response = self.client.get("/", {"cursor": cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.context["page_obj"].has_previous())
+
+
+class EngagedTweetListTests(TweetTestCase):
+    """反応した日時の新しい順のツイート一覧（いいね・ブックマーク等）"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("user")
+        self.tweets = [
+            Tweet.objects.create(user=self.user, content=f"tweet {i}") for i in range(7)
+        ]
+        self.client.force_login(self.user)
+
+    def test_lists_follow_engagement_time(self):
+        # 古いツイートから順に反応したかのように、ツイートの投稿順と逆順に反応する
+        order = list(reversed(self.tweets))
+        for tweet in order:
+            Like.objects.create(user=self.user, tweet=tweet)
+            Bookmark.objects.create(user=self.user, tweet=tweet)
+        expected = [tweet.id for tweet in reversed(order)]
+        self.assertEqual(
+            [tweet.id for tweet in Tweet.get_liked_tweets(self.user)], expected
+        )
+
+        first = self.client.get("/bookmark/").context["page_obj"]
+        second = self.client.get("/bookmark/", {"cursor": first.next_cursor}).context[
+            "page_obj"
+        ]
+        self.assertEqual([tweet.id for tweet in [*first, *second]], expected)
+
+    def test_same_engagement_time_uses_tweet_id(self):
+        engaged_at = timezone.now()
+        for tweet in self.tweets:
+            Like.objects.create(user=self.user, tweet=tweet)
+        Like.objects.update(created_at=engaged_at)
+        self.assertEqual(
+            [tweet.id for tweet in Tweet.get_liked_tweets(self.user)],
+            sorted((tweet.id for tweet in self.tweets), reverse=True),
+        )
+        pages = []
+        cursor = None
+        while True:
+            page = self.client.get(
+                f"/profile/{self.user.username}/likes/",
+                {"cursor": cursor} if cursor else {},
+            ).context["page_obj"]
+            pages.extend(tweet.id for tweet in page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        self.assertEqual(
+            pages, sorted((tweet.id for tweet in self.tweets), reverse=True)
+        )
+
+
+class CommentThreadTests(TweetTestCase):
+    """ツイート詳細のコメント一覧のページ分割"""
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user("author")
+        self.user = create_user("user")
+        self.tweet = Tweet.objects.create(user=self.author, content="tweet")
+        self.comments = [
+            Comment.objects.create(user=self.user, tweet=self.tweet, content=f"c{i}")
+            for i in range(25)
+        ]
+        self.client.force_login(self.user)
+
+    def test_detail_shows_first_page_oldest_first(self):
+        page = self.client.get(f"/tweets/{self.tweet.pk}/").context["comment_page"]
+
+        self.assertEqual(
+            [comment.pk for comment in page],
+            [comment.pk for comment in self.comments[:20]],
+        )
+        self.assertTrue(page.has_next())
+
+    def test_fragment_returns_following_comments(self):
+        page = self.client.get(f"/tweets/{self.tweet.pk}/").context["comment_page"]
+        response = self.client.get(
+            f"/tweets/{self.tweet.pk}/comments/", {"cursor": page.next_cursor}
+        )
+
+        self.assertTemplateUsed(response, "tweets/_comment_list.html")
+        self.assertTemplateNotUsed(response, "base.html")
+        self.assertEqual(
+            [comment.pk for comment in response.context["comment_page"]],
+            [comment.pk for comment in self.comments[20:]],
+        )
+        self.assertNotContains(response, "さらに表示")
+
+    def test_posting_comment_updates_count_and_notifies(self):
+        Tweet.objects.filter(pk=self.tweet.pk).update(comment_count=25)
+        response = self.client.post(
+            f"/tweets/{self.tweet.pk}/comment/", {"content": "new"}
+        )
+
+        self.assertRedirects(response, f"/tweets/{self.tweet.pk}/")
+        self.tweet.refresh_from_db()
+        self.assertEqual(self.tweet.comment_count, 26)
+        self.assertTrue(
+            Notification.objects.filter(
+                receiver=self.author, comment__content="new"
+            ).exists()
+        )
+
+
+class TweetFragmentCacheTests(TweetTestCase):
+    """ツイートカードの描画結果のキャッシュ"""
+
+    def setUp(self):
+        super().setUp()
+        self.author = create_user("author")
+        self.user = create_user("user")
+        self.tweets = [
+            Tweet.objects.create(user=self.author, content=f"tweet {i}")
+            for i in range(3)
+        ]
+        self.path = f"/profile/{self.author.username}/"
+        self.client.force_login(self.user)
+
+    def get_with_render_count(self):
+        with mock.patch.object(
+            tweet_tags, "render_to_string", wraps=tweet_tags.render_to_string
+        ) as render_to_string:
+            response = self.client.get(self.path)
+        return response, render_to_string.call_count
+
+    def test_fragments_are_rendered_once(self):
+        _, first = self.get_with_render_count()
+        _, second = self.get_with_render_count()
+
+        self.assertEqual(
+            first, len(self.tweets) * len(tweet_tags.TWEET_FRAGMENT_TEMPLATES)
+        )
+        self.assertEqual(second, 0)
+
+    def test_author_update_invalidates_fragments(self):
+        self.client.get(self.path)
+        self.author.name = "新しい名前"
+        self.author.save()
+
+        response, count = self.get_with_render_count()
+
+        self.assertEqual(
+            count, len(self.tweets) * len(tweet_tags.TWEET_FRAGMENT_TEMPLATES)
+        )
+        self.assertContains(response, "新しい名前")
+
+    def test_login_does_not_invalidate_fragments(self):
+        self.client.get(self.path)
+        author = CustomUser.objects.get(pk=self.author.pk)
+        author.post_login()
+
+        _, count = self.get_with_render_count()
+
+        self.assertEqual(count, 0)
+
+    def test_image_is_rendered_without_add_status(self):
+        tweet = Tweet.objects.create(
+            user=self.author, content="画像付き", image="tweets/sample.png"
+        )
+
+        response = self.client.get(self.path)
+
+        self.assertContains(response, f'src="{tweet.resized_image_url}"')
+
+    def test_viewer_state_is_not_cached(self):
+        Like.objects.create(user=self.user, tweet=self.tweets[0])
+        self.assertContains(
+            self.client.get(self.path), 'class="btn text-danger', count=1
+        )
+
+        self.client.force_login(self.author)
+        self.assertNotContains(self.client.get(self.path), 'class="btn text-danger')
+
+
+class SeedDatasetTests(TweetTestCase):
+    """疑似データの投入（seed_dataset）"""
+
+    def seed(self, *args):
+        call_command(
+            "seed_dataset",
+            "--users=20",
+            "--avg-following=4",
+            "--tweets=60",
+            "--likes=80",
+            "--retweets=20",
+            "--bookmarks=20",
+            "--comments=30",
+            "--messages=20",
+            "--batch-size=25",
+            *args,
+            stdout=io.StringIO(),
+        )
+
+    def test_seeded_data_is_consistent(self):
+        self.seed()
+
+        self.assertEqual(CustomUser.objects.count(), 20)
+        self.assertEqual(Tweet.objects.count(), 60)
+        # 非正規化したカウンターは投入したデータと一致する
+        for tweet in Tweet.objects.all():
+            self.assertEqual(tweet.like_count, tweet.likes.count())
+            self.assertEqual(tweet.retweet_count, tweet.retweets.count())
+            self.assertEqual(tweet.comment_count, tweet.comments.count())
+        for stats in UserStats.objects.select_related("user"):
+            self.assertEqual(stats.tweet_count, stats.user.tweets.count())
+            self.assertEqual(
+                stats.follower_count, stats.user.follower_relations.count()
+            )
+        self.assertFalse(FollowRelation.objects.filter(follower=F("followee")).exists())
+
+    def test_same_seed_produces_same_data(self):
+        def snapshot():
+            return list(
+                Tweet.objects.order_by("pk").values_list(
+                    "user__username", "content", "created_at"
+                )
+            )
+
+        self.seed("--end=2024-01-01T00:00:00+00:00", "--skip-derived")
+        first = snapshot()
+        self.seed("--end=2024-01-01T00:00:00+00:00", "--skip-derived", "--prefix=again")
+        second = snapshot()[len(first) :]
+
+        self.assertEqual(
+            [(content, created_at) for _, content, created_at in first],
+            [(content, created_at) for _, content, created_at in second],
+        )
+
+    def test_existing_prefix_is_rejected(self):
+        self.seed("--skip-derived")
+        with self.assertRaises(CommandError):
+            self.seed("--skip-derived")
+
+
+class BenchmarkViewsTests(TweetTestCase):
+    """ビューの性能計測（benchmark_views）の判定"""
+
+    def setUp(self):
+        super().setUp()
+        self.command = benchmark_views.Command(stdout=io.StringIO())
+
+    def make_run(self, scale, latency_ms, queries=None):
+        queries = queries or {}
+        return {
+            "scale": scale,
+            "views": {
+                name: {"latency_ms": latency_ms, "queries": queries.get(name, 1)}
+                for name in benchmark_views.QUERY_BUDGETS
+            },
+        }
+
+    def get_failures(self, runs, max_growth=1.0, min_growth_ms=20):
+        report = {"runs": runs, "growth": self.command.get_growth(runs)}
+        return self.command.get_failures(report, max_growth, min_growth_ms)
+
+    def test_measure_uses_fastest_timing(self):
+        user = create_user("user")
+        self.client.force_login(user)
+        # 各計測の開始・終了時刻（30ms, 10ms, 50ms）
+        timer = mock.Mock(side_effect=[0, 0.03, 1, 1.01, 2, 2.05])
+        with mock.patch.object(benchmark_views.Command, "timer", timer):
+            result = self.command.measure(self.client, "/", repeat=3)
+
+        self.assertAlmostEqual(result["latency_ms"], 10)
+        self.assertAlmostEqual(result["latency_median_ms"], 30)
+        self.assertAlmostEqual(result["latency_max_ms"], 50)
+        self.assertGreater(result["queries"], 0)
+
+    def test_growth_is_fitted_across_all_scales(self):
+        runs = [self.make_run(1, 10), self.make_run(2, 20), self.make_run(4, 40)]
+        self.assertEqual(self.command.get_growth(runs)["TimelineView"], 1.0)
+
+        # 最大規模のみの揺らぎは、全規模への当てはめで緩和される（両端のみでは1.0）
+        runs = [self.make_run(scale, 10) for scale in (1, 2, 4)] + [
+            self.make_run(8, 80)
+        ]
+        self.assertEqual(self.command.get_growth(runs)["TimelineView"], 0.9)
+
+        # 応答時間が減った場合は0とする
+        runs = [self.make_run(1, 40), self.make_run(4, 10)]
+        self.assertEqual(self.command.get_growth(runs)["TimelineView"], 0)
+
+    def test_latency_growth_below_noise_floor_passes(self):
+        runs = [self.make_run(1, 18), self.make_run(2, 36)]
+        self.assertEqual(self.get_failures(runs, max_growth=0.5), [])
+
+    def test_latency_growth_is_reported(self):
+        runs = [self.make_run(1, 20), self.make_run(2, 80)]
+        failures = self.get_failures(runs)
+
+        self.assertEqual(len(failures), len(benchmark_views.QUERY_BUDGETS))
+        self.assertIn("TimelineView: 応答時間の増え方が基準を超えました", failures[0])
+        self.assertIn("指数2.0 > 1.0、60.0ms増加", failures[0])
+
+    def test_query_budget_and_growth_are_reported(self):
+        budget = benchmark_views.QUERY_BUDGETS["TimelineView"]
+        runs = [
+            self.make_run(1, 10, {"TimelineView": 2, "TweetDetailView": 2}),
+            self.make_run(2, 10, {"TimelineView": budget + 1, "TweetDetailView": 3}),
+        ]
+
+        self.assertEqual(
+            self.get_failures(runs),
+            [
+                f"TimelineView: 規模2でクエリ数が上限を超えました（{budget + 1} > {budget}）",
+                "TweetDetailView: 規模2でクエリ数が増えました（2 -> 3）",
+            ],
+        )
+
+
+class ExplainQueriesTests(TweetTestCase):
+    """主要なクエリの実行計画（explain_queries）"""
+
+    def setUp(self):
+        super().setUp()
+        self.user = create_user("user")
+        author = create_user("author")
+        FollowRelation.objects.create(follower=self.user, followee=author)
+        Tweet.objects.create(user=author, content="tweet")
+
+    def explain(self, *args):
+        stdout = io.StringIO()
+        call_command("explain_queries", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def test_outputs_plans_using_indexes(self):
+        output = self.explain("--username=user", "--fail-on-full-scan")
+
+        self.assertIn("== ユーザーのツイート一覧", output)
+        self.assertIn("tweet_user_created_idx", output)
+        self.assertIn("home_timeline_owner_idx", output)
+        self.assertIn("user_stats_follower_idx", output)
+        self.assertIn("全件走査しているクエリはありません。", output)
+
+    def test_reports_full_scans(self):
+        querysets = [("本文の検索", Tweet.objects.filter(content="tweet"))]
+        with mock.patch.object(
+            explain_queries.Command, "get_querysets", return_value=querysets
+        ):
+            output = self.explain()
+            with self.assertRaisesMessage(CommandError, "全件走査"):
+                self.explain("--fail-on-full-scan")
+
+        self.assertIn("本文の検索: tweetを全件走査しています。", output)
+
+    def test_detects_postgresql_seq_scan(self):
+        plan = (
+            "Limit  (cost=0.00..1.01 rows=1 width=4)\n"
+            "  ->  Seq Scan on tweet  (cost=0.00..1.01 rows=1 width=4)"
+        )
+        self.assertEqual(
+            explain_queries.Command().get_full_scan_tables(plan), ["tweet"]
+        )
+
+
+# MEMO: テスト実行中はテスト環境が設定済みのため、コマンドによる設定・解除を行わない
+@mock.patch.object(replay_workload, "setup_test_environment", mock.Mock())
+@mock.patch.object(replay_workload, "teardown_test_environment", mock.Mock())
+class ReplayWorkloadTests(TransactionTestCase):
+    """実際に近い操作の再生（replay_workload）"""
+
+    # MEMO: 操作は別スレッド（別の接続）で実行されるため、データを確定させておく
+    def setUp(self):
+        cache.clear()
+        for name in ["like", "retweet", "comment"]:
+            NotificationType.objects.create(name=name)
+        users = [create_user(f"user{i}") for i in range(3)]
+        for follower in users[1:]:
+            FollowRelation.objects.create(follower=follower, followee=users[0])
+        for user in users:
+            Tweet.objects.create(user=user, content=f"tweet by {user.username}")
+
+    def replay(self, *args):
+        stdout = io.StringIO()
+        call_command(
+            "replay_workload",
+            "--requests=20",
+            "--concurrency=1",
+            "--session-length=5",
+            *args,
+            stdout=stdout,
+        )
+        return stdout.getvalue()
+
+    def test_reports_each_endpoint(self):
+        output = self.replay("--seed=1")
+
+        self.assertIn("20件", output)
+        endpoints = [
+            line.split()[0]
+            for line in output.splitlines()
+            if line.split() and line.split()[0] in replay_workload.WORKLOAD_MIX
+        ]
+        self.assertTrue(endpoints)
+        self.assertEqual(len(endpoints), len(set(endpoints)))
+
+    def test_fails_when_endpoint_returns_server_errors(self):
+        with (
+            mock.patch.dict(
+                replay_workload.WORKLOAD_MIX, {"timeline": 10**6}, clear=False
+            ),
+            mock.patch(
+                "tweets.views.TimelineView.get", side_effect=RuntimeError("boom")
+            ),
+            self.assertRaisesMessage(CommandError, "timeline: エラーの割合"),
+        ):
+            self.replay()
+
+    def test_allows_errors_within_max_error_rate(self):
+        with mock.patch(
+            "tweets.views.TimelineView.get", side_effect=RuntimeError("boom")
+        ):
+            output = self.replay("--max-error-rate=1")
+
+        self.assertIn("timeline", output)
@@ -13,6 +13,11 @@ urlpatterns = [
     path("bookmark/", views.BookmarkListView.as_view(), name="bookmark"),
     path("create/", views.TweetCreateView.as_view(), name="tweet_create"),
     path("tweets/<int:pk>/", views.TweetDetailView.as_view(), name="tweet_detail"),
+    path(
+        "tweets/<int:pk>/comments/",
+        views.CommentListView.as_view(),
+        name="comment_list",
+    ),
     path(
         "tweets/<int:pk>/comment/",
         views.CommentCreateView.as_view(),
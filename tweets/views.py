@@ -1,20 +1,37 @@
 from django.views.generic import ListView, DetailView, CreateView, View
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.urls import reverse_lazy
-from django.shortcuts import render, redirect
+from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.db import transaction, IntegrityError
-from django.core.mail import send_mail
-from django.conf import settings
-from django.core.paginator import Paginator
 
-from .models import Tweet, Comment, Like, Retweet, Bookmark
+from config.pagination import CursorPaginator, CursorPaginationMixin
+from .models import Tweet, Comment, Like, Retweet, Bookmark, HomeTimelineFanOut
+from accounts.models import UserStats
 from notifications.models import Notification
 from .forms import TweetCreateForm, CommentCreateForm
 
 
+class CommentPaginationMixin:
+    """ツイート詳細のコメント一覧をページ単位で取得するMixin"""
+
+    comments_paginate_by = 20
+    comment_cursor_kwarg = "cursor"
+    comment_ordering = ("created_at", "id")
+
+    def get_comment_page(self, tweet):
+        """カーソルに対応するコメント一覧の1ページ分を取得する"""
+        paginator = CursorPaginator(
+            Comment.get_tweet_comments(tweet),
+            self.comments_paginate_by,
+            ordering=self.comment_ordering,
+        )
+        return paginator.get_page(self.request.GET.get(self.comment_cursor_kwarg))
+
+
 class TimelineView(
     LoginRequiredMixin,
+    CursorPaginationMixin,
     ListView,
 ):
     """おすすめのツイート一覧ビュー"""
@@ -27,6 +44,10 @@ class TimelineView(
     def get_queryset(self):
         return Tweet.get_timeline_tweets(requesting_user=self.request.user)
 
+    def get_cursor_paginator(self, queryset, per_page):
+        # おすすめのスコア順・新しい順のどちらの場合も、クエリセットの並び順でページ分割する
+        return CursorPaginator(queryset, per_page, ordering=queryset.query.order_by)
+
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
         context["form"] = TweetCreateForm
@@ -35,6 +56,7 @@ class TimelineView(
 
 class FollowingTweetListView(
     LoginRequiredMixin,
+    CursorPaginationMixin,
     ListView,
 ):
     """フォロー中のツイート一覧ビュー"""
@@ -53,13 +75,15 @@ class FollowingTweetListView(
         return context
 
 
-class BookmarkListView(LoginRequiredMixin, ListView):
+class BookmarkListView(LoginRequiredMixin, CursorPaginationMixin, ListView):
     """ブックマークしたツイート一覧ビュー"""
 
     model = Tweet
     template_name = "tweets/bookmark.html"
     login_url = reverse_lazy("accounts:login")
     paginate_by = 5
+    # ブックマークした日時の新しい順にページ分割する
+    cursor_ordering = ("-engaged_at", "-engaged_tweet_id")
 
     def get_queryset(self):
         return Tweet.get_bookmarked_tweets(requesting_user=self.request.user)
@@ -87,7 +111,12 @@ class TweetCreateView(CreateView):
         tweet = form.save(commit=False)
         # ユーザーの設定
         tweet.user = self.request.user
-        tweet.save()
+        # トランザクション開始
+        with transaction.atomic():
+            tweet.save()
+            UserStats.update_count(tweet.user, "tweet_count", 1)
+            # フォロワーのタイムラインへの配信は、別プロセスで行うため登録のみ行う
+            HomeTimelineFanOut.enqueue(tweet)
         messages.success(
             self.request,
             "ツイートの投稿に成功しました。",
@@ -106,9 +135,8 @@ class TweetCreateView(CreateView):
             template_name = "tweets/index.html"
 
         # ページネーター作成
-        paginator = Paginator(queryset, 5)
-        page_number = self.request.GET.get("page")
-        page_obj = paginator.get_page(page_number)
+        paginator = CursorPaginator(queryset, 5, ordering=queryset.query.order_by)
+        page_obj = paginator.get_page(self.request.GET.get("cursor"))
 
         # バリデーションエラー時の再描画用のコンテキスト生成
         context = {
@@ -116,14 +144,14 @@ class TweetCreateView(CreateView):
             "tweet_list": page_obj,
             "page_obj": page_obj,
             "paginator": paginator,
-            "is_paginated": True,
+            "is_paginated": page_obj.has_other_pages(),
         }
 
         # ページ再描画
         return render(self.request, template_name, context)
 
 
-class TweetDetailView(LoginRequiredMixin, DetailView):
+class TweetDetailView(LoginRequiredMixin, CommentPaginationMixin, DetailView):
     """ツイート詳細ビュー"""
 
     model = Tweet
@@ -135,15 +163,25 @@ class TweetDetailView(LoginRequiredMixin, DetailView):
     def get_context_data(self, *args, **kwargs):
         context = super().get_context_data(*args, **kwargs)
         tweet = self.object
-        relations = self.request.user.get_relations()
+        relations = tweet.get_relations_for_user(self.request.user)
         # ツイートにログインユーザー情報を付与
         tweet.add_status(requesting_user=self.request.user, relations=relations)
         context["tweet"] = tweet
         context["form"] = CommentCreateForm()
+        context["comment_page"] = self.get_comment_page(tweet)
         return context
 
 
-class CommentCreateView(CreateView):
+class CommentListView(LoginRequiredMixin, CommentPaginationMixin, View):
+    """ツイート詳細のコメント一覧の続きを返すビュー（HTMLの断片）"""
+
+    def get(self, request, *args, **kwargs):
+        tweet = get_object_or_404(Tweet, pk=self.kwargs["pk"])
+        context = {"tweet": tweet, "comment_page": self.get_comment_page(tweet)}
+        return render(request, "tweets/_comment_list.html", context)
+
+
+class CommentCreateView(CommentPaginationMixin, CreateView):
     """コメント投稿ビュー"""
 
     model = Comment
@@ -171,17 +209,22 @@ class CommentCreateView(CreateView):
                 comment.tweet = Tweet.objects.get(pk=self.kwargs["pk"])
                 # コメント保存
                 comment.save()
+                # コメント数を増やす
+                comment.tweet.update_count("comment_count", 1)
                 # 自身以外に対して通知作成
-                send_email = False
                 if not comment.user == comment.tweet.user:
-                    send_email = True
-                    Notification.create_notification(
+                    notification = Notification.create_notification(
                         notification_type_name="comment",
                         sender=comment.user,
                         receiver=comment.tweet.user,
                         tweet=comment.tweet,
                         comment=comment,
                     )
+                    # 通知メールは送信待ちに登録し、別プロセスで送信する
+                    notification.enqueue_email(
+                        subject="コメントされました！🎉",
+                        body=f"{self.request.user.username}さんがあなたのツイートにコメントしました。",
+                    )
                 messages.success(
                     self.request,
                     "コメントの投稿に成功しました。",
@@ -203,27 +246,18 @@ class CommentCreateView(CreateView):
                 f"予期しないエラーが発生しました: {str(e)}",
                 extra_tags="danger",
             )
-        else:
-            # 通知フラグがONの場合、メール通知
-            if send_email:
-                send_mail(
-                    subject="コメントされました！🎉",
-                    message=f"{self.request.user.username}さんがあなたのツイートにコメントしました。",
-                    from_email=settings.FROM_EMAIL,
-                    recipient_list=[comment.tweet.user.email],
-                )
-
         finally:
             return super().form_valid(form)
 
     def form_invalid(self, form):
         tweet = Tweet.get_tweet_detail().get(pk=self.kwargs["pk"])
-        relations = self.request.user.get_relations()
+        relations = tweet.get_relations_for_user(self.request.user)
         tweet.add_status(requesting_user=self.request.user, relations=relations)
         # バリデーションエラー時の再描画用のコンテキスト生成
         context = {
             "tweet": tweet,
             "form": form,
+            "comment_page": self.get_comment_page(tweet),
         }
         # ツイート詳細ページ再描画
         return render(self.request, "tweets/detail.html", context)
@@ -239,27 +273,31 @@ class LikeToggleView(LoginRequiredMixin, View):
             # ログインユーザを取得
             user = request.user
 
-            # 対象のいいね情報を取得
-            try:
-                target_like = Like.objects.get(user=user, tweet=tweet)
-            except Like.DoesNotExist:
-                target_like = None
-
             with transaction.atomic():
+                # 対象のいいね情報を取得
+                target_like = Like.objects.filter(user=user, tweet=tweet).first()
                 # いいねの切り替え処理
+                # MEMO: 同時に切り替えられた場合に件数がずれないよう、
+                # 実際に登録・削除できた場合のみ件数と通知を更新する
                 if target_like is None:
                     # いいね追加
-                    tweet.likes.create(user=user)
+                    created = tweet.add_engagement(Like, user)
+                    if created:
+                        tweet.update_count("like_count", 1)
+                        UserStats.update_count(user, "like_count", 1)
                     # 自身以外に対して通知作成
-                    send_email = False
-                    if not user == tweet.user:
-                        send_email = True
-                        Notification.create_notification(
+                    if created and not user == tweet.user:
+                        notification = Notification.create_notification(
                             notification_type_name="like",
                             sender=user,
                             receiver=tweet.user,
                             tweet=tweet,
                         )
+                        # 通知メールは送信待ちに登録し、別プロセスで送信する
+                        notification.enqueue_email(
+                            subject="いいねされました！🎉",
+                            body=f"{user.username}さんがあなたのツイートをいいねしました。",
+                        )
                     messages.success(
                         self.request,
                         "いいねをしました。",
@@ -267,7 +305,17 @@ class LikeToggleView(LoginRequiredMixin, View):
                     )
                 else:
                     # いいね削除
-                    target_like.delete()
+                    deleted = tweet.remove_engagement(target_like)
+                    if deleted:
+                        tweet.update_count("like_count", -1)
+                        UserStats.update_count(user, "like_count", -1)
+                    # いいねの通知を取り消す
+                    if deleted and not user == tweet.user:
+                        Notification.remove_engagement(
+                            notification_type_name="like",
+                            sender=user,
+                            tweet=tweet,
+                        )
                     messages.success(
                         self.request,
                         "いいねを解除しました。",
@@ -289,15 +337,6 @@ class LikeToggleView(LoginRequiredMixin, View):
                 f"予期しないエラーが発生しました: {str(e)}",
                 extra_tags="danger",
             )
-        else:
-            # 通知フラグがONの場合、メール通知
-            if send_email:
-                send_mail(
-                    subject="いいねされました！🎉",
-                    message=f"{user.username}さんがあなたのツイートをいいねしました。",
-                    from_email=settings.FROM_EMAIL,
-                    recipient_list=[tweet.user.email],
-                )
         finally:
             # 直前のページにリダイレクトする
             return redirect(request.META.get("HTTP_REFERER", "tweets:timeline"))
@@ -313,28 +352,30 @@ class RetweetToggleView(LoginRequiredMixin, View):
             # ログインユーザを取得
             user = request.user
 
-            # 対象のリツイート情報を取得
-            try:
-                target_retweet = tweet.retweets.get(user=user)
-            except Retweet.DoesNotExist:
-                target_retweet = None
-
             # トランザクション開始
             with transaction.atomic():
+                # 対象のリツイート情報を取得
+                target_retweet = tweet.retweets.filter(user=user).first()
                 # リツイートの切り替え処理
+                # MEMO: 実際に登録・削除できた場合のみ件数と通知を更新する
                 if target_retweet is None:
                     # リツイート
-                    tweet.retweets.create(user=user)
+                    created = tweet.add_engagement(Retweet, user)
+                    if created:
+                        tweet.update_count("retweet_count", 1)
                     # 自身以外に対して通知作成
-                    send_email = False
-                    if not user == tweet.user:
-                        send_email = True
-                        Notification.create_notification(
+                    if created and not user == tweet.user:
+                        notification = Notification.create_notification(
                             notification_type_name="retweet",
                             sender=user,
                             receiver=tweet.user,
                             tweet=tweet,
                         )
+                        # 通知メールは送信待ちに登録し、別プロセスで送信する
+                        notification.enqueue_email(
+                            subject="リツイートされました！🎉",
+                            body=f"{user.username}さんがあなたのツイートをリツイートしました。",
+                        )
                     messages.success(
                         self.request,
                         "リツイートしました。",
@@ -342,7 +383,16 @@ class RetweetToggleView(LoginRequiredMixin, View):
                     )
                 else:
                     # リツイート解除
-                    target_retweet.delete()
+                    deleted = tweet.remove_engagement(target_retweet)
+                    if deleted:
+                        tweet.update_count("retweet_count", -1)
+                    # リツイートの通知を取り消す
+                    if deleted and not user == tweet.user:
+                        Notification.remove_engagement(
+                            notification_type_name="retweet",
+                            sender=user,
+                            tweet=tweet,
+                        )
                     messages.success(
                         self.request,
                         "リツイートを解除しました。",
@@ -364,15 +414,6 @@ class RetweetToggleView(LoginRequiredMixin, View):
                 f"予期しないエラーが発生しました: {str(e)}",
                 extra_tags="danger",
             )
-        else:
-            # 通知フラグがONの場合、メール通知
-            if send_email:
-                send_mail(
-                    subject="リツイートされました！🎉",
-                    message=f"{user.username}さんがあなたのツイートをリツイートしました。",
-                    from_email=settings.FROM_EMAIL,
-                    recipient_list=[tweet.user.email],
-                )
         finally:
             # 直前のページにリダイレクトする
             return redirect(request.META.get("HTTP_REFERER", "tweets:timeline"))
@@ -387,29 +428,32 @@ class BookmarkToggleView(LoginRequiredMixin, View):
         # ログインユーザを取得
         user = request.user
 
-        # 対象のブックマーク情報を取得
-        try:
-            target_bookmark = tweet.bookmarks.get(user=user)
-        except Bookmark.DoesNotExist:
-            target_bookmark = None
-
-        # ブックマークの切り替え処理
-        if target_bookmark is None:
-            # ブックマーク
-            tweet.bookmarks.create(user=user)
-            messages.success(
-                self.request,
-                "ブックマークしました。",
-                extra_tags="success",
-            )
-        else:
-            # ブックマーク解除
-            target_bookmark.delete()
-            messages.success(
-                self.request,
-                "ブックマークを解除しました。",
-                extra_tags="success",
-            )
+        # トランザクション開始
+        with transaction.atomic():
+            # 対象のブックマーク情報を取得
+            target_bookmark = tweet.bookmarks.filter(user=user).first()
+            # ブックマークの切り替え処理
+            # MEMO: 実際に登録・削除できた場合のみ件数を更新する
+            if target_bookmark is None:
+                # ブックマーク
+                if tweet.add_engagement(Bookmark, user):
+                    tweet.update_count("bookmark_count", 1)
+                    UserStats.update_count(user, "bookmark_count", 1)
+                messages.success(
+                    self.request,
+                    "ブックマークしました。",
+                    extra_tags="success",
+                )
+            else:
+                # ブックマーク解除
+                if tweet.remove_engagement(target_bookmark):
+                    tweet.update_count("bookmark_count", -1)
+                    UserStats.update_count(user, "bookmark_count", -1)
+                messages.success(
+                    self.request,
+                    "ブックマークを解除しました。",
+                    extra_tags="success",
+                )
 
         # 直前のページにリダイレクトする
         return redirect(request.META.get("HTTP_REFERER", "tweets:timeline"))